@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+Benchmark reading and parsing xrootd logs for each format the log reader
+understands: plain, gzip, bzip2 and (if the lzma module is there) xz.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/bench_log_formats.py --size 512
+
+writes a synthetic log of about 512 MB, compresses copies of it, and for
+each format times reading its lines with xrootd_log.logLines and parsing
+it into a SessionTable in one process.  Throughputs are in MB of the
+uncompressed log per second.
+"""
+
+import os
+import bz2
+import gzip
+import sys
+import time
+import shutil
+import optparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import xrootd_logs
+import gratia_reporting.xrootd_log as xrootd_log
+
+def compress(source, filename, format):
+    """
+    Write a copy of source compressed in format to filename.
+    """
+    if format == xrootd_log.GZIP:
+        out = gzip.open(filename, "wb", 6)
+    elif format == xrootd_log.BZIP2:
+        out = bz2.BZ2File(filename, "wb", compresslevel=9)
+    else:
+        out = xrootd_log.lzma.LZMAFile(filename, "wb")
+    try:
+        fp = open(source, "rb")
+        try:
+            shutil.copyfileobj(fp, out, 1024*1024)
+        finally:
+            fp.close()
+    finally:
+        out.close()
+
+def report(name, what, size, compressed, timer):
+    print "%-6s %-6s %8.1f MB %8.1f MB on disk %8.2f s %8.1f MB/s" % (name,
+        what, size/1e6, compressed/1e6, timer, size/1e6/timer)
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--size", dest="size", default=512, type="int",
+        help="Size in MB of the synthetic log.")
+    options, args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="xrootd_logs.")
+    try:
+        plain = os.path.join(directory, "xrootd.log")
+        timer = -time.time()
+        lines = xrootd_logs.writeLog(plain, options.size*1000**2)
+        timer += time.time()
+        print "Wrote %d lines in %.1f s." % (lines, timer)
+        size = os.stat(plain).st_size
+
+        logs = [("plain", plain)]
+        formats = [(xrootd_log.GZIP, ".gz"), (xrootd_log.BZIP2, ".bz2")]
+        if xrootd_log.lzma is not None:
+            formats.append((xrootd_log.XZ, ".xz"))
+        else:
+            print "No lzma module: skipping xz."
+        for format, suffix in formats:
+            timer = -time.time()
+            compress(plain, plain + suffix, format)
+            timer += time.time()
+            print "Compressed with %s in %.1f s." % (format, timer)
+            logs.append((format, plain + suffix))
+
+        for name, filename in logs:
+            compressed = os.stat(filename).st_size
+            timer = -time.time()
+            for line in xrootd_log.logLines(filename):
+                pass
+            timer += time.time()
+            report(name, "read", size, compressed, timer)
+
+            timer = -time.time()
+            table = xrootd_log.parseTasks(xrootd_log.chunks([filename]),
+                workers=1)
+            timer += time.time()
+            report(name, "parse", size, compressed, timer)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
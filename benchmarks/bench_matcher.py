@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the matching of overflow jobs against xrootd sessions: the
+linear scans of the old report against the SessionIndex lookups.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/bench_matcher.py --sessions 2000000 --jobs 500
+
+builds --sessions synthetic sessions over a day and --jobs failed jobs
+(most of them from the hosts of some of the sessions), matches every job
+both ways and checks that the results agree.  The old matchers are slow;
+--legacy-jobs limits how many of the jobs they get.
+"""
+
+import sys
+import time
+import random
+import optparse
+from datetime import datetime
+
+import gratia_reporting.overflow_jobs_report as overflow_jobs_report
+import gratia_reporting.xrootd_log as xrootd_log
+from gratia_reporting.overflow_jobs_report import ARE_MATCHED_HOSTNAMES, \
+    UTCTimestamp, match_slack
+
+domains = ["hep.wisc.edu", "rcac.purdue.edu", "t2.ucsd.edu", "unl.edu",
+    "fnal.gov", "cern.ch"]
+
+def buildSessions(count, start, seed=0):
+    """
+    Return {jobid: [None, login, disconnection, filename, site]} for count
+    sessions logging in over the day after start.
+    """
+    rand = random.Random(seed)
+    sessions = {}
+    for ctr in xrange(count):
+        host = "n%d.%s" % (rand.randint(1, 2000), rand.choice(domains))
+        if host.find(".purdue.") >= 0 and rand.random() < 0.5:
+            host = "nat-" + host
+        jobid = "cmsprod.%d:%d@%s" % (rand.randint(1000, 99999), ctr, host)
+        login = start + rand.randint(0, 86400)
+        disconnection = None
+        if rand.random() < 0.95:
+            disconnection = login + rand.randint(30, 6*3600)
+        sessions[jobid] = [None, login, disconnection,
+            "/store/mc/sample%d.root" % ctr, None]
+    return sessions
+
+def buildJobs(sessions, count, seed=0):
+    """
+    Return count (host, starttime, endtime) of failed jobs, times as naive
+    UTC datetimes.  Most are built around a session, under the full or the
+    short host name, the others are random.
+    """
+    rand = random.Random(seed)
+    jobids = [j for j, s in sessions.iteritems() if s[2] is not None]
+    jobids.sort()
+    jobs = []
+    for ctr in xrange(count):
+        jobid = rand.choice(jobids)
+        login, disconnection = sessions[jobid][1:3]
+        host = jobid.split("@")[1]
+        if rand.random() < 0.3:
+            host = "wn%d.%s" % (ctr, host.split(".", 1)[1])
+        elif rand.random() < 0.1:
+            host = "unknown%d" % ctr
+        start = login - rand.randint(0, match_slack)
+        end = disconnection + rand.randint(0, match_slack)
+        jobs.append((host + " 8 cores", datetime.utcfromtimestamp(start),
+            datetime.utcfromtimestamp(end)))
+    return jobs
+
+def legacyExactMatch(sessions, hostnameJobsDictionary, host, starttime,
+        endtime):
+    """
+    The host and time checks of the old CheckJobMatchInXrootdLog_ExactMatch.
+    """
+    hostname = host.split(" ")[0]
+    possiblejobs = hostnameJobsDictionary.get(hostname, None)
+    if (not possiblejobs):
+        possiblejobs = hostnameJobsDictionary.get(hostname.split(".")[0], None)
+    jobBeginAt = UTCTimestamp(starttime)
+    jobEndAt = UTCTimestamp(endtime)
+    time_now = time.time()
+    matched = []
+    if possiblejobs:
+        for job in possiblejobs:
+            LoginDisconnectionTimeAndSoOn = sessions[job]
+            if (not LoginDisconnectionTimeAndSoOn[1]):
+                loginTime = 0
+            else:
+                loginTime = int(LoginDisconnectionTimeAndSoOn[1])
+            if (not LoginDisconnectionTimeAndSoOn[2]):
+                disconnectionTime = time_now + 100
+            else:
+                disconnectionTime = int(LoginDisconnectionTimeAndSoOn[2])
+            if ((loginTime >= jobBeginAt+0) and (loginTime <= jobBeginAt + match_slack)):
+                if ((jobEndAt >= disconnectionTime+0) and (jobEndAt <= disconnectionTime + match_slack)):
+                    matched.append(job)
+    return matched
+
+def legacyFuzzyMatch(sessions, host, starttime, endtime):
+    """
+    The host and time checks of the old CheckJobMatchInXrootdLog_FuzzyMatch.
+    """
+    hostname = host.split(" ")[0]
+    jobBeginAt = UTCTimestamp(starttime)
+    jobEndAt = UTCTimestamp(endtime)
+    time_now = time.time()
+    matched = []
+    for job, LoginDisconnectionTimeAndSoOn in sessions.iteritems():
+        if ARE_MATCHED_HOSTNAMES(job, hostname):
+            if (not LoginDisconnectionTimeAndSoOn[1]):
+                loginTime = 0
+            else:
+                loginTime = int(LoginDisconnectionTimeAndSoOn[1])
+            if (not LoginDisconnectionTimeAndSoOn[2]):
+                disconnectionTime = time_now + 100
+            else:
+                disconnectionTime = int(LoginDisconnectionTimeAndSoOn[2])
+            if ((loginTime >= jobBeginAt+0) and (loginTime <= jobBeginAt + match_slack)):
+                if ((jobEndAt >= disconnectionTime+0) and (jobEndAt <= disconnectionTime + match_slack)):
+                    matched.append(job)
+    return matched
+
+def runIndexed(analysis, jobs):
+    results = []
+    for host, starttime, endtime in jobs:
+        exact = analysis.CheckJobMatchInXrootdLog_ExactMatch("1.0", "user",
+            host, starttime, endtime, starttime, endtime, None)
+        fuzzy = None
+        if not exact:
+            fuzzy = analysis.CheckJobMatchInXrootdLog_FuzzyMatch("1.0",
+                "user", host, starttime, endtime, starttime, endtime, None)
+        results.append((bool(exact), fuzzy))
+    return results
+
+def runLegacy(sessions, jobs):
+    hostnameJobsDictionary = {}
+    for jobid, session in sessions.iteritems():
+        if session[1] is not None:
+            hostnameJobsDictionary.setdefault(jobid.split("@")[1],
+                []).append(jobid)
+    results = []
+    for host, starttime, endtime in jobs:
+        exact = legacyExactMatch(sessions, hostnameJobsDictionary, host,
+            starttime, endtime)
+        fuzzy = None
+        if not exact:
+            fuzzy = len(legacyFuzzyMatch(sessions, host, starttime, endtime))
+        results.append((bool(exact), fuzzy))
+    return results
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--sessions", dest="sessions", default=1000000,
+        type="int", help="Number of xrootd sessions.")
+    parser.add_option("--jobs", dest="jobs", default=500, type="int",
+        help="Number of failed jobs to match.")
+    parser.add_option("--legacy-jobs", dest="legacy_jobs", default=50,
+        type="int", help="Number of the jobs to match with the old matchers.")
+    options, args = parser.parse_args()
+
+    start = 1337000000
+    timer = -time.time()
+    sessions = buildSessions(options.sessions, start)
+    jobs = buildJobs(sessions, options.jobs)
+    timer += time.time()
+    print "Built %d sessions and %d jobs in %.1f s." % (len(sessions),
+        len(jobs), timer)
+
+    analysis = overflow_jobs_report.OverflowAnalysis(None,
+        EarliestEndTime=datetime.utcfromtimestamp(start),
+        LatestEndTime=datetime.utcfromtimestamp(start+86400))
+    timer = -time.time()
+    analysis.sessionColumns = xrootd_log.SessionColumns((jobid, s[1], s[2],
+        s[3], s[4], "xrootd.unl.edu") for jobid, s in sessions.iteritems())
+    analysis.sessionIndex = xrootd_log.SessionIndex(analysis.sessionColumns)
+    timer += time.time()
+    print "index    %8.2f s to build" % timer
+
+    timer = -time.time()
+    indexed = runIndexed(analysis, jobs)
+    timer += time.time()
+    print "indexed  %8.2f s for %5d jobs %10.3f ms/job" % (timer, len(jobs),
+        1000*timer/len(jobs))
+
+    legacy_jobs = jobs[:options.legacy_jobs]
+    timer = -time.time()
+    legacy = runLegacy(sessions, legacy_jobs)
+    timer += time.time()
+    print "legacy   %8.2f s for %5d jobs %10.3f ms/job" % (timer,
+        len(legacy_jobs), 1000*timer/len(legacy_jobs))
+
+    if legacy != indexed[:len(legacy)]:
+        print "The matchers disagree!"
+        sys.exit(1)
+    print "%d exact, %d unique fuzzy matches; the matchers agree." % (
+        len([r for r in indexed if r[0]]),
+        len([r for r in indexed if r[1] == 1]))
+
+if __name__ == '__main__':
+    main()
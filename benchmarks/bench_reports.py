@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""
+Benchmark every report end to end against the synthetic Gratia database of
+gratia_db.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/bench_reports.py --rows 10000,1000000,10000000
+
+builds the fixtures of each scale (an SQLite file, or the database of
+--config) and times, for each report, its queries, the aggregation around
+them (including the xrootd log parsing of the overflow analysis) and the
+rendering of its plain text and HTML, and measures the email of the report.  Each result is also appended, as a
+JSON line with the date and the git revision, to --results, so the numbers
+can be followed from one change to the next.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import logging
+import optparse
+import tempfile
+import datetime
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gratia_db
+import gratia_reporting.report as report
+import gratia_reporting.executor as executor
+import gratia_reporting.rendering as rendering
+
+report_names = ["cmsxrootd", "hadoop", "ce_consistency", "se_consistency"]
+
+def gitRevision():
+    """
+    Return the git revision of the source tree, or None.
+    """
+    try:
+        proc = subprocess.Popen(["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        output = proc.communicate()[0].strip()
+    except OSError:
+        return None
+    if proc.returncode != 0 or not output:
+        return None
+    return output
+
+def timeReport(name, conn, date, cp, log):
+    """
+    Run the report called name for date on conn and return the seconds of
+    its phases.
+    """
+    db = executor.QueryExecutor(conn, log)
+    report_module = __import__('gratia_reporting.report_%s' % name)
+    report_module = getattr(report_module, "report_%s" % name)
+    timer = -time.time()
+    instance = report_module.Report(db, date, log, cp)
+    result = instance.result()
+    compute = timer + time.time()
+    timer = -time.time()
+    text = rendering.renderPlain(result)
+    html = rendering.renderPage(instance.subject(), rendering.renderHtml(
+        result))
+    render = timer + time.time()
+    email = report.emailMessage(("Gratia", "gratia@example.edu"),
+        (["Reader"], ["reader@example.edu"]), instance.subject(), text, html)
+    query = 0
+    rows = 0
+    for stats in db.stats:
+        query += stats.wall
+        rows += stats.rows
+    return {"query": query, "aggregate": compute - query, "render": render,
+        "queries": len(db.stats), "result_rows": rows,
+        "email_bytes": len(email)}
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--rows", dest="rows", default="10000",
+        help="Comma-separated scales: job records and transfer summaries.")
+    parser.add_option("--reports", dest="reports",
+        default=",".join(report_names), help="Comma-separated reports.")
+    parser.add_option("--days", dest="days", default=9, type="int",
+        help="Days of records, up to the report date.")
+    parser.add_option("--date", dest="date", default="2012-05-10",
+        help="Report date (YYYY-MM-DD).")
+    parser.add_option("--directory", dest="directory", default=None,
+        help="Where to build the fixtures; a temporary directory, removed "
+        "at the end, by default.")
+    parser.add_option("--config", dest="config", default=None,
+        help="Use the database of this reporting.cfg instead of SQLite.")
+    parser.add_option("-d", "--db", dest="db", default=None,
+        help="Section of the database in the config.")
+    parser.add_option("--log-rate", dest="log_rate", default=1, type="int",
+        help="xrootd sessions logged per second.")
+    parser.add_option("--results", dest="results",
+        default="bench_reports.jsonl",
+        help="Append the results to this file.")
+    options, args = parser.parse_args()
+    scales = [int(i) for i in options.rows.split(",")]
+    names = [i.strip() for i in options.reports.split(",")]
+    date = datetime.datetime(*time.strptime(options.date, "%Y-%m-%d")[:3])
+
+    log = logging.getLogger("bench")
+    revision = gitRevision()
+    directory = options.directory
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="gratia_bench.")
+    try:
+        for rows in scales:
+            timer = -time.time()
+            fixtures, conn, cp, counts = gratia_db.build(os.path.join(
+                directory, "rows-%d" % rows), date, rows, days=options.days,
+                config=options.config, db=options.db,
+                log_rate=options.log_rate)
+            timer += time.time()
+            print "%d rows: fixtures built in %.1f s." % (rows, timer)
+            try:
+                for name in names:
+                    phases = timeReport(name, conn, date, cp, log)
+                    print "%10d rows %-15s query %8.2f s aggregate %8.2f s " \
+                        "render %8.2f s email %8.1f kB" % (rows, name,
+                        phases["query"], phases["aggregate"],
+                        phases["render"], phases["email_bytes"]/1e3)
+                    phases.update({"time": time.strftime(
+                        "%Y-%m-%d %H:%M:%S"), "revision": revision,
+                        "host": socket.getfqdn(), "rows": rows,
+                        "report": name})
+                    fp = open(options.results, "a")
+                    try:
+                        fp.write(json.dumps(phases, sort_keys=True) + "\n")
+                    finally:
+                        fp.close()
+            finally:
+                conn.close()
+    finally:
+        if options.directory is None:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
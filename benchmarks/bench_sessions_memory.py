@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the memory held by the xrootd sessions of the overflow report:
+the jobid -> five-element list dictionary and the host -> jobids lists of
+the old report against SessionColumns and its SessionIndex.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/bench_sessions_memory.py --sessions 2000000
+
+parses nothing: each structure is built, in a forked process, from the
+same list of synthetic sessions, as it would be from the parsed
+SessionTable, and the growth of the resident set is printed.  The jobid and
+file name strings of the list are shared, so the growth is the cost of the
+structure itself.
+"""
+
+import os
+import random
+import optparse
+
+import gratia_reporting.xrootd_log as xrootd_log
+
+domains = ["hep.wisc.edu", "rcac.purdue.edu", "t2.ucsd.edu", "unl.edu",
+    "fnal.gov", "cern.ch"]
+redirect_sites = ["cmssrv32.fnal.gov:1094", "xrootd.unl.edu:1094",
+    "xrootd.t2.ucsd.edu:1094", None]
+
+def generateSessions(count, start=1337000000, seed=0):
+    """
+    Generate count (jobid, login, disconnection, filename, redirection
+    site) sessions, building fresh strings as a log parser would.
+    """
+    rand = random.Random(seed)
+    for ctr in xrange(count):
+        jobid = "cmsprod.%d:%d@n%d.%s" % (rand.randint(1000, 99999), ctr,
+            rand.randint(1, 2000), rand.choice(domains))
+        login = start + rand.randint(0, 86400)
+        disconnection = login + rand.randint(30, 6*3600)
+        filename = "/store/mc/Summer12/sample%d/AODSIM/%08x.root" % (ctr % 97,
+            rand.randint(0, 200000))
+        yield jobid, login, disconnection, filename, \
+            rand.choice(redirect_sites)
+
+def buildLegacy(sessions):
+    jobLoginDisconnectionAndSoOnDictionary = {}
+    hostnameJobsDictionary = {}
+    for jobid, login, disconnection, filename, site in sessions:
+        jobLoginDisconnectionAndSoOnDictionary[jobid] = [None, login,
+            disconnection, filename, site]
+        hostnameJobsDictionary.setdefault(jobid.split("@")[1],
+            []).append(jobid)
+    return jobLoginDisconnectionAndSoOnDictionary, hostnameJobsDictionary
+
+def buildColumns(sessions):
+    columns = xrootd_log.SessionColumns(sessions)
+    return columns, xrootd_log.SessionIndex(columns)
+
+def residentBytes():
+    fp = open("/proc/self/statm")
+    try:
+        return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    finally:
+        fp.close()
+
+def measure(build, sessions):
+    """
+    Return how many bytes the resident set of a forked process grows by
+    while it builds (and keeps) build(sessions).
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = residentBytes()
+        result = build(sessions)
+        os.write(write_fd, str(residentBytes() - before))
+        os._exit(0)
+    os.close(write_fd)
+    data = os.read(read_fd, 64)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return int(data)
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--sessions", dest="sessions", default=1000000,
+        type="int", help="Number of xrootd sessions.")
+    options, args = parser.parse_args()
+
+    sessions = list(generateSessions(options.sessions))
+    for name, build in [("legacy", buildLegacy), ("columns", buildColumns)]:
+        grown = measure(build, sessions)
+        print "%-8s %10d sessions %10.1f MB %8.1f bytes/session" % (name,
+            options.sessions, grown/1e6, grown/float(options.sessions))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the peak memory of the cmsxrootd transfer aggregation
+(report_cmsxrootd.TransferInfo) with the rows fetched all at once and
+streamed in batches, as the window grows.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/bench_stream_memory.py --rows-per-day 200000 --days 1,7,30
+
+fills an SQLite database with --rows-per-day synthetic MasterTransferSummary
+rows for each day of the largest window, then, for each window and mode,
+runs TransferInfo in a forked process and prints how much its peak resident
+set grew.  SQLite cursors already hand their rows over one at a time, as a
+MySQLdb SSCursor does, so the difference is the rows held by Python.  What is left growing
+with the window when streaming is the aggregate itself: one entry per hour,
+site and user.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import optparse
+import resource
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gratia_db
+import xrootd_logs
+import gratia_reporting.executor as executor
+import gratia_reporting.report_cmsxrootd as report_cmsxrootd
+
+sites = ["T2_US_Nebraska", "T2_US_UCSD", "T2_US_Wisconsin", "T2_US_Purdue",
+    "T2_US_Caltech", "T2_US_MIT", "T2_US_Florida", "T1_US_FNAL"]
+
+def fillDatabase(filename, days, rows_per_day, start, seed=0):
+    rand = random.Random(seed)
+    conn = gratia_db.Connection(filename)
+    gratia_db.createTables(conn)
+    writers = {}
+    for table in ("Probe", "Site", "SizeUnits", "MasterTransferSummary"):
+        writers[table] = gratia_db.TableWriter(conn, table)
+    writers["SizeUnits"].add(("B", 1))
+    for ctr in range(len(sites)):
+        writers["Probe"].add((ctr, ctr, "xrootd:probe%d" % ctr))
+        writers["Site"].add((ctr, sites[ctr]))
+    cns = ["/DC=org/DC=doegrids/OU=People/CN=User %d %d" % (ctr, 1000+ctr)
+        for ctr in range(20)]
+    for day in range(days):
+        for ctr in xrange(rows_per_day):
+            when = start + datetime.timedelta(day, 3600*rand.randint(0, 23))
+            # Each row is a distinct group: its remote host is unique.
+            writers["MasterTransferSummary"].add((when,
+                "xrootd:probe%d" % rand.randint(0, len(sites)-1),
+                rand.choice(cns), "node%d-%d.%s" % (day, ctr,
+                rand.choice(xrootd_logs.domains)), "Xrootd", "B",
+                rand.randint(1, 20), rand.randint(1, 10**10),
+                rand.randint(1, 3600)))
+    for writer in writers.values():
+        writer.flush()
+    conn.close()
+
+def peakGrowth(function):
+    """
+    Return how many bytes the peak resident set of a forked process grows
+    by while it runs function().
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        function()
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(write_fd, str((after - before)*1024))
+        os._exit(0)
+    os.close(write_fd)
+    data = os.read(read_fd, 64)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return int(data)
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--rows-per-day", dest="rows_per_day", default=100000,
+        type="int", help="Transfer summary rows per day.")
+    parser.add_option("--days", dest="days", default="1,7,14",
+        help="Comma-separated window lengths in days.")
+    options, args = parser.parse_args()
+    windows = [int(i) for i in options.days.split(",")]
+
+    log = logging.getLogger("bench")
+    start = datetime.datetime(2012, 5, 1)
+    directory = tempfile.mkdtemp(prefix="gratia_stream.")
+    try:
+        filename = os.path.join(directory, "gratia.db")
+        timer = -time.time()
+        fillDatabase(filename, max(windows), options.rows_per_day, start)
+        timer += time.time()
+        print "Wrote %d rows in %.1f s." % (max(windows) *
+            options.rows_per_day, timer)
+
+        modes = [("fetchall", None), ("stream", lambda conn: conn.cursor())]
+        for days in windows:
+            end = start + datetime.timedelta(days, -1)
+            for name, stream_cursor in modes:
+                def run():
+                    conn = gratia_db.Connection(filename)
+                    db = executor.QueryExecutor(conn, log,
+                        stream_cursor=stream_cursor)
+                    report_cmsxrootd.TransferInfo(start, end, db, log)
+                timer = -time.time()
+                grown = peakGrowth(run)
+                timer += time.time()
+                print "%3d days %-8s %10d rows %8.1f MB peak growth " \
+                    "%8.1f s" % (days, name, days*options.rows_per_day,
+                    grown/1e6, timer)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
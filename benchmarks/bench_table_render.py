@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+"""
+Benchmark a large make_table.Table against the table it replaced, which
+kept a list of formatted strings and of types for every row and built its
+text with += inside its loops.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/bench_table_render.py --rows 100000
+
+fills both tables with --rows synthetic rows (text, links, numbers and
+percentages, with a break every 1000 rows) and checks they give the same
+plain text.  Then, in a forked process each, it times filling them and
+rendering them, with how much the peak resident set grows.  The new table
+also writes its text to a file a line at a time, and renders its text
+limited to the --limit rows with the most jobs.  The HTML of the old table
+styled every cell inline; that of the new one has classes of a stylesheet.
+"""
+
+import os
+import re
+import sys
+import time
+import types
+import random
+import optparse
+import resource
+import tempfile
+
+import gratia_reporting.make_table as make_table
+
+class LegacyTable:
+    """
+    The table as it was: a list of formatted strings and of types per row,
+    rendered with += inside the loops.
+    """
+
+    def __init__(self, add_numbers = True):
+        self.headers = []
+        self.headerLengths = []
+        self.maxHeaderLen = 0
+        self.data = []
+        self.colors = []
+        self.headerLines = 1
+        self.types = []
+        self.rowCtr = 0
+        self.add_numbers = add_numbers
+
+    def setHeaders(self, headers):
+        if self.add_numbers:
+            headers.insert(0, " ")
+        self.headerLengths = []
+        for header in headers:
+            splits = header.splitlines()
+            try:
+                header_len = max([len(i) for i in splits])
+            except:
+                header_len = 1
+            self.headerLines = max(self.headerLines, len(splits))
+            self.headerLengths.append(header_len)
+            self.headers.append(splits)
+        self.maxHeaderLen = max(self.headerLengths)
+
+    def formatEntry(self, entry):
+        if isinstance(entry, types.TupleType):
+            val = entry[0]
+        else:
+            val = entry
+        if isinstance(val, types.IntType) or \
+                isinstance(val, types.LongType) or \
+                isinstance(val, types.FloatType):
+            val = make_table.ftoa(val)
+        if isinstance(entry, types.TupleType):
+            return (str(val), ) + entry[1:]
+        else:
+            val = str(val)
+            return val
+
+    def entryType(self, entry):
+        if isinstance(entry, types.IntType) or \
+                isinstance(entry, types.LongType):
+            return int
+        elif isinstance(entry, types.FloatType):
+            return float
+        return str
+
+    def addRow(self, data, colors=None):
+        self.rowCtr += 1
+        if self.add_numbers:
+            data.insert(0, self.rowCtr)
+        assert len(data) == len(self.headerLengths)
+        if colors:
+            if self.add_numbers:
+                colors.insert(0, None)
+            assert len(data) == len(colors)
+        mytypes = [self.entryType(i) for i in data]
+        self.types.append(mytypes)
+        data = [self.formatEntry(i) for i in data]
+        for i in range(len(data)):
+            if isinstance(data[i], types.TupleType):
+                mylen = len(data[i][0])
+            else:
+                mylen = len(data[i])
+            self.headerLengths[i] = max(self.headerLengths[i], mylen)
+        self.data.append(data)
+        self.colors.append(colors)
+
+    def addBreak(self):
+        self.data.append(None)
+
+    def plainTextHeader(self):
+        table_len = 1 + sum([i+3 for i in self.headerLengths])
+        output = '-' * table_len + '\n'
+        for i in range(self.headerLines):
+            output += '|'
+            ctr = 0
+            for header in self.headers:
+                if len(header) <= i:
+                    header = ''
+                else:
+                    header = header[i]
+                output += ' %s |' % header.center(self.headerLengths[ctr])
+                ctr += 1
+            output += '\n'
+        output += '-' * table_len + '\n'
+        return output
+     
+    def plainTextFooter(self):
+        table_len = 1 + sum([i+3 for i in self.headerLengths])
+        output = '-' * table_len + '\n'
+        return output
+
+    perc_re = re.compile(r"-?(\d+)%")
+    def plainTextBody(self):
+        header_cnt = len(self.headers)
+        output = ''
+        idx = 0
+        table_len = sum([i+3 for i in self.headerLengths])-1
+        for row in self.data:
+            rowtypes = self.types[idx]
+            output += '|'
+            if row == None:
+                output += '-' * table_len + '|\n'
+                continue
+            for i in range(header_cnt):
+                if isinstance(row[i], types.TupleType):
+                    val = row[i][0]
+                else:
+                    val = row[i]
+                if rowtypes[i] == types.StringType and not \
+                        self.perc_re.match(val):
+                    output += (' %%-%is |' % self.headerLengths[i]) % \
+                        val
+                else:
+                    output += (' %%%is |' % self.headerLengths[i]) % \
+                        val
+            output += '\n'
+            idx += 1
+        return output
+
+    def plainText(self):
+        return self.plainTextHeader() + self.plainTextBody() + \
+            self.plainTextFooter()
+
+    def html(self, css_class="mytable"):
+        header = ''
+        for entry in self.headers:
+            header += "<th>%s</th>" % ' '.join([i.replace('\n','<br/>') for i \
+                in entry])
+        output = """<table class="%s">\n\t<thead>%s</thead>\n""" % \
+            (css_class, header)
+        ctr = 0
+        add_thick_border = False
+        for row in self.data:
+            if row == None:
+                add_thick_border = True
+                continue
+            if add_thick_border:
+                output += '\t<tr style="border-top-width: %spx"> ' % '3'
+            else:
+                output += "\t<tr> "
+            col_ctr = 0
+            rowtypes = self.types[col_ctr]
+            for entry in row:
+                align = 'right'
+                color = 'white'
+                if rowtypes[col_ctr] == types.StringType:
+                    align = 'left'
+                if self.colors[ctr] and self.colors[ctr][col_ctr]:
+                    color = self.colors[ctr][col_ctr]
+                if isinstance(entry, types.TupleType):
+                    entry = '<a href="%s">%s</a>' % (entry[1], entry[0])
+                output += '<td style="background-color: %s; text-align: %s;'\
+                    ' border-top-width: %spx;">%s</td>' % (color, align,
+                    int(add_thick_border)*3, entry)
+                col_ctr += 1
+            output += " </tr>\n"
+            if add_thick_border == True:
+                add_thick_border = False
+            ctr += 1
+        output += "</table>"
+        return output
+
+def fillTable(table, rows, seed=0):
+    rand = random.Random(seed)
+    table.setHeaders(["Site", "Host", "Jobs", "Wall Hours", "Efficiency",
+        "Change"])
+    for ctr in xrange(rows):
+        if ctr and ctr % 1000 == 0:
+            table.addBreak()
+        site = "T2_US_Site%d" % rand.randint(0, 50)
+        colors = None
+        if ctr % 10 == 0:
+            colors = [None, "yellow", None, None, "red", None]
+        table.addRow([site, ("node%d.example.edu" % ctr,
+            "http://example.edu/%s" % site), rand.randint(0, 10**6),
+            rand.random()*10**4, "%i%%" % rand.randint(0, 100),
+            "%i%%" % rand.randint(-100, 100)], colors)
+    return table
+
+def peakGrowth(function):
+    """
+    Return (seconds, bytes the peak resident set grew by) of function(), run
+    in a forked process.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        timer = -time.time()
+        function()
+        timer += time.time()
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(write_fd, "%f %d" % (timer, (after - before)*1024))
+        os._exit(0)
+    os.close(write_fd)
+    data = os.read(read_fd, 64)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    timer, grown = data.split()
+    return float(timer), int(grown)
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--rows", dest="rows", default=100000, type="int",
+        help="Rows of the table.")
+    parser.add_option("--limit", dest="limit", default=50, type="int",
+        help="Rows of the table limited to its largest jobs.")
+    options, args = parser.parse_args()
+
+    def measure(runs):
+        for name, function in runs:
+            timer, grown = peakGrowth(function)
+            print "%-14s %8.2f s %8.1f MB peak growth" % (name, timer,
+                grown/1e6)
+
+    # The fills first, while this process holds neither table.
+    measure([("legacy fill", lambda: fillTable(LegacyTable(), options.rows)),
+        ("fill", lambda: fillTable(make_table.Table(), options.rows))])
+
+    legacy = fillTable(LegacyTable(), options.rows)
+    table = fillTable(make_table.Table(), options.rows)
+    if legacy.plainText() != table.plainText():
+        raise Exception("The plain text differs from the old table.")
+
+    table.setLimit(options.limit, "Jobs", ["Jobs", "Wall Hours"])
+    def limited():
+        return table.limited().plainText()
+
+    fd, filename = tempfile.mkstemp(prefix="table.")
+    os.close(fd)
+    def writeTo(write):
+        def run():
+            fp = open(filename, "w")
+            try:
+                write(fp)
+            finally:
+                fp.close()
+        return run
+    try:
+        measure([("legacy plain", legacy.plainText),
+            ("plain", table.plainText),
+            ("plain to file", writeTo(table.writePlainText)),
+            ("legacy html", legacy.html),
+            ("html", table.html),
+            ("html to file", writeTo(table.writeHtml)),
+            ("plain top %d" % options.limit, limited)])
+    finally:
+        os.unlink(filename)
+
+if __name__ == '__main__':
+    main()
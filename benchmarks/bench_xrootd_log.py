@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the xrootd log parser against the line-by-line parser it
+replaced.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/bench_xrootd_log.py --size 4096
+
+writes a synthetic log of about 4 GB (or reuses the one given with
+--log), parses it with xrootd_log.XrootdLogParser, and times the old
+parser on the first --legacy-size MB of the same log.
+"""
+
+import os
+import re
+import sys
+import time
+import optparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import xrootd_logs
+import gratia_reporting.xrootd_log as xrootd_log
+
+HostnameRemoveList = ["red-mon"]
+FilenameRemoveList = ["/store/test/xrootd"]
+
+def Is_Jobid_in_HostnameRemoveList(jobid):
+    for oneitem in HostnameRemoveList:
+        if jobid.find(oneitem)>=0:
+            return 1
+    return None
+
+def Is_Filename_In_RemoveList(filename):
+    for oneremoveitem in FilenameRemoveList:
+        if filename.find(oneremoveitem)>=0:
+            return 1
+    return None
+
+def legacyParse(filename, limit):
+    """
+    The parsing loop of the old buildJobLoginDisconnectionAndSoOnDictionary,
+    minus the dictionary updates.  Stops after limit bytes.
+    """
+    infile = open(filename)
+    events = 0
+    read = 0
+    while read < limit:
+        line = infile.readline()
+        if not line:
+            break
+        read += len(line)
+        matchflagLogin = re.match("(\d{2})(\d{2})(\d{2}) (\d{2}:\d{2}:\d{2}) \d+ XrootdXeq: (\S+) login\s*", line, 0)
+        if matchflagLogin:
+            TheLoginDatetime = "20"+matchflagLogin.group(1)+"-"+matchflagLogin.group(2)+"-"+matchflagLogin.group(3)+" "+matchflagLogin.group(4)
+            int(time.mktime(time.strptime(TheLoginDatetime, '%Y-%m-%d %H:%M:%S')))
+            if not Is_Jobid_in_HostnameRemoveList(matchflagLogin.group(5)):
+                events += 1
+            continue
+        matchflagDisconnection = re.match("(\d{2})(\d{2})(\d{2}) (\d{1,2}:\d{2}:\d{2}) \d+ XrootdXeq: (\S+) disc \d{1,2}:\d{2}:\d{2}\n", line)
+        if matchflagDisconnection:
+            TheDisconnectionDatetime = "20"+matchflagDisconnection.group(1)+"-"+matchflagDisconnection.group(2)+"-"+matchflagDisconnection.group(3)+" "+matchflagDisconnection.group(4)
+            int(time.mktime(time.strptime(TheDisconnectionDatetime, '%Y-%m-%d %H:%M:%S')))
+            if not Is_Jobid_in_HostnameRemoveList(matchflagDisconnection.group(5)):
+                events += 1
+            continue
+        matchflagFilenameRedirectionsite = re.match("\d{6} \d{1,2}:\d{2}:\d{2} \d+ Decode xrootd redirects (\S+) to (\S+) (\S+)\n", line)
+        if matchflagFilenameRedirectionsite:
+            if (not Is_Jobid_in_HostnameRemoveList(matchflagFilenameRedirectionsite.group(1))) and (not Is_Filename_In_RemoveList(matchflagFilenameRedirectionsite.group(3))):
+                events += 1
+            continue
+        matchflagPureFilename = re.match("\d{6} \d{1,2}:\d{2}:\d{2} \d+ (\S+) ofs_open: \d+-\d+ fn=(\S+)\n", line)
+        if matchflagPureFilename:
+            if (not Is_Jobid_in_HostnameRemoveList(matchflagPureFilename.group(1))) and (not Is_Filename_In_RemoveList(matchflagPureFilename.group(2))):
+                events += 1
+    infile.close()
+    return events, read
+
+def report(name, events, size, timer):
+    print "%-8s %10d events %10.1f MB %8.2f s %8.1f MB/s" % (name, events,
+        size/1e6, timer, size/1e6/timer)
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--log", dest="log", default=None,
+        help="Existing xrootd log to parse instead of a synthetic one.")
+    parser.add_option("--size", dest="size", default=2048, type="int",
+        help="Size in MB of the synthetic log.")
+    parser.add_option("--legacy-size", dest="legacy_size", default=256,
+        type="int", help="MB of the log to parse with the old parser.")
+    options, args = parser.parse_args()
+
+    filename = options.log
+    if filename is None:
+        fd, filename = tempfile.mkstemp(prefix="xrootd.log.")
+        os.close(fd)
+        timer = -time.time()
+        lines = xrootd_logs.writeLog(filename, options.size*1000**2)
+        timer += time.time()
+        print "Wrote %d lines to %s in %.1f s." % (lines, filename, timer)
+    size = os.stat(filename).st_size
+
+    try:
+        timer = -time.time()
+        events = 0
+        for event in xrootd_log.XrootdLogParser().parseFile(filename):
+            events += 1
+        timer += time.time()
+        report("new", events, size, timer)
+
+        timer = -time.time()
+        events, read = legacyParse(filename, options.legacy_size*1000**2)
+        timer += time.time()
+        report("legacy", events, read, timer)
+    finally:
+        if options.log is None:
+            os.unlink(filename)
+
+if __name__ == '__main__':
+    main()
+
@@ -0,0 +1,627 @@
+#!/usr/bin/env python
+
+"""
+A synthetic Gratia database for the benchmarks.
+
+Fills the tables the reports query, at a given scale, in an SQLite file or
+in a MySQL/MariaDB database:
+
+  * job records (JobUsageRecord, JobUsageRecord_Meta, Resource and
+    JobUsageRecord_Xml) for the overflow analysis and the Hadoop commands,
+  * storage and compute elements (StorageElement, StorageElementRecord,
+    ComputeElement and ComputeElementRecord) for the Hadoop and the
+    consistency reports,
+  * transfer summaries (MasterTransferSummary, Probe, Site and SizeUnits)
+    for the cmsxrootd report,
+
+and writes the OIM resource groups of the consistency reports and the xrootd
+log of the overflow analysis next to them.
+
+Usage (from the top of the source tree):
+
+    PYTHONPATH=src python benchmarks/gratia_db.py --rows 1000000 --directory /tmp/gratia
+
+writes /tmp/gratia/gratia.db, oim_ce.xml, oim_se.xml and xrootd/xrootd.log
+and prints the config sections pointing the reports at them.  With --config,
+the tables are made in the database of that reporting.cfg instead (they are
+dropped first).
+
+SQLite stands in for MySQL through Connection, which translates the MySQLdb
+parameters and drops the FORCE INDEX hints of the report queries.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import sqlite3
+import calendar
+import datetime
+import optparse
+import ConfigParser
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import xrootd_logs
+import gratia_reporting.overflow_jobs_report as overflow_jobs_report
+
+date_format = "%Y-%m-%d %H:%M:%S"
+
+force_index_re = re.compile(r"force\s+index\s*\([^)]*\)", re.I)
+mapping_re = re.compile(r"%\((\w+)\)s")
+
+def sqliteStatement(stmt):
+    """
+    Translate a MySQLdb statement for sqlite3: ? or :name parameters, and no
+    index hints.
+    """
+    stmt = force_index_re.sub("", stmt)
+    stmt = mapping_re.sub(r":\1", stmt)
+    return stmt.replace("%s", "?").replace("%%", "%")
+
+def sqliteValue(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime(date_format)
+    return value
+
+def sqliteArgs(args):
+    if isinstance(args, dict):
+        return dict([(i, sqliteValue(j)) for (i, j) in args.items()])
+    return tuple([sqliteValue(i) for i in args])
+
+def convertDatetime(value):
+    return datetime.datetime.strptime(value[:19], date_format)
+
+# DATETIME columns are read back as datetimes, as with MySQLdb.
+sqlite3.register_converter("DATETIME", convertDatetime)
+
+class Cursor(object):
+    """
+    An sqlite3 cursor taking the statements and parameters of MySQLdb.
+    """
+
+    def __init__(self, curs):
+        self._curs = curs
+
+    def execute(self, stmt, args=()):
+        self._curs.execute(sqliteStatement(stmt), sqliteArgs(args))
+
+    def executemany(self, stmt, rows):
+        self._curs.executemany(sqliteStatement(stmt), [sqliteArgs(i) for i \
+            in rows])
+
+    def fetchone(self):
+        return self._curs.fetchone()
+
+    def fetchmany(self, size):
+        return self._curs.fetchmany(size)
+
+    def fetchall(self):
+        return self._curs.fetchall()
+
+    def close(self):
+        self._curs.close()
+
+class Connection(object):
+    """
+    An SQLite file standing in for the Gratia database.
+    """
+
+    def __init__(self, filename):
+        self._conn = sqlite3.connect(filename,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self._conn.text_factory = str
+
+    def cursor(self):
+        return Cursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def ping(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+# The columns of the tables read by the reports; the types are understood by
+# both MySQL and SQLite.
+tables = [
+    ("JobUsageRecord", ["dbid BIGINT", "LocalJobId VARCHAR(255)",
+        "CommonName VARCHAR(255)", "Host VARCHAR(255)",
+        "HostDescription VARCHAR(255)", "ResourceType VARCHAR(255)",
+        "JobName VARCHAR(255)", "ProjectName VARCHAR(255)",
+        "StartTime DATETIME", "EndTime DATETIME", "WallDuration DOUBLE",
+        "CpuUserDuration DOUBLE", "CpuSystemDuration DOUBLE"]),
+    ("JobUsageRecord_Meta", ["dbid BIGINT", "ProbeName VARCHAR(255)"]),
+    ("JobUsageRecord_Xml", ["dbid BIGINT", "ExtraXml TEXT"]),
+    ("Resource", ["dbid BIGINT", "Description VARCHAR(255)",
+        "Value VARCHAR(255)"]),
+    ("Site", ["siteid INTEGER", "SiteName VARCHAR(255)"]),
+    ("Probe", ["probeid INTEGER", "siteid INTEGER",
+        "probename VARCHAR(255)"]),
+    ("SizeUnits", ["Unit VARCHAR(16)", "Multiplier DOUBLE"]),
+    ("MasterTransferSummary", ["StartTime DATETIME",
+        "ProbeName VARCHAR(255)", "CommonName VARCHAR(255)",
+        "RemoteSite VARCHAR(255)", "Protocol VARCHAR(32)",
+        "StorageUnit VARCHAR(16)", "Njobs INTEGER", "TransferSize DOUBLE",
+        "TransferDuration DOUBLE"]),
+    ("StorageElement", ["dbid BIGINT", "UniqueID VARCHAR(255)",
+        "ParentID VARCHAR(255)", "Name VARCHAR(255)", "SE VARCHAR(255)",
+        "SiteName VARCHAR(255)", "SpaceType VARCHAR(32)",
+        "Implementation VARCHAR(255)", "Version VARCHAR(255)",
+        "Status VARCHAR(32)", "ProbeName VARCHAR(255)",
+        "Timestamp DATETIME"]),
+    ("StorageElementRecord", ["dbid BIGINT", "UniqueID VARCHAR(255)",
+        "MeasurementType VARCHAR(32)", "TotalSpace BIGINT",
+        "FreeSpace BIGINT", "UsedSpace BIGINT", "FileCount BIGINT",
+        "FileCountLimit BIGINT", "ProbeName VARCHAR(255)",
+        "Timestamp DATETIME"]),
+    ("ComputeElement", ["dbid BIGINT", "UniqueID VARCHAR(255)",
+        "HostName VARCHAR(255)", "SiteName VARCHAR(255)",
+        "ProbeName VARCHAR(255)", "Timestamp DATETIME"]),
+    ("ComputeElementRecord", ["dbid BIGINT", "UniqueID VARCHAR(255)",
+        "ProbeName VARCHAR(255)", "Timestamp DATETIME"]),
+]
+
+# (table, column) indexes; the queries force the Timestamp indexes by name.
+indexes = [("JobUsageRecord", "dbid"), ("JobUsageRecord", "EndTime"),
+    ("JobUsageRecord_Meta", "dbid"), ("JobUsageRecord_Xml", "dbid"),
+    ("Resource", "dbid"), ("MasterTransferSummary", "StartTime"),
+    ("StorageElement", "dbid"), ("StorageElement", "UniqueID"),
+    ("StorageElement", "Timestamp"), ("StorageElementRecord", "UniqueID"),
+    ("StorageElementRecord", "Timestamp"), ("ComputeElement", "Timestamp"),
+    ("ComputeElementRecord", "Timestamp")]
+
+def createTables(conn, mysql=False):
+    """
+    (Re)create the tables; index names are per table in MySQL and per
+    database in SQLite.
+    """
+    curs = conn.cursor()
+    for table, columns in tables:
+        curs.execute("DROP TABLE IF EXISTS %s" % table)
+        curs.execute("CREATE TABLE %s (%s)" % (table, ", ".join(columns)))
+    for table, column in indexes:
+        if mysql:
+            name = column
+        else:
+            name = "%s_%s" % (table, column)
+        curs.execute("CREATE INDEX %s ON %s (%s)" % (name, table, column))
+    curs.close()
+    conn.commit()
+
+class TableWriter(object):
+    """
+    Inserts the rows given to add into a table, batch_size at a time.
+    """
+
+    batch_size = 10000
+
+    def __init__(self, conn, table):
+        self._conn = conn
+        self.table = table
+        self.rows = 0
+        self._batch = []
+
+    def add(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        curs = self._conn.cursor()
+        curs.executemany("INSERT INTO %s VALUES (%s)" % (self.table,
+            ", ".join(["%s"]*len(self._batch[0]))), self._batch)
+        curs.close()
+        self._conn.commit()
+        self.rows += len(self._batch)
+        self._batch = []
+
+sites = ["Nebraska", "UCSD", "Purdue", "GLOW", "Caltech", "MIT", "Florida",
+    "FNAL"]
+# Batch slots of the jobs; the overflow ones ran outside their site.
+host_descriptions = ["UCSD", "UCSD-overflow", "Nebraska",
+    "Nebraska-overflow", "Purdue", "Purdue-overflow", "GLOW",
+    "GLOW-overflow", "Caltech", "MIT"]
+glidein_probe = "condor:glidein-2.t2.ucsd.edu"
+areas = ["store", "user", "group", "temp"]
+hadoop_commands = [("Hadoop fsck", "fsck"), ("Hadoop report", "report")]
+
+class Fixtures(object):
+    """
+    The synthetic records of the days days up to report date date (a
+    datetime at midnight), with rows job records and rows transfer
+    summaries; the storage and compute elements and the users grow with
+    rows.
+    """
+
+    def __init__(self, date, days=9, rows=10000, site="Nebraska", seed=0):
+        self.date = date
+        self.start = date - datetime.timedelta(days-1, 0)
+        self.days = days
+        self.rows = rows
+        self.site = site
+        self.seed = seed
+        rand = random.Random(seed)
+        self.users = ["/DC=org/DC=doegrids/OU=People/CN=Some User %d %d" % \
+            (i, 100000+i) for i in range(20 + rows//20000)]
+        # (host, Gratia site name, OIM group or None if not in OIM, hidden)
+        self.ces = []
+        for ctr in range(max(10, rows//100000)):
+            site_name = "%s_%d" % (rand.choice(sites), ctr)
+            oim = site_name
+            draw = rand.random()
+            if draw < 0.1:
+                oim = site_name + "_OIM"
+            elif draw < 0.15:
+                oim = None
+            self.ces.append(("ce%d.%s" % (ctr, rand.choice(xrootd_logs.\
+                domains)), site_name, oim, draw > 0.95))
+        # (endpoint, Gratia name, implementation, OIM name or None)
+        self.ses = []
+        for ctr in range(max(10, rows//100000)):
+            name = "%s_SE_%d" % (rand.choice(sites), ctr)
+            oim = name
+            draw = rand.random()
+            if draw < 0.1:
+                oim = name + "_OIM"
+            elif draw < 0.15:
+                oim = None
+            self.ses.append(("srm%d.%s" % (ctr, rand.choice(xrootd_logs.\
+                domains)), name, rand.choice(["BeStMan", "dCache",
+                "Hadoop", "classicSE"]), oim))
+        self.directories = max(10, rows//2000)
+        self.pools = max(10, rows//20000)
+
+    def dayStarts(self):
+        return [self.start + datetime.timedelta(i, 0) for i in \
+            range(self.days)]
+
+    def fill(self, conn, mysql=False):
+        """
+        Create the tables in conn and fill them.  Returns the number of rows
+        of each table.
+        """
+        createTables(conn, mysql)
+        rand = random.Random(self.seed)
+        writers = {}
+        for table, columns in tables:
+            writers[table] = TableWriter(conn, table)
+        self.fillSites(writers)
+        self.fillJobs(writers, rand)
+        self.fillTransfers(writers, rand)
+        self.fillStorage(writers, rand)
+        self.fillComputeElements(writers, rand)
+        counts = {}
+        for writer in writers.values():
+            writer.flush()
+            counts[writer.table] = writer.rows
+        return counts
+
+    def fillSites(self, writers):
+        for ctr in range(len(sites)):
+            writers["Site"].add((ctr+1, sites[ctr]))
+            writers["Probe"].add((ctr+1, ctr+1, "xrootd:xrootd.%s" % \
+                xrootd_logs.domains[ctr % len(xrootd_logs.domains)]))
+        writers["Probe"].add((len(sites)+1, sites.index("UCSD")+1,
+            glidein_probe))
+        writers["SizeUnits"].add(("B", 1))
+        writers["SizeUnits"].add(("KB", 1000))
+
+    def jobHost(self, rand):
+        host = "n%d.%s" % (rand.randint(1, 400), rand.choice(xrootd_logs.\
+            domains))
+        if rand.random() < 0.2:
+            host += " 10.%d.%d.%d" % (rand.randint(0, 255),
+                rand.randint(0, 255), rand.randint(1, 254))
+        return host
+
+    def fillJobs(self, writers, rand):
+        first = calendar.timegm(self.start.utctimetuple())
+        span = 86400*self.days
+        for dbid in xrange(1, self.rows+1):
+            end = datetime.datetime.utcfromtimestamp(first + rand.randint(0,
+                span-1))
+            wall = rand.randint(60, 12*3600)
+            cpu = wall*rand.random()
+            writers["JobUsageRecord"].add((dbid, "%d.%d" % (rand.randint(1000,
+                999999), rand.randint(0, 99)), rand.choice(self.users),
+                self.jobHost(rand), rand.choice(host_descriptions),
+                rand.random() < 0.9 and "BatchPilot" or "Batch", None, None,
+                end - datetime.timedelta(0, wall), end, wall, cpu*0.9,
+                cpu*0.1))
+            if rand.random() < 0.6:
+                probe = glidein_probe
+            else:
+                probe = "condor:%s" % rand.choice(xrootd_logs.domains)
+            writers["JobUsageRecord_Meta"].add((dbid, probe))
+            draw = rand.random()
+            if draw < 0.03:
+                exit_code = 84
+            elif draw < 0.05:
+                exit_code = 85
+            elif draw < 0.15:
+                exit_code = 1
+            else:
+                exit_code = 0
+            writers["Resource"].add((dbid, "ExitCode", str(exit_code)))
+            if rand.random() < 0.5:
+                writers["Resource"].add((dbid, "AppInfo", "cmsRun CMSSW_5_2_%d"
+                    % rand.randint(0, 9)))
+        # The output of the Hadoop commands, reported as one job a day each.
+        dbid = self.rows
+        se = "%s:SE:%s" % (self.site, self.site)
+        for day in self.dayStarts():
+            for name, tag in hadoop_commands:
+                dbid += 1
+                end = day + datetime.timedelta(0, 3600)
+                writers["JobUsageRecord"].add((dbid, None, None, None, None,
+                    "Storage", name, se, end, end, 0, 0, 0))
+                writers["JobUsageRecord_Meta"].add((dbid, "hadoop:%s" % \
+                    self.site))
+                writers["Resource"].add((dbid, "CustomInfo", tag))
+                output = "Status: HEALTHY\n Total size: %d B\n" % \
+                    rand.randint(10**14, 10**15)
+                writers["JobUsageRecord_Xml"].add((dbid, "<%s>%s</%s>" % (tag,
+                    escape(output), tag)))
+
+    def fillTransfers(self, writers, rand):
+        days = self.dayStarts()
+        for ctr in xrange(self.rows):
+            # The summaries are daily.
+            day = rand.choice(days)
+            writers["MasterTransferSummary"].add((day, "xrootd:xrootd.%s" % \
+                rand.choice(xrootd_logs.domains), rand.choice(self.users),
+                "n%d.%s" % (rand.randint(1, 400), rand.choice(xrootd_logs.\
+                domains)), rand.random() < 0.9 and "Xrootd" or "Gridftp",
+                rand.random() < 0.8 and "B" or "KB", rand.randint(1, 50),
+                float(rand.randint(1, 10**10)), float(rand.randint(1,
+                3600))))
+
+    def fillStorage(self, writers, rand):
+        se = "%s:SE:%s" % (self.site, self.site)
+        probe = "hadoop:%s" % self.site
+        # (unique id, parent, name, space type, status, first day, total,
+        # used, file count, file count limit)
+        entities = [(se, se, self.site, "SE", "Production", 0, 5*10**15,
+            3*10**15, None, None)]
+        for area in areas:
+            entities.append(("%s:Area:%s" % (self.site, area), se, area,
+                "Area", "Production", 0, None, None, None, None))
+        for ctr in range(self.directories):
+            area = areas[ctr % len(areas)]
+            path = "/%s/dir%d" % (area, ctr)
+            if rand.random() < 0.3:
+                space_type, total, limit = "Quota", 10**13, 10**6
+            else:
+                space_type, total, limit = "Directory", None, None
+            entities.append(("%s:%s:%s" % (self.site, space_type, path),
+                "%s:Area:%s" % (self.site, area), path, space_type,
+                "Production", 0, total, rand.randint(10**9, 10**13),
+                rand.randint(10, 10**5), limit))
+        for ctr in range(self.pools):
+            name = "pool%03d.%s" % (ctr, xrootd_logs.domains[0])
+            if rand.random() < 0.1:
+                status = "Offline"
+            else:
+                status = "Production"
+            if rand.random() < 0.05:
+                first_day = rand.randint(1, self.days-1)
+            else:
+                first_day = 0
+            entities.append(("%s:Pool:%s" % (self.site, name), se, name,
+                "Pool", status, first_day, 2*10**12, rand.randint(10**11,
+                2*10**12), None, None))
+        dbid = 0
+        days = self.dayStarts()
+        for uid, parent, name, space_type, status, first_day, total, used, \
+                files, limit in entities:
+            dbid += 1
+            writers["StorageElement"].add((dbid, uid, parent, name,
+                self.site, self.site, space_type, "Hadoop", "0.20.2", status,
+                probe, days[first_day]))
+            if space_type == "Area":
+                continue
+            for day in range(first_day, self.days):
+                # Four measurements a day, growing from day to day.
+                for hour in (0, 6, 12, 18):
+                    if used is not None:
+                        used += rand.randint(0, 10**10)
+                    if files is not None:
+                        files += rand.randint(0, 100)
+                    free = None
+                    if total is not None and used is not None:
+                        free = max(total - used, 0)
+                    writers["StorageElementRecord"].add((dbid, uid, "raw",
+                        total, free, used, files, limit, probe, days[day] + \
+                        datetime.timedelta(0, 3600*hour)))
+        # The SEs published by the GIP of the other sites.
+        for endpoint, name, implementation, oim in self.ses:
+            dbid += 1
+            uid = "%s:SE:%s" % (endpoint, name)
+            writers["StorageElement"].add((dbid, uid, uid, name, name, name,
+                "SE", implementation, "2.2", "Production", "gip_storage:%s" % \
+                endpoint, days[0]))
+            # Most of them reported in the week before the report date.
+            if rand.random() < 0.9:
+                writers["StorageElementRecord"].add((dbid, uid, "raw", 10**15,
+                    10**14, 9*10**14, None, None, "gip_storage:%s" % endpoint,
+                    self.date - datetime.timedelta(rand.randint(1, 6), 0)))
+
+    def fillComputeElements(self, writers, rand):
+        days = self.dayStarts()
+        dbid = 0
+        for host, site_name, oim, hidden in self.ces:
+            dbid += 1
+            uid = "%s:2119/jobmanager-condor-default" % host
+            writers["ComputeElement"].add((dbid, uid, host, site_name,
+                "gip:%s" % host, days[0]))
+            if rand.random() < 0.9:
+                writers["ComputeElementRecord"].add((dbid, uid, "gip:%s" % \
+                    host, self.date - datetime.timedelta(rand.randint(1, 6),
+                    0)))
+
+    def writeOIM(self, directory):
+        """
+        Write the OIM resource groups of the CEs and SEs, as MyOSG serves
+        them, to oim_ce.xml and oim_se.xml in directory.  Returns their file
+        names.
+        """
+        ce_groups = {}
+        for host, site_name, oim, hidden in self.ces:
+            if oim is not None:
+                ce_groups.setdefault(oim, []).append((host, host, hidden))
+        # One CE in OIM only.
+        ce_groups.setdefault("OIM_Only", []).append(("ce-oim.example.edu",
+            "ce-oim.example.edu", False))
+        se_groups = {}
+        for endpoint, name, implementation, oim in self.ses:
+            if oim is not None:
+                se_groups.setdefault(name, []).append((oim, endpoint, False))
+        se_groups.setdefault("OIM_Only", []).append(("OIM_Only_SE",
+            "srm-oim.example.edu", False))
+        filenames = []
+        for kind, groups in [("ce", ce_groups), ("se", se_groups)]:
+            filename = os.path.join(directory, "oim_%s.xml" % kind)
+            writeResourceGroups(filename, groups)
+            filenames.append(filename)
+        return filenames
+
+    def logWindow(self):
+        """
+        Return the (first, last) epochs of the xrootd log: the overflow
+        window of the report date, with six hours on each side for the
+        offset between the local time of the log and the UTC of Gratia.
+        """
+        earliest, latest = overflow_jobs_report.UCSDWindow(self.date)
+        return calendar.timegm(earliest.utctimetuple()) - 6*3600, \
+            calendar.timegm(latest.utctimetuple()) + 6*3600
+
+    def writeLogs(self, directory, rate=1):
+        """
+        Write the xrootd log of the overflow window, with about rate
+        sessions a second, to xrootd/xrootd.log in directory.  Returns the
+        log directory.
+        """
+        log_dir = os.path.join(directory, "xrootd")
+        if not os.path.isdir(log_dir):
+            os.makedirs(log_dir)
+        first, last = self.logWindow()
+        xrootd_logs.writeLog(os.path.join(log_dir, "xrootd.log"), None,
+            start=first, rate=rate, seed=self.seed, end=last)
+        return log_dir
+
+    def config(self, log_dir, ce_oim, se_oim):
+        """
+        Return the config sections pointing the reports at the fixtures.
+        """
+        cp = ConfigParser.ConfigParser()
+        cp.add_section("Gratia")
+        cp.set("Gratia", "SiteName", self.site)
+        cp.add_section("Overflow")
+        cp.set("Overflow", "log_sources", "xrootd.%s:%s" % (xrootd_logs.\
+            domains[0], log_dir))
+        cp.add_section("OIM")
+        cp.set("OIM", "ce_url", "file://" + os.path.abspath(ce_oim))
+        cp.set("OIM", "se_url", "file://" + os.path.abspath(se_oim))
+        return cp
+
+def writeResourceGroups(filename, groups):
+    """
+    Write groups, {group name: [(resource name, FQDN, hidden)]}, in the
+    format of the MyOSG resource group summary.
+    """
+    names = groups.keys()
+    names.sort()
+    fp = open(filename, "w")
+    try:
+        fp.write('<?xml version="1.0" encoding="UTF-8"?>\n<ResourceSummary>\n')
+        for name in names:
+            fp.write("<ResourceGroup><GroupName>%s</GroupName><Resources>\n" %
+                escape(name))
+            for resource, fqdn, hidden in groups[name]:
+                fp.write("<Resource><Name>%s</Name><FQDN>%s</FQDN><Services>"
+                    "<Service><HiddenService>%s</HiddenService></Service>"
+                    "</Services></Resource>\n" % (escape(resource),
+                    escape(fqdn), hidden))
+            fp.write("</Resources></ResourceGroup>\n")
+        fp.write("</ResourceSummary>\n")
+    finally:
+        fp.close()
+
+def build(directory, date, rows, days=9, config=None, db=None, log_rate=1,
+        seed=0):
+    """
+    Build the fixtures of rows rows in directory, in its gratia.db unless a
+    reporting.cfg is given.  Returns the fixtures, the connection to the
+    database, the config of the reports and the number of rows of each
+    table.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    if config:
+        import gratia_reporting.report as report
+        cp = ConfigParser.ConfigParser()
+        cp.read([i.strip() for i in config.split(",")])
+        if db:
+            cp.set("Gratia", "database", db)
+        conn = report.databaseConnection(cp)
+        mysql = True
+    else:
+        conn = Connection(os.path.join(directory, "gratia.db"))
+        mysql = False
+    fixtures = Fixtures(date, days=days, rows=rows, seed=seed)
+    counts = fixtures.fill(conn, mysql)
+    ce_oim, se_oim = fixtures.writeOIM(directory)
+    log_dir = fixtures.writeLogs(directory, log_rate)
+    return fixtures, conn, fixtures.config(log_dir, ce_oim, se_oim), counts
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--rows", dest="rows", default=10000, type="int",
+        help="Job records and transfer summaries to make.")
+    parser.add_option("--days", dest="days", default=9, type="int",
+        help="Days of records, up to the report date.")
+    parser.add_option("--date", dest="date", default=None,
+        help="Report date (YYYY-MM-DD); defaults to yesterday.")
+    parser.add_option("--directory", dest="directory", default=None,
+        help="Where to write the database, the OIM files and the logs.")
+    parser.add_option("--config", dest="config", default=None,
+        help="Fill the database of this reporting.cfg instead of SQLite.")
+    parser.add_option("-d", "--db", dest="db", default=None,
+        help="Section of the database in the config.")
+    parser.add_option("--log-rate", dest="log_rate", default=1, type="int",
+        help="xrootd sessions logged per second.")
+    parser.add_option("--seed", dest="seed", default=0, type="int")
+    options, args = parser.parse_args()
+    if not options.directory:
+        parser.error("--directory is required.")
+    if options.date:
+        date = datetime.datetime(*time.strptime(options.date,
+            "%Y-%m-%d")[:3])
+    else:
+        today = datetime.date.today()
+        date = datetime.datetime(today.year, today.month, today.day) - \
+            datetime.timedelta(1, 0)
+
+    timer = -time.time()
+    fixtures, conn, cp, counts = build(options.directory, date, options.rows,
+        days=options.days, config=options.config, db=options.db,
+        log_rate=options.log_rate, seed=options.seed)
+    conn.close()
+    timer += time.time()
+    names = counts.keys()
+    names.sort()
+    for name in names:
+        print "%-25s %10d rows" % (name, counts[name])
+    print "Built in %.1f s; report date %s.\n" % (timer,
+        date.strftime("%Y-%m-%d"))
+    cp.write(sys.stdout)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+
+"""
+Synthetic xrootd logs for the benchmarks.
+
+The lines look like those of a busy redirector: sessions logging in,
+being redirected, opening files and disconnecting, interleaved with lines
+the overflow analysis does not care about.
+"""
+
+import time
+import heapq
+import random
+
+domains = ["hep.wisc.edu", "rcac.purdue.edu", "t2.ucsd.edu", "unl.edu",
+    "fnal.gov", "cern.ch"]
+redirect_sites = ["cmssrv32.fnal.gov:1094", "xrootd.unl.edu:1094",
+    "xrootd.t2.ucsd.edu:1094"]
+
+def sessionLines(rand, epoch, ctr):
+    """
+    Return the (epoch, line) pairs of one synthetic session starting at
+    epoch.
+    """
+    host = "n%d.%s" % (rand.randint(1, 400), rand.choice(domains))
+    jobid = "cmsprod.%d:%d@%s" % (rand.randint(1000, 99999),
+        rand.randint(1, 999), host)
+    filename = "/store/mc/Summer12/sample%d/AODSIM/%08x.root" % (ctr % 97,
+        ctr)
+    pid = rand.randint(1000, 40000)
+    duration = rand.randint(30, 6*3600)
+    lines = [(epoch, "%%s %d XrootdXeq: %s login as /DC=org/DC=doegrids/"
+        "OU=People/CN=Some User %d\n" % (pid, jobid, ctr % 50))]
+    if rand.random() < 0.5:
+        lines.append((epoch+1, "%%s %d Decode xrootd redirects %s to %s %s\n"
+            % (pid, jobid, rand.choice(redirect_sites), filename)))
+    else:
+        lines.append((epoch+1, "%%s %d %s ofs_open: 0-644 fn=%s\n" % (pid,
+            jobid, filename)))
+    lines.append((epoch+1, "%%s %d %s ofs_read: 4096@0 fn=%s\n" % (pid,
+        jobid, filename)))
+    lines.append((epoch+2, "%%s %d XrdXeq: %s pvt IPv4 login\n" % (pid,
+        jobid)))
+    lines.append((epoch+duration, "%%s %d XrootdXeq: %s disc %d:%02d:%02d\n"
+        % (pid, jobid, duration/3600, duration/60%60, duration%60)))
+    return lines
+
+def generateLines(start, rate=5, seed=0, end=None):
+    """
+    Generate log lines in time order, starting at epoch start, with about
+    rate new sessions per second, up to epoch end if given.
+    """
+    rand = random.Random(seed)
+    pending = []
+    epoch = start
+    ctr = 0
+    stamp_epoch, stamp = None, None
+    while end is None or epoch <= end:
+        for i in range(rand.randint(0, 2*rate)):
+            for entry in sessionLines(rand, epoch, ctr):
+                heapq.heappush(pending, entry)
+            ctr += 1
+        while pending and pending[0][0] <= epoch:
+            line_epoch, line = heapq.heappop(pending)
+            if line_epoch != stamp_epoch:
+                stamp_epoch = line_epoch
+                stamp = time.strftime("%y%m%d %H:%M:%S",
+                    time.localtime(line_epoch))
+            yield line % stamp
+        epoch += 1
+
+def writeLog(filename, size, start=None, rate=5, seed=0, end=None):
+    """
+    Write a synthetic log of about size bytes (None for no limit), or up to
+    epoch end, to filename.  Returns the number of lines written.
+    """
+    if start is None:
+        start = int(time.time()) - 86400
+    fp = open(filename, "w")
+    written = 0
+    lines = 0
+    buffer = []
+    for line in generateLines(start, rate=rate, seed=seed, end=end):
+        buffer.append(line)
+        written += len(line)
+        lines += 1
+        if len(buffer) >= 10000:
+            fp.write("".join(buffer))
+            buffer = []
+        if size is not None and written >= size:
+            break
+    fp.write("".join(buffer))
+    fp.close()
+    return lines
+
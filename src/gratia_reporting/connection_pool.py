@@ -0,0 +1,74 @@
+
+"""
+A bounded pool of database connections, shared by the reports run in one
+process, and kept open between the runs of the daemon.
+"""
+
+import Queue
+import threading
+
+# Connections open at once by default.
+pool_size = 4
+
+class ConnectionPool(object):
+    """
+    At most size connections made by connect(); a connection taken with
+    acquire is given back with release, or with discard if it may be broken.
+    """
+
+    def __init__(self, connect, size=pool_size):
+        self._connect = connect
+        self.size = size
+        self._idle = Queue.Queue()
+        self._slots = threading.Semaphore(size)
+
+    def acquire(self):
+        """
+        Return an idle connection, or a new one; blocks while size
+        connections are in use.
+        """
+        self._slots.acquire()
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Queue.Empty:
+                break
+            # An idle connection may have been closed by the server.
+            try:
+                conn.ping()
+                return conn
+            except Exception:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        try:
+            return self._connect()
+        except:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        self._idle.put(conn)
+        self._slots.release()
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._slots.release()
+
+    def close(self):
+        """
+        Close the idle connections.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -0,0 +1,266 @@
+
+"""
+Run the reports of a schedule in one long-running process.
+
+The schedule has the format of conf/gratia_reporting.cron: the five cron
+time fields, the user and the command running the report; the arguments
+after the report script (gratia_report, or python -c '...report.main()')
+are the arguments of the run.
+
+Each config file keeps its pool of database connections open between runs,
+and the results fetched for windows the query cache treats as closed are
+kept in memory for the later runs, as is the overflow analysis of a window
+which has ended; those of windows still open are fetched again by each
+run.  A run still going when it is due again is skipped.  The
+start, duration and outcome of the last run of each entry are logged and,
+with [Daemon] status_file, written there as JSON.
+"""
+
+import time
+import json
+import shlex
+import datetime
+import threading
+import traceback
+
+import gratia_reporting.report as report
+
+default_schedule = "/etc/gratia_reporting/gratia_reporting.cron"
+
+# (first, last) values of the minute, hour, day of month, month and day of
+# week fields; 7 is Sunday, as 0.
+field_ranges = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def parseField(field, first, last):
+    """
+    Return the set of values of a cron time field: a comma-separated list
+    of *, numbers and ranges, each with an optional /step.
+    """
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/", 1)
+            step = int(step)
+        if part == "*":
+            start, end = first, last
+        elif "-" in part:
+            start, end = [int(i) for i in part.split("-", 1)]
+        elif step != 1:
+            start, end = int(part), last
+        else:
+            start = end = int(part)
+        if start < first or end > last or start > end or step < 1:
+            raise Exception("Invalid schedule field %s." % field)
+        values.update(range(start, end+1, step))
+    return values
+
+def commandArguments(command):
+    """
+    Return the arguments given to the report script in a command.
+    """
+    args = shlex.split(command)
+    for ctr in range(len(args)-1, -1, -1):
+        if args[ctr].endswith("gratia_report") or \
+                args[ctr].find("report.main()") >= 0:
+            return args[ctr+1:]
+    raise Exception("No report script in the scheduled command %s." % \
+        command)
+
+class ScheduleEntry(object):
+    """
+    One line of the schedule.
+    """
+
+    def __init__(self, line):
+        fields = line.split(None, 6)
+        if len(fields) != 7:
+            raise Exception("Invalid schedule line: %s" % line)
+        self.line = line
+        self.minutes, self.hours, self.days, self.months, self.weekdays = \
+            [parseField(field, first, last) for field, (first, last) in \
+            zip(fields[:5], field_ranges)]
+        if 7 in self.weekdays:
+            self.weekdays.add(0)
+        # As in cron, a day matching either of the day fields is due when
+        # both are restricted.
+        self.anyDay = fields[2] != "*" and fields[4] != "*"
+        self.args = commandArguments(fields[6])
+        # Runs of entries with the same arguments never overlap.
+        self.key = " ".join(self.args)
+
+    def due(self, when):
+        """
+        Return True if the entry is due at the minute of when.
+        """
+        if when.minute not in self.minutes or when.hour not in self.hours \
+                or when.month not in self.months:
+            return False
+        day = when.day in self.days
+        weekday = when.isoweekday() % 7 in self.weekdays
+        if self.anyDay:
+            return day or weekday
+        return day and weekday
+
+def parseSchedule(filename):
+    """
+    Return the entries of a schedule file.
+    """
+    entries = []
+    fp = open(filename)
+    try:
+        for line in fp:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entries.append(ScheduleEntry(line))
+    finally:
+        fp.close()
+    return entries
+
+class Daemon(object):
+    """
+    Runs the entries of a schedule when they are due.
+    """
+
+    def __init__(self, entries, logger, status_file=None):
+        self.entries = entries
+        self._log = logger
+        self._status_file = status_file
+        self._lock = threading.Lock()
+        self._running = set()
+        # (config files, database) -> (config, connection pool, cache,
+        # memo of the results of closed windows)
+        self._resources = {}
+        # entry key -> {start, seconds, status}
+        self.last = {}
+        for entry in entries:
+            # Fail now on the arguments of the entries rather than at their
+            # first run.
+            options = report.parseArguments(list(entry.args))[3]
+            if not options.name:
+                raise Exception("No report specified in: %s" % entry.line)
+
+    def resources(self, options):
+        """
+        Return the config, the connection pool, the query cache and the
+        memo of the config files of a run; they are kept for the next runs.
+        """
+        key = (options.config, options.db)
+        self._lock.acquire()
+        try:
+            if key not in self._resources:
+                cp = report.readConfig(options)
+                self._resources[key] = (cp, report.connectionPool(cp),
+                    report.queryCache(cp), report.queryMemo(cp, True))
+            return self._resources[key]
+        finally:
+            self._lock.release()
+
+    def run(self, entry):
+        timer = -time.time()
+        start = datetime.datetime.now()
+        status = "ok"
+        try:
+            try:
+                loglevel, startDate, endDate, options = \
+                    report.parseArguments(list(entry.args))
+                cp, pool, cache, memo = self.resources(options)
+                if not options.cache:
+                    cache = None
+                tasks, mail = report.reportTasks(options, startDate, cp)
+                results = report.runReports(tasks, pool, cache, memo,
+                    self._log, cp, mail)
+                if not report.logTimings(results, self._log):
+                    status = "failed"
+            except (Exception, SystemExit):
+                status = "failed"
+                self._log.error("Scheduled run of %s failed:\n%s" % (
+                    entry.key, traceback.format_exc()))
+        finally:
+            timer += time.time()
+            self._lock.acquire()
+            try:
+                self._running.discard(entry.key)
+                self.last[entry.key] = {"start": start.strftime(
+                    "%Y-%m-%d %H:%M:%S"), "seconds": round(timer, 2),
+                    "status": status}
+            finally:
+                self._lock.release()
+            self.logStatus()
+
+    def start(self, entry):
+        """
+        Start a run of entry, unless the previous one is still going.
+        """
+        self._lock.acquire()
+        try:
+            if entry.key in self._running:
+                self._log.warning("Skipping %s: its previous run is still " \
+                    "going." % entry.key)
+                return
+            self._running.add(entry.key)
+        finally:
+            self._lock.release()
+        self._log.info("Starting %s." % entry.key)
+        thread = threading.Thread(target=self.run, args=(entry, ))
+        thread.setDaemon(True)
+        thread.start()
+
+    def logStatus(self):
+        """
+        Log the last runs, and write them to the status file.
+        """
+        self._lock.acquire()
+        try:
+            last = dict(self.last)
+        finally:
+            self._lock.release()
+        keys = last.keys()
+        keys.sort()
+        lines = ["Last runs:"]
+        for key in keys:
+            lines.append("%s %8.2f s %-6s %s" % (last[key]["start"],
+                last[key]["seconds"], last[key]["status"], key))
+        self._log.info("\n".join(lines))
+        if self._status_file:
+            fp = open(self._status_file, "w")
+            try:
+                json.dump(last, fp, indent=1)
+            finally:
+                fp.close()
+
+    def serve(self):
+        """
+        Start the entries due each minute, forever.
+        """
+        minute = (int(time.time()) // 60 + 1) * 60
+        while True:
+            time.sleep(max(minute - time.time(), 0))
+            when = datetime.datetime.fromtimestamp(minute)
+            for entry in self.entries:
+                if entry.due(when):
+                    self.start(entry)
+            minute += 60
+            if minute < time.time():
+                self._log.warning("The daemon fell behind its schedule; " \
+                    "skipping to the current minute.")
+                minute = (int(time.time()) // 60 + 1) * 60
+
+def serve(cp, logger):
+    """
+    Run the schedule of the [Daemon] section of cp.
+    """
+    try:
+        schedule = cp.get("Daemon", "schedule")
+    except:
+        schedule = default_schedule
+    try:
+        status_file = cp.get("Daemon", "status_file")
+    except:
+        status_file = None
+    entries = parseSchedule(schedule)
+    logger.info("Running %d scheduled reports from %s." % (len(entries),
+        schedule))
+    Daemon(entries, logger, status_file).serve()
+    return 0
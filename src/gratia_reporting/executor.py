@@ -0,0 +1,271 @@
+
+"""
+Run the database queries of the reports and keep statistics about them.
+
+Reports are given a QueryExecutor in place of the database connection; each
+query is logged and timed, and at the end of the run the driver logs the
+slowest queries and writes the statistics of all of them next to the
+archived report.  With a query_cache.QueryCache, results are looked up in
+the cache first; with a query_cache.QueryMemo, in the results already
+fetched by this process.
+
+Large results can be streamed instead: with a stream_cursor (for MySQLdb, a
+server-side SSCursor), stream fetches the rows in batches and hands them
+over one at a time, so they are never all held in memory; such results are
+neither cached nor memoized.
+
+With a replay.Recording, the results of the queries and the URLs fetched
+through urlopen are recorded, or, with a replay.Replay, handed over from an
+earlier recording; results are never streamed then.  Nor are they with a
+profiling.Profile, where each query is a phase of the profile, timed apart
+from the aggregation of its rows.
+"""
+
+import re
+import time
+import json
+import types
+import urllib2
+import StringIO
+from collections import namedtuple
+
+import gratia_reporting.profiling as profiling
+
+# Number of queries in the summary written to the log.
+summary_size = 10
+
+# Rows fetched at a time when streaming.
+stream_batch = 1000
+
+QueryStats = namedtuple("QueryStats", ["section", "statement", "wall",
+    "first_row", "rows", "bytes", "cached"])
+
+whitespace_re = re.compile(r"\s+")
+def normalizeStatement(stmt):
+    """
+    Collapse the whitespace of a statement into single spaces.
+    """
+    return whitespace_re.sub(" ", stmt).strip()
+
+def rowBytes(row):
+    """
+    Approximate the number of bytes of a row: the length of its strings,
+    eight bytes for anything else.
+    """
+    size = 0
+    for value in row:
+        if value is None:
+            continue
+        if isinstance(value, types.StringTypes):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+def describe(stmt, args):
+    """
+    Return the statement with its arguments quoted in place, for the log.
+    """
+    if isinstance(args, types.DictType):
+        return stmt % dict([(i, '"%s"' % j) for (i, j) in args.items()])
+    return stmt % tuple(['"%s"' % i for i in args])
+
+def readUrl(url):
+    """
+    Return the body of url.
+    """
+    fp = urllib2.urlopen(url)
+    try:
+        return fp.read()
+    finally:
+        fp.close()
+
+class QueryExecutor(object):
+    """
+    Executes the queries of a run on conn and records, for each, the report
+    section asking for it, the wall time, the time to the first row, the
+    number of rows and their approximate size.
+
+    stream_cursor, if given, opens the cursors of stream from conn.
+    """
+
+    def __init__(self, conn, log, cache=None, memo=None, stream_cursor=None,
+            recording=None, profile=None):
+        self._conn = conn
+        self._log = log
+        self.cache = cache
+        self.memo = memo
+        self.stream_cursor = stream_cursor
+        self.recording = recording
+        self.profile = profile
+        self.stats = []
+
+    def _query(self, stmt, args):
+        """
+        Return the rows of a query, the seconds to its first row and whether
+        they came from the cache.
+        """
+        timer = -time.time()
+        if self.cache is not None:
+            rows = self.cache.get(stmt, args)
+            if rows is not None:
+                return rows, timer + time.time(), True
+        curs = self._conn.cursor()
+        curs.execute(stmt, args)
+        row = curs.fetchone()
+        first_row = timer + time.time()
+        if row is None:
+            rows = []
+        else:
+            rows = [row]
+            rows.extend(curs.fetchall())
+        curs.close()
+        if self.cache is not None:
+            self.cache.put(stmt, args, rows)
+        return rows, first_row, False
+
+    def _fetch(self, stmt, args):
+        """
+        Return the result of _query, through the recording if there is one.
+        """
+        if self.recording is None:
+            return self._query(stmt, args)
+        return self.recording.query(stmt, args, lambda: self._query(stmt,
+            args))
+
+    def _remembered(self, stmt, args):
+        """
+        Return the result of _fetch, or the one memoized by the process.
+        """
+        if self.memo is None:
+            return self._fetch(stmt, args)
+        timer = -time.time()
+        result, memoized = self.memo.fetch(stmt, args,
+            lambda: self._fetch(stmt, args))
+        if memoized:
+            return result[0], timer + time.time(), True
+        return result
+
+    def execute(self, section, stmt, *args):
+        """
+        Execute stmt with args and return all of its rows.  section names
+        the part of the report the query is for, such as
+        "cmsxrootd.transfers".
+        """
+        if len(args) == 1 and isinstance(args[0], types.DictType):
+            args = args[0]
+        self._log.info(describe(stmt, args))
+        timer = -time.time()
+        rows, first_row, cached = profiling.run(self.profile, "query " + \
+            section, self._remembered, stmt, args)
+        timer += time.time()
+        size = 0
+        for row in rows:
+            size += rowBytes(row)
+        self.stats.append(QueryStats(section, normalizeStatement(stmt), timer,
+            first_row, len(rows), size, cached))
+        if cached:
+            self._log.info("Query result read from the cache in %.2f "
+                "seconds, %d rows." % (timer, len(rows)))
+        else:
+            self._log.info("Query took %.2f seconds, %d rows." % (timer,
+                len(rows)))
+        return rows
+
+    def stream(self, section, stmt, *args):
+        """
+        Generate the rows of stmt with args, fetched in batches of
+        stream_batch rows if the executor has a stream_cursor and all at
+        once through execute otherwise.  The wall time recorded includes the
+        time spent on the rows by the caller.
+        """
+        if self.stream_cursor is None or self.recording is not None or \
+                self.profile is not None:
+            for row in self.execute(section, stmt, *args):
+                yield row
+            return
+        if len(args) == 1 and isinstance(args[0], types.DictType):
+            args = args[0]
+        self._log.info(describe(stmt, args))
+        timer = -time.time()
+        first_row = None
+        rows = 0
+        size = 0
+        curs = self.stream_cursor(self._conn)
+        try:
+            curs.execute(stmt, args)
+            while True:
+                batch = curs.fetchmany(stream_batch)
+                if first_row is None:
+                    first_row = timer + time.time()
+                if not batch:
+                    break
+                rows += len(batch)
+                for row in batch:
+                    size += rowBytes(row)
+                    yield row
+        finally:
+            curs.close()
+            timer += time.time()
+            if first_row is None:
+                first_row = timer
+            self.stats.append(QueryStats(section, normalizeStatement(stmt),
+                timer, first_row, rows, size, False))
+            self._log.info("Query streamed in %.2f seconds, %d rows." % (
+                timer, rows))
+
+    def urlopen(self, url):
+        """
+        Return a file object holding the body of url, read through the
+        recording if there is one.
+        """
+        self._log.info("Fetching %s" % url)
+        if self.recording is None:
+            body = readUrl(url)
+        else:
+            body = self.recording.url(url, lambda: readUrl(url))
+        return StringIO.StringIO(body)
+
+    def slowest(self, count=None):
+        """
+        Return the statistics of the queries, slowest first.
+        """
+        stats = list(self.stats)
+        stats.sort(lambda s1, s2: cmp(s2.wall, s1.wall))
+        if count is not None:
+            stats = stats[:count]
+        return stats
+
+    def logSummary(self, count=summary_size):
+        """
+        Log the slowest queries of the run.
+        """
+        total = 0
+        cached = 0
+        for stats in self.stats:
+            total += stats.wall
+            cached += stats.cached
+        lines = ["%d queries (%d from the cache) took %.2f seconds; the "
+            "slowest:" % (len(self.stats), cached, total)]
+        for stats in self.slowest(count):
+            if stats.cached:
+                section = stats.section + " (cached)"
+            else:
+                section = stats.section
+            lines.append("%8.2f s %8.2f s to first row %9d rows %12d bytes  "
+                "%s" % (stats.wall, stats.first_row, stats.rows, stats.bytes,
+                section))
+        self._log.info("\n".join(lines))
+
+    def writeJson(self, filename, report=None):
+        """
+        Write the statistics of all the queries, slowest first, as JSON.
+        """
+        queries = []
+        for stats in self.slowest():
+            queries.append(stats._asdict())
+        fp = open(filename, "w")
+        try:
+            json.dump({"report": report, "queries": queries}, fp, indent=1)
+        finally:
+            fp.close()
@@ -1,10 +1,26 @@
 
 """
 This module allows one to easily make a table in both HTML and plain-text
+
+A table keeps its cells by column, as they were added: a column of only
+integers or only floats is an array of them, any other column a list.  The
+text of the cells (thousands separators, alignment) is only made when the
+table is rendered, a column at a time.
 """
 
 import re
+import cgi
+import csv
+import json
+import array
+import heapq
 import types
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 ftoa_re = re.compile(r'(?<=\d)(?=(\d\d\d)+(\.|$))')
 def ftoa(s):
@@ -14,16 +30,53 @@ def ftoa(s):
     """
     return ftoa_re.sub(',', str(s))
 
+try:
+    format(1000, ',')
+    def itoa(i):
+        """
+        ftoa for an integer, without the regular expression.
+        """
+        return format(i, ',')
+except (NameError, ValueError):
+    # Before Python 2.7
+    itoa = ftoa
+
+def storageType(entry):
+    """
+    Return the array typecode a cell can be kept as, or None.
+    """
+    if type(entry) in (types.IntType, types.LongType):
+        return 'l'
+    elif type(entry) == types.FloatType:
+        return 'd'
+    return None
+
+# Formats a table can be exported in: file extension -> Table method writing
+# the table in that format to a file object.
+export_writers = {"csv": "writeCsv", "jsonl": "writeJsonLines",
+    "npz": "writeNpz"}
+
 class Table:
 
     def __init__(self, add_numbers = True):
         self.headers = []
         self.headerLengths = []
         self.maxHeaderLen = 0
-        self.data = []
-        self.colors = []
+        # One array or list of raw cells per column.
+        self.columns = []
+        # Row index -> colors of the row, for the rows given colors.
+        self.colors = {}
+        # Row indexes a break comes before; a break after the last row has
+        # the number of rows.
+        self.breaks = []
+        self.rows = 0
+        # Indexes of the rows belonging to the row before them.
+        self.follows = set()
+        # See setLimit.
+        self.limit = None
+        self.limitColumn = None
+        self.limitTotals = []
         self.headerLines = 1
-        self.types = []
         self.rowCtr = 0
         self.add_numbers = add_numbers
 
@@ -40,6 +93,7 @@ class Table:
             self.headerLines = max(self.headerLines, len(splits))
             self.headerLengths.append(header_len)
             self.headers.append(splits)
+            self.columns.append([])
         self.maxHeaderLen = max(self.headerLengths)
 
     def formatEntry(self, entry):
@@ -65,7 +119,13 @@ class Table:
             return float
         return str
 
-    def addRow(self, data, colors=None):
+    def addRow(self, data, colors=None, follows=False):
+        """
+        Add a row of cells; with follows, the row belongs to the row before
+        it, and is kept or dropped with it when the table is limited.
+        """
+        if follows:
+            self.follows.add(self.rows)
         self.rowCtr += 1
         if self.add_numbers:
             data.insert(0, self.rowCtr)
@@ -74,22 +134,183 @@ class Table:
             if self.add_numbers:
                 colors.insert(0, None)
             assert len(data) == len(colors)
-        mytypes = [self.entryType(i) for i in data]
-        self.types.append(mytypes)
-        data = [self.formatEntry(i) for i in data]
+            self.colors[self.rows] = colors
         for i in range(len(data)):
-            if isinstance(data[i], types.TupleType):
-                mylen = len(data[i][0])
-            else:
-                mylen = len(data[i])
-            self.headerLengths[i] = max(self.headerLengths[i], mylen)
-        self.data.append(data)
-        self.colors.append(colors)
+            entry = data[i]
+            column = self.columns[i]
+            typecode = storageType(entry)
+            if isinstance(column, array.array):
+                if typecode == column.typecode:
+                    try:
+                        column.append(entry)
+                        continue
+                    except OverflowError:
+                        pass
+                column = list(column)
+                self.columns[i] = column
+            elif not self.rows and typecode is not None:
+                try:
+                    self.columns[i] = array.array(typecode, [entry])
+                    continue
+                except OverflowError:
+                    pass
+            column.append(entry)
+        self.rows += 1
 
     def addBreak(self):
-        self.data.append(None)
+        self.breaks.append(self.rows)
+
+    def columnIndex(self, header):
+        """
+        Return the index of the first column headed header, the lines of
+        the header joined by spaces.
+        """
+        headers = [' '.join(i) for i in self.headers]
+        try:
+            return headers.index(header)
+        except ValueError:
+            raise Exception("The table has no column headed %s." % header)
+
+    def setLimit(self, rows, column, totals=None):
+        """
+        Limit the table, when it is rendered limited (see limited), to the
+        rows rows with the largest numbers in the column headed column.  The
+        other rows are replaced by one row adding up their numbers in the
+        columns headed totals (column by default).  rows None for no limit.
+        """
+        if totals is None:
+            totals = [column]
+        self.limit = rows
+        self.limitColumn = self.columnIndex(column)
+        self.limitTotals = [self.columnIndex(i) for i in totals]
+
+    def isLimited(self):
+        """
+        Return True if the table has more rows than its limit.
+        """
+        return self.limit is not None and \
+            self.rows - len(self.follows) > self.limit
+
+    def limited(self):
+        """
+        Return the table as it is rendered limited: itself if it is within
+        its limit.  Otherwise, a table of the limit rows with the largest
+        numbers (and the rows following them), in the order they were added,
+        then a row counting and adding up the others.
+        """
+        if not self.isLimited():
+            return self
+        column = self.columns[self.limitColumn]
+        def rank(row):
+            if storageType(column[row]) is None:
+                return (0, 0)
+            return (1, column[row])
+        kept = heapq.nlargest(self.limit, [i for i in xrange(self.rows) if \
+            i not in self.follows], key=rank)
+        kept = set(kept)
+
+        table = Table(add_numbers=False)
+        table.setHeaders(['\n'.join(i) for i in self.headers])
+        table.rowCtr = self.rowCtr
+        breaks = set(self.breaks)
+        totals = dict([(i, 0) for i in self.limitTotals])
+        others = 0
+        keep = False
+        add_break = False
+        for row in xrange(self.rows):
+            if row in breaks:
+                add_break = True
+            if row not in self.follows:
+                keep = row in kept
+                if not keep:
+                    others += 1
+            if keep:
+                if add_break:
+                    table.addBreak()
+                    add_break = False
+                table.addRow([i[row] for i in self.columns],
+                    self.colors.get(row, None), row in self.follows)
+                continue
+            for col in self.limitTotals:
+                value = self.columns[col][row]
+                if storageType(value) is not None:
+                    totals[col] += value
+
+        data = [""] * len(self.columns)
+        label = True
+        for col in range(len(data)):
+            if col in totals:
+                data[col] = totals[col]
+            elif label and col != self.limitColumn and not (col == 0 and \
+                    self.add_numbers):
+                data[col] = "%i others" % others
+                label = False
+        table.addBreak()
+        table.addRow(data)
+        return table
+
+    def column(self, col):
+        """
+        Return the raw cells of column col.
+        """
+        return self.columns[col]
+
+    def formatColumn(self, col):
+        """
+        Return the text of each cell of column col, and which of them are
+        text rather than numbers (None if none are) and the link of each
+        cell (None if there are no links).
+        """
+        column = self.columns[col]
+        if isinstance(column, array.array):
+            if column.typecode == 'l':
+                return [itoa(i) for i in column], None, None
+            return [ftoa(i) for i in column], None, None
+        texts = []
+        is_text = []
+        links = None
+        row = 0
+        for entry in column:
+            if type(entry) == types.StringType:
+                texts.append(entry)
+                is_text.append(True)
+                row += 1
+                continue
+            is_text.append(self.entryType(entry) == types.StringType)
+            entry = self.formatEntry(entry)
+            if isinstance(entry, types.TupleType):
+                if links is None:
+                    links = [None] * len(column)
+                links[row] = entry[1]
+                entry = entry[0]
+            texts.append(entry)
+            row += 1
+        if True not in is_text:
+            is_text = None
+        return texts, is_text, links
+
+    def formatColumns(self):
+        """
+        Format every column (see formatColumn), and widen headerLengths to
+        fit the text of the cells.
+        """
+        formatted = [self.formatColumn(i) for i in range(len(self.columns))]
+        for i in range(len(formatted)):
+            texts = formatted[i][0]
+            if texts:
+                self.headerLengths[i] = max(self.headerLengths[i],
+                    max([len(j) for j in texts]))
+        return formatted
 
     def plainTextHeader(self):
+        self.formatColumns()
+        return self._plainTextHeader()
+
+    def plainTextFooter(self):
+        self.formatColumns()
+        return self._plainTextFooter()
+
+    def _plainTextHeader(self):
         table_len = 1 + sum([i+3 for i in self.headerLengths])
         output = '-' * table_len + '\n'
         for i in range(self.headerLines):
@@ -106,80 +327,250 @@ class Table:
         output += '-' * table_len + '\n'
         return output
      
-    def plainTextFooter(self):
+    def _plainTextFooter(self):
         table_len = 1 + sum([i+3 for i in self.headerLengths])
         output = '-' * table_len + '\n'
         return output
 
     perc_re = re.compile(r"-?(\d+)%")
-    def plainTextBody(self):
+    def leftAligned(self, formatted):
+        """
+        Return, for each of the formatted columns, which cells are aligned
+        left: the text, but for percentages; None if no cell is.
+        """
+        aligns = []
+        for texts, is_text, links in formatted:
+            if is_text is None:
+                aligns.append(None)
+            else:
+                perc_re = self.perc_re
+                aligns.append([is_text[i] and not perc_re.match(texts[i]) \
+                    for i in range(len(texts))])
+        return aligns
+
+    def _plainTextBodyLines(self, formatted):
+        """
+        Generate the lines of the body of the table from its formatted
+        columns.  The format of a row is built once for each combination of
+        left (text) and right (numbers, percentages) aligned cells.
+        """
         header_cnt = len(self.headers)
-        output = ''
-        idx = 0
         table_len = sum([i+3 for i in self.headerLengths])-1
-        for row in self.data:
-            rowtypes = self.types[idx]
-            output += '|'
-            if row == None:
-                output += '-' * table_len + '|\n'
-                continue
-            for i in range(header_cnt):
-                if isinstance(row[i], types.TupleType):
-                    val = row[i][0]
-                else:
-                    val = row[i]
-                if rowtypes[i] == types.StringType and not \
-                        self.perc_re.match(val):
-                    output += (' %%-%is |' % self.headerLengths[i]) % \
-                        val
-                else:
-                    output += (' %%%is |' % self.headerLengths[i]) % \
-                        val
-            output += '\n'
-            idx += 1
-        return output
+        rule = '|' + '-' * table_len + '|\n'
+        left = [' %%-%is |' % i for i in self.headerLengths]
+        right = [' %%%is |' % i for i in self.headerLengths]
+        aligns = []
+        for left_aligned in self.leftAligned(formatted):
+            if left_aligned is None:
+                left_aligned = itertools.repeat(False)
+            aligns.append(left_aligned)
+        formats = {}
+        breaks = iter(self.breaks + [None])
+        next_break = breaks.next()
+        row = 0
+        for values, align in itertools.izip(itertools.izip(*[i[0] for i in \
+                formatted]), itertools.izip(*aligns)):
+            while next_break == row:
+                yield rule
+                next_break = breaks.next()
+            format = formats.get(align, None)
+            if format is None:
+                format = '|%s\n' % ''.join([(align[i] and left[i]) or \
+                    right[i] for i in range(header_cnt)])
+                formats[align] = format
+            yield format % values
+            row += 1
+        while next_break is not None:
+            yield rule
+            next_break = breaks.next()
+
+    def plainTextBodyLines(self):
+        """
+        Generate the lines of the body of the table.
+        """
+        return self._plainTextBodyLines(self.formatColumns())
+
+    def plainTextBody(self):
+        return ''.join(self.plainTextBodyLines())
+
+    def plainTextLines(self):
+        """
+        Generate the plain text of the table, a line at a time.
+        """
+        formatted = self.formatColumns()
+        yield self._plainTextHeader()
+        for line in self._plainTextBodyLines(formatted):
+            yield line
+        yield self._plainTextFooter()
 
     def plainText(self):
-        return self.plainTextHeader() + self.plainTextBody() + \
-            self.plainTextFooter()
+        return ''.join(self.plainTextLines())
+
+    def writePlainText(self, fp):
+        """
+        Write the plain text of the table to the file object fp.
+        """
+        fp.writelines(self.plainTextLines())
+
+    def htmlLines(self, css_class="mytable"):
+        """
+        Generate the HTML of the table, a row at a time.  The cells are
+        styled by the stylesheet of the page (rendering.stylesheet): the
+        cells aligned right have the class num, the rows after a break the
+        class break.  Only colored cells have a style of their own.  As in
+        the plain text, the format of a row is built once for each
+        combination of aligned cells.
+        """
+        formatted = self.formatColumns()
+        aligns = []
+        for left_aligned in self.leftAligned(formatted):
+            if left_aligned is None:
+                left_aligned = itertools.repeat(False)
+            aligns.append(left_aligned)
+        # The text of the cells; only text needs escaping.
+        columns = []
+        for texts, is_text, links in formatted:
+            if is_text is not None:
+                texts = [i.replace('&', '&amp;').replace('<', '&lt;').replace(
+                    '>', '&gt;') for i in texts]
+            if links is not None:
+                for i in range(len(texts)):
+                    if links[i] is not None:
+                        texts[i] = '<a href="%s">%s</a>' % (cgi.escape(str(
+                            links[i]), True), texts[i])
+            columns.append(texts)
 
-    def html(self, css_class="mytable"):
         header = ''
         for entry in self.headers:
-            header += "<th>%s</th>" % ' '.join([i.replace('\n','<br/>') for i \
-                in entry])
-        output = """<table class="%s">\n\t<thead>%s</thead>\n""" % \
+            header += "<th>%s</th>" % '<br/>'.join([cgi.escape(i) for i in \
+                entry])
+        yield '<table class="%s">\n<thead><tr>%s</tr></thead>\n<tbody>\n' % \
             (css_class, header)
+        cells = ['<td class="num">%s</td>', '<td>%s</td>']
+        formats = {}
+        breaks = set(self.breaks)
         ctr = 0
-        add_thick_border = False
-        for row in self.data:
-            if row == None:
-                add_thick_border = True
-                continue
-            if add_thick_border:
-                output += '\t<tr style="border-top-width: %spx"> ' % '3'
+        for values, align in itertools.izip(itertools.izip(*columns),
+                itertools.izip(*aligns)):
+            if ctr in breaks:
+                start = '<tr class="break">'
+            else:
+                start = '<tr>'
+            colors = self.colors.get(ctr, None)
+            if colors:
+                row = []
+                for i in range(len(values)):
+                    attributes = ''
+                    if not align[i]:
+                        attributes = ' class="num"'
+                    if colors[i]:
+                        attributes += ' style="background-color: %s"' % \
+                            colors[i]
+                    row.append('<td%s>%s</td>' % (attributes, values[i]))
+                yield '%s%s</tr>\n' % (start, ''.join(row))
             else:
-                output += "\t<tr> "
-            col_ctr = 0
-            rowtypes = self.types[col_ctr]
-            for entry in row:
-                align = 'right'
-                color = 'white'
-                if rowtypes[col_ctr] == types.StringType:
-                    align = 'left'
-                if self.colors[ctr] and self.colors[ctr][col_ctr]:
-                    color = self.colors[ctr][col_ctr]
-                if isinstance(entry, types.TupleType):
-                    entry = '<a href="%s">%s</a>' % (entry[1], entry[0])
-                output += '<td style="background-color: %s; text-align: %s;'\
-                    ' border-top-width: %spx;">%s</td>' % (color, align,
-                    int(add_thick_border)*3, entry)
-                col_ctr += 1
-            output += " </tr>\n"
-            if add_thick_border == True:
-                add_thick_border = False
+                format = formats.get(align, None)
+                if format is None:
+                    format = ''.join([cells[i] for i in align]) + '</tr>\n'
+                    formats[align] = format
+                yield start + format % values
             ctr += 1
-        output += "</table>"
-        return output
+        yield "</tbody></table>\n"
+
+    def html(self, css_class="mytable"):
+        return ''.join(self.htmlLines(css_class))
+
+    def writeHtml(self, fp, css_class="mytable"):
+        """
+        Write the HTML of the table to the file object fp.
+        """
+        fp.writelines(self.htmlLines(css_class))
+
+    def columnNames(self):
+        """
+        Return the name of each column: its header on one line, or
+        column<number> for a column without a header.
+        """
+        names = []
+        for i in range(len(self.headers)):
+            name = ' '.join(self.headers[i]).strip()
+            if not name:
+                name = "column%d" % i
+            names.append(name)
+        return names
 
+    def exportColumn(self, col):
+        """
+        Return the raw cells of column col, with the text of the links in
+        place of the links.
+        """
+        column = self.columns[col]
+        if isinstance(column, array.array):
+            return column
+        values = []
+        for entry in column:
+            if isinstance(entry, types.TupleType):
+                entry = entry[0]
+            values.append(entry)
+        return values
+
+    def exportRows(self):
+        """
+        Generate the rows of the table as tuples of raw cells; the breaks
+        are left out.
+        """
+        return itertools.izip(*[self.exportColumn(i) for i in \
+            range(len(self.columns))])
+
+    def writeCsv(self, fp):
+        """
+        Write the table to the file object fp as CSV, the column names
+        first.
+        """
+        writer = csv.writer(fp)
+        writer.writerow(self.columnNames())
+        writer.writerows(self.exportRows())
+
+    def jsonLines(self):
+        """
+        Generate the rows of the table as JSON objects, one per line, with
+        the keys in the order of the columns.
+        """
+        names = [json.dumps(i) + ": " for i in self.columnNames()]
+        for row in self.exportRows():
+            yield "{%s}\n" % ", ".join([names[i] + json.dumps(row[i]) for i \
+                in range(len(names))])
+
+    def writeJsonLines(self, fp):
+        fp.writelines(self.jsonLines())
+
+    def writeNpz(self, fp):
+        """
+        Write the table to the file object fp as a compressed NumPy archive:
+        the array headers holds the column names, column<number> the cells
+        of each column (numbers for the columns of integers or floats, text
+        otherwise).
+        """
+        if numpy is None:
+            raise Exception("Writing a table as npz needs NumPy.")
+        arrays = {"headers": numpy.array(self.columnNames())}
+        for i in range(len(self.columns)):
+            column = self.exportColumn(i)
+            if isinstance(column, array.array):
+                column = numpy.array(column, dtype=column.typecode)
+            else:
+                column = numpy.array([(j is not None and str(j)) or "" for \
+                    j in column], dtype=str)
+            arrays["column%d" % i] = column
+        numpy.savez_compressed(fp, **arrays)
 
+    def export(self, format, fp):
+        """
+        Write the table to the file object fp in format, one of
+        export_writers.
+        """
+        try:
+            writer = export_writers[format]
+        except KeyError:
+            raise Exception("Unknown table export format %s." % format)
+        getattr(self, writer)(fp)
@@ -0,0 +1,143 @@
+
+"""
+Break a run into phases and measure each of them.
+
+A phase records its wall time, the CPU time of the process during it and
+the peak resident set of the process at its end, with how much the phase
+raised it.  Phases nest (the queries of a report run within its
+aggregation); each records its time both with and without the phases run
+within it.  The CPU time and the memory are those of the whole process, so
+with several reports run at once they include the other reports.
+
+With cprofile, the top-level phases run under cProfile; the statistics of
+the slowest of them are kept.
+"""
+
+import os
+import json
+import time
+import pstats
+import cProfile
+import resource
+import StringIO
+import threading
+
+def cpuTime():
+    times = os.times()
+    return times[0] + times[1]
+
+def peakRss():
+    """
+    Return the peak resident set of the process, in bytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+class Profile(object):
+    """
+    The phases of a run; each thread has its own stack of phases.
+    """
+
+    def __init__(self, cprofile=False):
+        self.cprofile = cprofile
+        self.phases = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.time()
+        # (wall, phase name, cProfile.Profile) of the slowest top-level phase
+        self.slowest = None
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def start(self, name):
+        stack = self._stack()
+        profiler = None
+        if self.cprofile and not stack:
+            profiler = cProfile.Profile()
+        stack.append({"name": name, "wall": time.time(), "cpu": cpuTime(),
+            "rss": peakRss(), "child_wall": 0, "child_cpu": 0,
+            "profiler": profiler})
+        if profiler is not None:
+            profiler.enable()
+
+    def stop(self):
+        stack = self._stack()
+        phase = stack.pop()
+        wall = time.time() - phase["wall"]
+        cpu = cpuTime() - phase["cpu"]
+        rss = peakRss()
+        if phase["profiler"] is not None:
+            phase["profiler"].disable()
+        path = [i["name"] for i in stack] + [phase["name"]]
+        if stack:
+            stack[-1]["child_wall"] += wall
+            stack[-1]["child_cpu"] += cpu
+        record = {"phase": " / ".join(path), "depth": len(stack),
+            "start": round(phase["wall"] - self._start, 6), "wall": wall,
+            "cpu": cpu, "self_wall": wall - phase["child_wall"],
+            "self_cpu": cpu - phase["child_cpu"], "peak_rss": rss,
+            "rss_growth": rss - phase["rss"]}
+        self._lock.acquire()
+        try:
+            self.phases.append(record)
+            if phase["profiler"] is not None and (self.slowest is None or \
+                    wall > self.slowest[0]):
+                self.slowest = (wall, record["phase"], phase["profiler"])
+        finally:
+            self._lock.release()
+
+    def run(self, name, function, *args):
+        """
+        Return function(*args), called as the phase name.
+        """
+        self.start(name)
+        try:
+            return function(*args)
+        finally:
+            self.stop()
+
+    def slowestStats(self, count=30):
+        """
+        Return the name of the slowest top-level phase and the functions
+        taking the most time in it, as text; None if nothing was profiled.
+        """
+        if self.slowest is None:
+            return None
+        wall, name, profiler = self.slowest
+        output = StringIO.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats("cumulative").print_stats(count)
+        return name, output.getvalue()
+
+    def writeJson(self, filename):
+        """
+        Write the phases, in the order they started, to filename; with
+        cprofile, the statistics of the slowest phase go to filename.prof,
+        for pstats.
+        """
+        phases = list(self.phases)
+        phases.sort(lambda p1, p2: cmp(p1["start"], p2["start"]))
+        slowest = None
+        if self.slowest is not None:
+            slowest = self.slowest[1]
+            self.slowest[2].dump_stats(filename + ".prof")
+        fp = open(filename, "w")
+        try:
+            json.dump({"wall": time.time() - self._start, "peak_rss":
+                peakRss(), "slowest_profiled": slowest, "phases": phases}, fp,
+                indent=1)
+        finally:
+            fp.close()
+
+def run(profile, name, function, *args):
+    """
+    Return function(*args), called as the phase name of profile if there is
+    one.
+    """
+    if profile is None:
+        return function(*args)
+    return profile.run(name, function, *args)
@@ -0,0 +1,283 @@
+
+"""
+An on-disk cache of query results.
+
+Results are kept in a directory, one pickle per query, under a digest of the
+normalized statement and its parameters.  The latest date among the
+parameters is taken as the end of the window the query covers (in UTC, as
+the database keeps dates): a window which ended more than `lag` seconds ago
+is closed and its result is kept until it is evicted; any other result
+expires after `ttl` seconds.  Once the directory holds more than `size`
+bytes, the least recently used results are removed.
+
+A QueryMemo keeps, in memory, the last `size` results fetched (or computed)
+by the reports of one process; given a lag, only those of closed windows.
+"""
+
+import os
+import time
+import errno
+import types
+import cPickle
+import hashlib
+import datetime
+import tempfile
+import threading
+
+import gratia_reporting.executor as executor
+
+# Results of windows which ended this many seconds ago never expire.
+cache_lag = 2*86400
+
+# Seconds the results of the other queries are kept.
+cache_ttl = 3600
+
+# Bytes the cache directory may hold.
+cache_size = 1024*1024**2
+
+# Results a QueryMemo keeps.
+memo_size = 200
+
+date_formats = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d"]
+
+def parseDate(value):
+    """
+    Return the value of a query parameter as a datetime, or None if it is
+    not a date.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        # A date stands for the whole day.
+        return datetime.datetime(value.year, value.month, value.day) + \
+            datetime.timedelta(1, 0)
+    if isinstance(value, types.StringTypes):
+        for format in date_formats:
+            try:
+                return datetime.datetime(*time.strptime(value, format)[:6])
+            except ValueError:
+                pass
+    return None
+
+def windowEnd(args):
+    """
+    Return the latest date among the parameters of a query, or None.
+    """
+    if isinstance(args, types.DictType):
+        args = args.values()
+    end = None
+    for value in args:
+        value = parseDate(value)
+        if value is not None and (end is None or value > end):
+            end = value
+    return end
+
+def windowClosed(end, lag):
+    """
+    Return True if a window ending at end, a datetime or None, ended more
+    than lag seconds ago.  Dates are in UTC, as in the database.
+    """
+    return end is not None and end < datetime.datetime.utcnow() - \
+        datetime.timedelta(0, lag)
+
+def cacheKey(stmt, args):
+    """
+    Return the key of a query: a digest of its normalized statement and its
+    parameters.
+    """
+    if isinstance(args, types.DictType):
+        args = args.items()
+        args.sort()
+    return hashlib.md5("%s\0%r" % (executor.normalizeStatement(stmt),
+        tuple(args))).hexdigest()
+
+class QueryCache(object):
+    """
+    The query results kept in directory.
+    """
+
+    def __init__(self, directory, size=cache_size, lag=cache_lag,
+            ttl=cache_ttl):
+        self.directory = directory
+        self.size = size
+        self.lag = lag
+        self.ttl = ttl
+        try:
+            os.makedirs(directory)
+        except OSError, oe:
+            if oe.errno != errno.EEXIST:
+                raise
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def expiry(self, args):
+        """
+        Return when the result of a query with args expires, as an epoch, or
+        None if it never does.
+        """
+        if windowClosed(windowEnd(args), self.lag):
+            return None
+        return time.time() + self.ttl
+
+    def get(self, stmt, args):
+        """
+        Return the cached rows of a query, or None.
+        """
+        filename = self.filename(cacheKey(stmt, args))
+        try:
+            fp = open(filename, "rb")
+        except IOError:
+            return None
+        try:
+            try:
+                expires, rows = cPickle.load(fp)
+            except Exception:
+                expires, rows = 0, None
+        finally:
+            fp.close()
+        if expires is not None and expires < time.time():
+            self._remove(filename)
+            return None
+        try:
+            # The modification time orders the results for the eviction.
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return rows
+
+    def put(self, stmt, args, rows):
+        """
+        Cache the rows of a query, evicting old results if the cache is full.
+        """
+        fd, tmpname = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        fp = os.fdopen(fd, "wb")
+        try:
+            cPickle.dump((self.expiry(args), rows), fp, 2)
+        finally:
+            fp.close()
+        os.rename(tmpname, self.filename(cacheKey(stmt, args)))
+        self.evict()
+
+    def _remove(self, filename):
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache fits in its
+        size.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pickle"):
+                continue
+            filename = os.path.join(self.directory, name)
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, filename))
+            total += st.st_size
+        if total <= self.size:
+            return
+        entries.sort()
+        for mtime, size, filename in entries:
+            if total <= self.size:
+                break
+            self._remove(filename)
+            total -= size
+
+class QueryMemo(object):
+    """
+    The results of the queries run so far, shared by the executors of the
+    reports run side by side in a process; in a backfill, the windows of
+    consecutive days overlap.  A query asked for while another thread runs
+    it waits for that result.
+
+    At most size results are kept: past that, the least recently used one
+    is dropped, so a backfill holds about those of the days its workers are
+    on rather than those of the whole range.  With a lag, as that of a
+    QueryCache, only the results of windows which ended more than lag
+    seconds ago are kept; the others may still change, and are computed
+    again each time.  A result may be remembered with a lag of its own, as
+    one computed from what had ended within its window.
+    """
+
+    def __init__(self, size=memo_size, lag=None):
+        self.size = size
+        self.lag = lag
+        self._cond = threading.Condition()
+        self._results = {}
+        self._running = {}
+        # key -> tick of its last use, which orders the eviction
+        self._used = {}
+        self._tick = 0
+
+    def keeps(self, end, lag=None):
+        """
+        Return True if the results of a window ending at end are kept, with
+        lag in place of that of the memo if it is given.
+        """
+        if self.lag is None:
+            return True
+        if lag is None:
+            lag = self.lag
+        return windowClosed(end, lag)
+
+    def _use(self, key):
+        self._tick += 1
+        self._used[key] = self._tick
+
+    def _evict(self):
+        """
+        Drop the least recently used results until at most size are kept.
+        """
+        while len(self._results) > self.size:
+            key = min(self._used, key=self._used.get)
+            del self._results[key]
+            del self._used[key]
+
+    def remember(self, key, compute, end=None, lag=None):
+        """
+        Return the result kept under key, calling compute() for it if there
+        is none yet, and whether it was already there.  end is the end of
+        the window the result covers, lag the one to keep it with (see
+        keeps).
+        """
+        self._cond.acquire()
+        try:
+            while key in self._running:
+                self._cond.wait()
+            if key in self._results:
+                self._use(key)
+                return self._results[key], True
+            self._running[key] = True
+        finally:
+            self._cond.release()
+        result = None
+        try:
+            result = compute()
+        finally:
+            self._cond.acquire()
+            try:
+                del self._running[key]
+                if result is not None and self.keeps(end, lag):
+                    self._results[key] = result
+                    self._use(key)
+                    self._evict()
+                self._cond.notifyAll()
+            finally:
+                self._cond.release()
+        return result, False
+
+    def fetch(self, stmt, args, run):
+        """
+        Return the result of a query, calling run() if it was never fetched,
+        and whether it was already there.
+        """
+        return self.remember(cacheKey(stmt, args), run, windowEnd(args))
@@ -0,0 +1,145 @@
+
+"""
+Reports compute their result once, as a list of blocks, and render that
+result as plain text (logged) and HTML (the email and the archived report).
+
+A block is either a string, copied as is, or a make_table.Table.  In the
+email, a table over its limit (make_table.Table.setLimit) only has its
+largest rows; the archived report has every row.  In HTML, the strings are
+preformatted text and the tables HTML tables, styled by one stylesheet in
+the head of the page.
+"""
+
+import cgi
+
+import gratia_reporting.make_table as make_table
+
+# The stylesheet of the HTML reports; make_table.Table.htmlLines uses its
+# classes.
+stylesheet = """
+table.mytable { border-collapse: collapse; margin: 0.5em 0; }
+table.mytable th, table.mytable td { border: 1px solid #999;
+  padding: 0.1em 0.5em; text-align: left; }
+table.mytable th { background-color: #ddd; }
+table.mytable td.num { text-align: right; }
+table.mytable tr.break td { border-top-width: 3px; }
+pre { margin: 0; }
+"""
+
+def plainLines(blocks, full=False):
+    """
+    Generate the plain text of blocks a piece at a time: the strings as
+    they are, the tables a line at a time.  The tables are limited (see
+    make_table.Table.setLimit) unless full.
+    """
+    for block in blocks:
+        if isinstance(block, make_table.Table):
+            if not full:
+                block = block.limited()
+            for line in block.plainTextLines():
+                yield line
+        else:
+            yield block
+
+def renderPlain(blocks, full=False):
+    return "".join(plainLines(blocks, full))
+
+def htmlLines(blocks, full=False):
+    """
+    Generate the HTML of blocks a piece at a time: the strings, those next
+    to each other together, in a pre element, the tables a row at a time.
+    The tables are limited unless full.
+    """
+    text = []
+    for block in blocks:
+        if isinstance(block, make_table.Table):
+            if ''.join(text).strip():
+                yield '<pre>%s</pre>\n' % cgi.escape(''.join(text))
+            text = []
+            if not full:
+                block = block.limited()
+            for line in block.htmlLines():
+                yield line
+        else:
+            text.append(block)
+    if ''.join(text).strip():
+        yield '<pre>%s</pre>\n' % cgi.escape(''.join(text))
+
+def renderHtml(blocks, full=False):
+    return "".join(htmlLines(blocks, full))
+
+def writePlain(blocks, fp, full=False):
+    """
+    Write the plain text of blocks to the file object fp.
+    """
+    fp.writelines(plainLines(blocks, full))
+
+def writeHtml(blocks, fp, full=False):
+    """
+    Write the HTML of blocks to the file object fp.
+    """
+    fp.writelines(htmlLines(blocks, full))
+
+def pageHeader(title):
+    """
+    Return the start of an HTML page titled title, up to its body.
+    """
+    return '<html><head><title>%s</title><style type="text/css">%s' \
+        '</style></head><body>\n' % (cgi.escape(title), stylesheet)
+
+page_footer = "</body></html>\n"
+
+def renderPage(title, body):
+    return pageHeader(title) + body + page_footer
+
+def tableLimit(cp, report):
+    """
+    Return the rows the largest tables of report are limited to in its
+    email, from the [Table Limits] section, or None.
+    """
+    try:
+        return cp.getint("Table Limits", report)
+    except:
+        return None
+
+class BaseReport(object):
+    """
+    The rendering half of a report.  Each report class defines
+    computeResult(self), which runs the queries and aggregation still to be
+    done and returns the blocks of the report; it is only ever called once,
+    however many times the report is rendered.
+    """
+
+    _result = None
+    _plain = None
+
+    def result(self):
+        if self._result is None:
+            self._result = self.computeResult()
+        return self._result
+
+    def rendered(self, text):
+        """
+        Called with the plain text of the report the first time it is
+        rendered.
+        """
+        pass
+
+    def generatePlain(self):
+        if self._plain is None:
+            self._plain = renderPlain(self.result())
+            self.rendered(self._plain)
+        return self._plain
+
+    def generateHtml(self):
+        """
+        Return the HTML of the report as it is emailed.
+        """
+        return renderHtml(self.result())
+
+    def writeHtml(self, fp):
+        """
+        Write the HTML of the report, with every row of its tables, to the
+        file object fp.
+        """
+        writeHtml(self.result(), fp, True)
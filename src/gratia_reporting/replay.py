@@ -0,0 +1,140 @@
+
+"""
+Record what a run reads from its data sources, and run it again from the
+recording.
+
+With gratia_report --record FILE, the rows of every query, the body of every
+URL fetched (the OIM resource groups) and the session columns built from the
+xrootd logs by the overflow analysis are kept, and written to FILE, a
+gzipped pickle, at the end of the run, with the reports and dates run.
+gratia_report --replay FILE runs those reports again from FILE, without the
+database, the network or the logs; a report reading anything which was not
+recorded fails.
+"""
+
+import gzip
+import types
+import cPickle
+import threading
+
+import gratia_reporting.query_cache as query_cache
+
+# Version of the recording format.
+version = 1
+
+class Recording(object):
+    """
+    The data read by a run, recorded as it is read.  The executors and the
+    overflow analyses of a run share one recording.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # cacheKey(stmt, args) -> rows
+        self.queries = {}
+        # url -> body
+        self.urls = {}
+        # (first, last) epochs of the logs read -> xrootd_log.SessionColumns
+        self.sessions = {}
+        # (report name, start date) of the run
+        self.tasks = []
+
+    def _keep(self, table, key, value):
+        self._lock.acquire()
+        try:
+            table[key] = value
+        finally:
+            self._lock.release()
+        return value
+
+    def query(self, stmt, args, run):
+        """
+        Return the (rows, seconds to the first row, cached) of run(), the
+        query of stmt with args, and keep its rows.
+        """
+        result = run()
+        self._keep(self.queries, query_cache.cacheKey(stmt, args), result[0])
+        return result
+
+    def url(self, url, fetch):
+        """
+        Return the body fetch() read from url, and keep it.
+        """
+        return self._keep(self.urls, url, fetch())
+
+    def sessionColumns(self, window, build):
+        """
+        Return the session columns build() made from the logs of window,
+        and keep them.
+        """
+        return self._keep(self.sessions, window, build())
+
+    def save(self, filename):
+        fp = gzip.open(filename, "wb")
+        try:
+            cPickle.dump({"version": version, "queries": self.queries,
+                "urls": self.urls, "sessions": self.sessions,
+                "tasks": self.tasks}, fp, 2)
+        finally:
+            fp.close()
+
+class Replay(Recording):
+    """
+    The data recorded by an earlier run, handed over instead of being read
+    again.
+    """
+
+    def _recorded(self, table, key, what):
+        try:
+            return table[key]
+        except KeyError:
+            raise Exception("%s was not recorded." % what)
+
+    def query(self, stmt, args, run):
+        rows = self._recorded(self.queries, query_cache.cacheKey(stmt, args),
+            "The query %s with %r" % (stmt.strip(), args))
+        return rows, 0, True
+
+    def url(self, url, fetch):
+        return self._recorded(self.urls, url, "The URL %s" % url)
+
+    def sessionColumns(self, window, build):
+        return self._recorded(self.sessions, window, "The xrootd sessions " \
+            "of %s-%s" % window)
+
+    def save(self, filename):
+        raise Exception("A replay is not recorded again.")
+
+def load(filename):
+    """
+    Return the Replay of the recording in filename.
+    """
+    fp = gzip.open(filename, "rb")
+    try:
+        data = cPickle.load(fp)
+    finally:
+        fp.close()
+    if not isinstance(data, types.DictType) or data.get("version") != \
+            version:
+        raise Exception("%s is not a recording of this version." % filename)
+    replay = Replay()
+    replay.queries = data["queries"]
+    replay.urls = data["urls"]
+    replay.sessions = data["sessions"]
+    replay.tasks = data["tasks"]
+    return replay
+
+class NoDatabase(object):
+    """
+    Stands in for the database connections of a replay; a query reaching it
+    was not recorded.
+    """
+
+    def cursor(self, *args):
+        raise Exception("A query of the replay was not recorded.")
+
+    def ping(self):
+        pass
+
+    def close(self):
+        pass
@@ -4,9 +4,12 @@
 
 import os
 import sys
+import cgi
 import time
 import urllib2
 import traceback
+import threading
+import Queue
 import optparse
 import logging
 import smtplib
@@ -24,6 +27,15 @@ from email.Utils import formataddr
 from email.quopriMIME import encode
 
 import MySQLdb
+import MySQLdb.cursors
+
+import gratia_reporting.executor as executor
+import gratia_reporting.make_table as make_table
+import gratia_reporting.rendering as rendering
+import gratia_reporting.connection_pool as connection_pool
+import gratia_reporting.query_cache as query_cache
+import gratia_reporting.replay as replay
+import gratia_reporting.profiling as profiling
 
 if not '.' in sys.path:
     sys.path.append('.')
@@ -37,9 +49,10 @@ def getValidDate(date):
     time_t = time.strptime(date, '%Y/%m/%d')
     return datetime.datetime(*time_t[:6])
 
-def parseArguments():
+def parseArguments(args=None):
     """
-    Parse the command-line arguments and return the values as a tuple.
+    Parse the command-line arguments (or args) and return the values as a
+    tuple.
     """
     parser = optparse.OptionParser()
     parser.add_option("-l", "--loglevel", dest="loglevel", default="info", \
@@ -55,10 +68,42 @@ def parseArguments():
     parser.add_option("-r", "--relDate", dest="rel", default=None, \
         help="Relative date to use (today|yesterday|week|month)")
     parser.add_option('-n', '--name', dest='name', default=None,
-        help="Gratia Report name")
+        help="Gratia Report name; a comma-separated list of names runs " \
+        "several reports")
     parser.add_option("-D", "--dev", dest="dev", default=False,
         action="store_true", help="Development protection flag.")
-    options, args = parser.parse_args()
+    parser.add_option("--no-cache", dest="cache", default=True,
+        action="store_false", help="Do not use the query cache.")
+    parser.add_option("--backfill", dest="backfill", default=None,
+        help="Archive the reports of every day from START to END " \
+        "(format: 2008/08/04:2008/08/31) without emailing them.")
+    parser.add_option("--email", dest="email", default=False,
+        action="store_true", help="Email the reports of a backfill or a " \
+        "replay too.")
+    parser.add_option("--daemon", dest="daemon", default=False,
+        action="store_true", help="Run the reports of the schedule in " \
+        "the [Daemon] section of the config file, in one process.")
+    parser.add_option("--record", dest="record", default=None,
+        help="Record the query results, URLs and xrootd sessions read by " \
+        "the run to this file.")
+    parser.add_option("--replay", dest="replay", default=None,
+        help="Run the reports again from a file written with --record, " \
+        "without the database, the network or the logs; without -n, the " \
+        "recorded reports and dates are run.")
+    parser.add_option("--profile", dest="profile", default=None,
+        help="Write the wall time, CPU time and peak memory of each phase " \
+        "of the run to this JSON file.")
+    parser.add_option("--profile-slowest", dest="profile_slowest",
+        default=False, action="store_true", help="With --profile, also " \
+        "run the phases under cProfile and save the statistics of the " \
+        "slowest one next to the JSON file, as FILE.prof.")
+    options, args = parser.parse_args(args)
+    if options.record and options.replay:
+        raise Exception("--record and --replay exclude each other.")
+    if options.daemon and (options.record or options.replay):
+        raise Exception("The daemon can neither record nor replay.")
+    if options.daemon and options.profile:
+        raise Exception("The daemon cannot be profiled.")
 
     if options.rel != None:
         if options.rel == "today" or options.rel == "yesterday":
@@ -108,6 +153,29 @@ def parseArguments():
     loglevel = options.loglevel
     loglevel = getattr(logging, loglevel.upper())
 
+    if options.daemon:
+        return loglevel, None, None, options
+
+    if options.backfill != None:
+        try:
+            first, last = options.backfill.split(':')
+        except ValueError:
+            raise Exception("The backfill range should be START:END.")
+        first = getValidDate(first)
+        last = getValidDate(last)
+        if last < first:
+            raise Exception("The backfill range %s ends before it starts." % \
+                options.backfill)
+        options.backfill = []
+        while first <= last:
+            options.backfill.append(first)
+            first += datetime.timedelta(1, 0)
+        return loglevel, None, None, options
+
+    if options.replay and not options.name:
+        # The reports and dates of the recording are replayed.
+        return loglevel, None, None, options
+
     # The last 4 args should be the start and end dates for the report.
     # Each date has the form yyyy/mm/dd hh:mm:ss and is UTC (aka GMT)
     startDate = getValidDate(options.startDate)
@@ -118,45 +186,114 @@ def _toStr(toList):
     names = [formataddr(i) for i in zip(*toList)]
     return ', '.join(names)
 
-def saveFile(cp, startDate, name, html):
+def archiveFilename(cp, startDate, filename):
     """
-    Save the HTML form of the report to a file on-disk.
+    Return the path of filename in the report archive directory of
+    startDate, creating the directory if needed, or None if there is no
+    archive.
     """
     try:
         archive_dir = cp.get("Gratia", "report_archive_directory")
     except:
-        return
+        return None
     archive_dir = os.path.join(archive_dir, startDate.strftime('%Y/%m/%d'))
     try:
         os.makedirs(archive_dir)
     except OSError, oe:
         if oe.errno != 17:
             raise
-    html = "<html><head><title>%s</title></head><body>%s</body>" \
-        "</html>" % ("Gratia Report for %s" % time.strftime("%Y-%m-%d"), html)
-    filename = "%s-%s.html" % (name, startDate.strftime('%Y-%m-%d'))
-    fp = open(os.path.join(archive_dir, filename), 'w')
-    fp.write(html)
-    fp.close()
+    return os.path.join(archive_dir, filename)
 
-def sendEmail( fromEmail, toList, smtpServerHost, subject, reportText, \
-        reportHtml, log ):
+def saveFile(cp, startDate, name, report):
     """
-    This turns the "report" into an email attachment
-    and sends it to the EmailTarget(s).
+    Save the HTML form of the report to a file on-disk, writing it straight
+    from the report.
+    """
+    filename = archiveFilename(cp, startDate, "%s-%s.html" % (name,
+        startDate.strftime('%Y-%m-%d')))
+    if filename is None:
+        return
+    fp = open(filename, 'w')
+    try:
+        fp.write(rendering.pageHeader("Gratia Report for %s" % \
+            time.strftime("%Y-%m-%d")))
+        report.writeHtml(fp)
+        fp.write(rendering.page_footer)
+    finally:
+        fp.close()
+
+def tableExports(cp):
+    """
+    Return the formats of [Gratia] table_exports, a comma-separated list of
+    make_table.export_writers, the tables of the reports are exported in.
+    """
+    try:
+        formats = cp.get("Gratia", "table_exports")
+    except:
+        return []
+    formats = [i.strip() for i in formats.split(",") if i.strip()]
+    for format in formats:
+        if format not in make_table.export_writers:
+            raise Exception("Unknown table export format %s; the formats " \
+                "are %s." % (format, ", ".join(sorted(
+                make_table.export_writers.keys()))))
+    return formats
+
+def saveTables(cp, startDate, name, report, log):
+    """
+    Export each table of the report, in the formats of tableExports, next to
+    its HTML form: <name>-<date>.table<number>.<format>.  npz is skipped
+    without NumPy.
+    """
+    formats = tableExports(cp)
+    if "npz" in formats and make_table.numpy is None:
+        log.warning("NumPy is not available; the tables of %s are not " \
+            "exported as npz." % name)
+        formats.remove("npz")
+    if not formats:
+        return
+    tables = [i for i in report.result() if isinstance(i, make_table.Table)]
+    for ctr in range(len(tables)):
+        for format in formats:
+            filename = archiveFilename(cp, startDate, "%s-%s.table%d.%s" % \
+                (name, startDate.strftime('%Y-%m-%d'), ctr+1, format))
+            if filename is None:
+                return
+            fp = open(filename, 'wb')
+            try:
+                tables[ctr].export(format, fp)
+            finally:
+                fp.close()
+
+def saveQueryStats(cp, startDate, name, db):
+    """
+    Save the statistics of the queries of the report next to its HTML form.
+    """
+    filename = archiveFilename(cp, startDate, "%s-%s.queries.json" % (name,
+        startDate.strftime('%Y-%m-%d')))
+    if filename is None:
+        return
+    db.writeJson(filename, name)
+
+def emailMessage(fromEmail, toList, subject, reportText, reportHtml):
+    """
+    This turns the "report" into an email of one HTML part: reportHtml, or
+    reportText as preformatted text if reportHtml is None; returns the
+    message as a string.
     """
-    msg = MIMEMultipart()
+    if reportHtml is None:
+        reportHtml = rendering.renderPage(subject, "<pre>%s</pre>\n" % \
+            cgi.escape(reportText))
+    msg = MIMEText(reportHtml, "html")
     msg["Subject"] = subject
     msg["From"] = formataddr(fromEmail)
     msg["To"] = _toStr(toList)
-    msg1 = MIMEMultipart("alternative")
-    msgText1 = MIMEText("<pre>%s</pre>" % reportText, "html")
-    msgText2 = MIMEText(reportText)
-    msg1.attach(msgText2)
-    msg1.attach(msgText1)
-    msg.attach(msg1)
-    msg = msg.as_string()
+    return msg.as_string()
 
+def sendMessage(fromEmail, toList, smtpServerHost, msg, log):
+    """
+    Send a message built by emailMessage to the EmailTarget(s).
+    """
     log.debug("Report message:\n\n%s" % msg)
     if len(toList[1]) != 0:
         server = smtplib.SMTP(smtpServerHost)
@@ -165,7 +302,16 @@ def sendEmail( fromEmail, toList, smtpServerHost, subject, reportText, \
     else:
         # The email list isn't valid, so we write it to stdout and hope
         # it reaches somebody who cares.
-        print message
+        print msg
+
+def sendEmail( fromEmail, toList, smtpServerHost, subject, reportText, \
+        reportHtml, log ):
+    """
+    This turns the "report" into an email attachment
+    and sends it to the EmailTarget(s).
+    """
+    sendMessage(fromEmail, toList, smtpServerHost, emailMessage(fromEmail,
+        toList, subject, reportText, reportHtml), log)
 
 def databaseConnection(cp):
     """
@@ -189,6 +335,60 @@ def databaseConnection(cp):
     return MySQLdb.connect(**info)
 
 
+def streamCursor(cp):
+    """
+    Return how to open a server-side cursor if [Gratia] stream_results asks
+    for large results to be streamed, or None.
+    """
+    try:
+        stream = cp.getboolean("Gratia", "stream_results")
+    except:
+        stream = False
+    if not stream:
+        return None
+    return lambda conn: conn.cursor(MySQLdb.cursors.SSCursor)
+
+def queryCache(cp):
+    """
+    Return the query cache configured in the [Cache] section, or None if
+    there is none.
+    """
+    try:
+        directory = cp.get("Cache", "directory")
+    except:
+        return None
+    try:
+        size = int(cp.get("Cache", "size"))*1024**2
+    except:
+        size = query_cache.cache_size
+    try:
+        lag = int(cp.get("Cache", "lag"))
+    except:
+        lag = query_cache.cache_lag
+    try:
+        ttl = int(cp.get("Cache", "ttl"))
+    except:
+        ttl = query_cache.cache_ttl
+    return query_cache.QueryCache(directory, size, lag, ttl)
+
+def queryMemo(cp, shared=False):
+    """
+    Return the memo of the results of a run, keeping as many as [Cache]
+    memo_size says.  A memo shared by later runs only keeps the results of
+    the windows which ended more than [Cache] lag seconds ago.
+    """
+    try:
+        size = int(cp.get("Cache", "memo_size"))
+    except:
+        size = query_cache.memo_size
+    lag = None
+    if shared:
+        try:
+            lag = int(cp.get("Cache", "lag"))
+        except:
+            lag = query_cache.cache_lag
+    return query_cache.QueryMemo(size, lag)
+
 def _add_if_exists(cp, section, attribute, info):
     """
     If section.attribute exists in the config file, add its value into a
@@ -204,6 +404,228 @@ def _add_if_exists(cp, section, attribute, info):
     except:
         pass
 
+def runReport(name, pool, cache, memo, startDate, logger, cp, mail,
+        recording=None, profile=None):
+    """
+    Run the report called name for startDate on a connection of the pool,
+    then email it (unless mail is None) and archive it.  With a
+    replay.Recording, what the report reads is recorded or replayed; with a
+    profiling.Profile, each step is a phase of the profile.
+    """
+    phase = "%s %s: " % (name, startDate.strftime('%Y-%m-%d'))
+    conn = profiling.run(profile, phase + "connect", pool.acquire)
+    try:
+        db = executor.QueryExecutor(conn, logger, cache, memo,
+            streamCursor(cp), recording, profile)
+        report_module = profiling.run(profile, phase + "import", __import__,
+            'gratia_reporting.report_%s' % name)
+        report_module = getattr(report_module, "report_%s" % name)
+        def aggregate():
+            report = report_module.Report(db, startDate, logger, cp)
+            report.result()
+            return report
+        report = profiling.run(profile, phase + "aggregate", aggregate)
+
+        # The report is computed once; its renderings come from its result.
+        text = profiling.run(profile, phase + "render", report.generatePlain)
+    except:
+        pool.discard(conn)
+        raise
+    pool.release(conn)
+
+    if mail is not None:
+        EmailFromAddress, EmailToAddresses, SMTPServerHost = mail
+        logger.info("About to send email.")
+        def mime():
+            html = rendering.renderPage(report.subject(),
+                report.generateHtml())
+            return emailMessage(EmailFromAddress, EmailToAddresses,
+                report.subject(), text, html)
+        msg = profiling.run(profile, phase + "mime", mime)
+        profiling.run(profile, phase + "smtp", sendMessage, EmailFromAddress,
+            EmailToAddresses, SMTPServerHost, msg, logger)
+    def archive():
+        saveFile(cp, startDate, report.name(), report)
+        saveTables(cp, startDate, report.name(), report, logger)
+        db.logSummary()
+        saveQueryStats(cp, startDate, report.name(), db)
+    profiling.run(profile, phase + "archive", archive)
+
+def runReports(tasks, pool, cache, memo, logger, cp, mail, recording=None,
+        profile=None):
+    """
+    Run the reports of tasks, (report name, start date) pairs, as many at
+    once as the pool has connections.  A failed report is logged and does
+    not stop the others.  Returns (name, start date, seconds, traceback or
+    None) for each task.
+    """
+    todo = Queue.Queue()
+    for task in tasks:
+        todo.put(task)
+    results = {}
+    def work():
+        while True:
+            try:
+                name, startDate = todo.get_nowait()
+            except Queue.Empty:
+                return
+            timer = -time.time()
+            error = None
+            try:
+                runReport(name, pool, cache, memo, startDate, logger, cp,
+                    mail, recording, profile)
+            except Exception:
+                error = traceback.format_exc()
+                msg = "Report %s for %s failed:\n%s" % (name,
+                    startDate.strftime('%Y-%m-%d'), error)
+                logger.error(msg)
+                print >> sys.stderr, msg
+            timer += time.time()
+            results[name, startDate] = (timer, error)
+    if len(tasks) == 1:
+        work()
+    else:
+        threads = []
+        for ctr in range(min(pool.size, len(tasks))):
+            thread = threading.Thread(target=work)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    return [task + results[task] for task in tasks]
+
+def readConfig(options):
+    """
+    Read the config files of the command line.
+    """
+    configFiles = options.config
+    if configFiles == "":
+        configFiles = '/etc/gratia_reporting/reporting.cfg'
+    configFiles = [i.strip() for i in configFiles.split(',')]
+    cp = ConfigParser.ConfigParser()
+    cp.read(configFiles)
+
+    if options.db:
+        cp.set("Gratia", "database", options.db)
+    return cp
+
+def reportTasks(options, startDate, cp, recording=None):
+    """
+    Return the (report name, start date) tasks of the command line, or of
+    the replayed recording, and the (from, to, SMTP host) email settings,
+    None to archive the reports only.
+    """
+    # Get email information:
+    fromName = cp.get("Report Info", "fromName")
+    fromEmail = cp.get("Report Info", "fromEmail")
+    EmailFromAddress = (fromName, fromEmail)
+    toNames = eval(cp.get("Report Info", "toNames"), {}, {})
+    toEmails = eval(cp.get("Report Info", "toEmails"), {}, {})
+    if len(toNames) > 1 and options.dev:
+        raise Exception("Unable to send emails to more than 1 person in" \
+            " development mode.")
+    EmailToAddresses = (toNames, toEmails)
+    SMTPServerHost = cp.get("Report Info", "smtphost")
+    mail = (EmailFromAddress, EmailToAddresses, SMTPServerHost)
+
+    if options.replay:
+        # A replay is for working on the reports; email only if asked to.
+        if not options.email:
+            mail = None
+        if not options.name:
+            return list(recording.tasks), mail
+
+    names = [i.strip() for i in options.name.split(',') if i.strip()]
+    if options.backfill:
+        # A backfill regenerates the archive; email only if asked to.
+        if not options.email:
+            mail = None
+        try:
+            cp.get("Gratia", "report_archive_directory")
+        except:
+            raise Exception("A backfill needs a report archive " \
+                "directory.")
+        tasks = [(name, day) for day in options.backfill for name in \
+            names]
+    else:
+        tasks = [(name, startDate) for name in names]
+    return tasks, mail
+
+def connectionPool(cp, size=None):
+    """
+    Return a pool of connections to the database of cp, holding at most
+    [Gratia] connections, and no more than size, of them.
+    """
+    try:
+        connections = int(cp.get("Gratia", "connections"))
+    except:
+        connections = connection_pool.pool_size
+    if size is not None:
+        connections = min(connections, size)
+    return connection_pool.ConnectionPool(lambda: databaseConnection(cp),
+        connections)
+
+def logTimings(results, logger):
+    """
+    Log how long each report of runReports took; returns False if any of
+    them failed.
+    """
+    ok = True
+    lines = ["Report timings:"]
+    for name, day, timer, error in results:
+        line = "%-20s %s %8.2f s" % (name, day.strftime('%Y-%m-%d'), timer)
+        if error is not None:
+            line += "  FAILED"
+            ok = False
+        lines.append(line)
+    logger.info("\n".join(lines))
+    return ok
+
+def runCommandLine(options, startDate, cp, logger, profile=None):
+    """
+    Run the reports of the command line; returns the exit status.
+    """
+    recording = None
+    if options.replay:
+        recording = replay.load(options.replay)
+    tasks, mail = reportTasks(options, startDate, cp, recording)
+    # An unknown export format fails the run before any report does.
+    tableExports(cp)
+
+    cache = None
+    if options.replay:
+        # Nothing is read from the database; the connections only stand in.
+        pool = connection_pool.ConnectionPool(replay.NoDatabase, len(tasks))
+    else:
+        # Connect to the database. 
+        pool = connectionPool(cp, len(tasks))
+        if options.cache:
+            cache = queryCache(cp)
+    if options.record:
+        recording = replay.Recording()
+        recording.tasks = tasks
+    # The reports of a run share the results of identical queries; those of
+    # a backfill, the last ones of the days it is on.
+    memo = queryMemo(cp)
+
+    logger.info("About to query RSV DB.")
+    results = runReports(tasks, pool, cache, memo, logger, cp, mail,
+        recording, profile)
+    pool.close()
+    if options.record:
+        recording.save(options.record)
+        logger.info("Recorded the run to %s." % options.record)
+    if profile is not None:
+        profile.writeJson(options.profile)
+        logger.info("Wrote the profile of the run to %s." % options.profile)
+        slowest = profile.slowestStats()
+        if slowest is not None:
+            logger.info("Slowest phase, %s:\n%s" % slowest)
+
+    if not logTimings(results, logger):
+        return 1
+    return 0
+
 def main():
     status = 0
     logger = None
@@ -214,60 +636,26 @@ def main():
         # Get the command line arguments. It throws if they are invalid.
         (loglevel, startDate, endDate, options) = parseArguments()
 
-        configFiles = options.config
-        if configFiles == "":
-            configFiles = '/etc/gratia_reporting/reporting.cfg'
-        configFiles = [i.strip() for i in configFiles.split(',')]
-        cp = ConfigParser.ConfigParser()
-        cp.read(configFiles)
-
-        if options.db:
-            cp.set("Gratia", "database", options.db)
-
-        logging.config.fileConfig(cp.get("Gratia", "logging_config"))
+        profile = None
+        if options.profile:
+            profile = profiling.Profile(options.profile_slowest)
+        def configure():
+            cp = readConfig(options)
+            logging.config.fileConfig(cp.get("Gratia", "logging_config"))
+            return cp
+        cp = profiling.run(profile, "config", configure)
         logger = logging.getLogger()
         if loglevel:
             logger.setLevel(loglevel)
 
-        # Get email information:
-        fromName = cp.get("Report Info", "fromName")
-        fromEmail = cp.get("Report Info", "fromEmail")
-        EmailFromAddress = (fromName, fromEmail)
-        toNames = eval(cp.get("Report Info", "toNames"), {}, {})
-        toEmails = eval(cp.get("Report Info", "toEmails"), {}, {})
-        if len(toNames) > 1 and options.dev:
-            raise Exception("Unable to send emails to more than 1 person in" \
-                " development mode.")
-        EmailToAddresses = (toNames, toEmails)
-        SMTPServerHost = cp.get("Report Info", "smtphost")
-
-        # Connect to the database. 
-        logger.info("Connecting to RSV DB.")
-        conn = databaseConnection(cp)
-
-        logger.info("About to query RSV DB.")
-
-        my_version=None
-        if options.name:
-            report_module = __import__('gratia_reporting.report_%s' % \
-                options.name)
-            report_module = getattr(report_module, "report_%s" % options.name)
-            report = report_module.Report(conn, startDate, logger, cp)
-        else:
+        if options.daemon:
+            import gratia_reporting.daemon as daemon
+            status = daemon.serve(cp, logger)
+        elif not options.name and not options.replay:
             print >> sys.stderr, "No report specified."
             return 2
-            
-
-        logger.info("About to send email.")
-        html = report.generateHtml()
-        sendEmail(EmailFromAddress,
-                  EmailToAddresses,
-                  SMTPServerHost,
-                  report.subject(),
-                  report.generatePlain(),
-                  html,
-                  logger)
-        saveFile(cp, startDate, report.name(), html)
+        else:
+            status = runCommandLine(options, startDate, cp, logger, profile)
     except (SystemExit, KeyboardInterrupt):
         raise
     except Exception:
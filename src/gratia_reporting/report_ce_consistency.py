@@ -1,10 +1,10 @@
 
 import time
-import urllib2
 import datetime
 from xml.dom.minidom import parse
 
 import gratia_reporting.make_table as make_table
+import gratia_reporting.rendering as rendering
 
 CE_query = """
 SELECT
@@ -43,7 +43,7 @@ oim_url = "http://myosg.grid.iu.edu/rgsummary/xml?datasource=summary&" \
     "service=on&service_1=on&active_value=1&disable_value=1&" \
     "active=on&active_value=1&disable=on&disable_value=0"
 
-class Report(object):
+class Report(rendering.BaseReport):
 
     def __init__(self, conn, startDate, logger, cp):
         self._db = conn
@@ -54,21 +54,12 @@ class Report(object):
         self.parseGratia()
         self.parseRecentGratia()
 
-    def _execute(self, stmt, *args):
-        self._log.info(stmt % args)
-        timer = -time.time()
-        curs = self._db.cursor()
-        curs.execute(stmt, args)
-        timer += time.time()
-        self._log.info("Query took %.2f seconds." % timer)
-        return curs
-
     def name(self):
         return "ce_consistency"
 
     def parseGratia(self):
         self._gratiaCE = {}
-        for host, site in self._execute(CE_query,
+        for host, site in self._db.execute("ce_consistency.gratia", CE_query,
                 self._startDate.strftime('%Y-%m-%d %H:%M:%S')):
             self._gratiaCE[host] = site
 
@@ -77,12 +68,16 @@ class Report(object):
         end = self._startDate.strftime('%Y-%m-%d %H:%M:%S')
         start = (self._startDate-datetime.timedelta(7, 0)).strftime('%Y-%m-%d' \
                 ' %H:%M:%S')
-        for host, site in self._execute(recent_CE_query, end, start,
-                end):
+        for host, site in self._db.execute("ce_consistency.recent",
+                recent_CE_query, end, start, end):
             self._recentGratiaCE[host] = site
 
     def parseOIM(self):
-        fp = urllib2.urlopen(oim_url)
+        try:
+            url = self._cp.get("OIM", "ce_url")
+        except:
+            url = oim_url
+        fp = self._db.urlopen(url)
         dom = parse(fp)
         self._oimCE = {}
         for resource_group_dom in dom.getElementsByTagName('ResourceGroup'):
@@ -138,26 +133,26 @@ class Report(object):
         return "CE Consistency Report for %s (%i Issues)" % (self._startDate.\
             strftime('%Y-%m-%d'), self.issueCount())
 
-    def generatePlain(self):
-        text = "%s\n" % self.subject()
-        text += "\nThe following CE endpoints have inconsistent site names "\
-            "between GIP and OIM:\n"
+    def computeResult(self):
+        blocks = ["%s\n" % self.subject()]
+        blocks.append("\nThe following CE endpoints have inconsistent site names "\
+            "between GIP and OIM:\n")
         table = make_table.Table()
         table.setHeaders(['CE', 'OIM Resource Group Name', 'GIP Site Name'])
         for entry in self.inconsistent():
             table.addRow(entry)
-        text += table.plainText()
+        blocks.append(table)
         if len(self.onlyGIP()) == 0:
-            text += "\nThere are no CE endpoints in GIP but not OIM.\n"
+            blocks.append("\nThere are no CE endpoints in GIP but not OIM.\n")
         else:
-            text += "\nThe following CE endpoints are in GIP but not OIM:\n"
+            blocks.append("\nThe following CE endpoints are in GIP but not OIM:\n")
             table2 = make_table.Table()
             table2.rowCtr = table.rowCtr
             table2.setHeaders(['Endpoint', 'GIP Site Name'])
             for entry in self.onlyGIP():
                 table2.addRow(entry)
-            text += table2.plainText()
-        text += "\nThe following CE endpoints are in OIM but not GIP:\n"
+            blocks.append(table2)
+        blocks.append("\nThe following CE endpoints are in OIM but not GIP:\n")
         table3 = make_table.Table()
         if len(self.onlyGIP()) == 0:
             table3.rowCtr = table.rowCtr
@@ -166,10 +161,8 @@ class Report(object):
         table3.setHeaders(['Endpoint', 'OIM Resource Group Name'])
         for entry in self.onlyOIM():
             table3.addRow(entry)
-        text += table3.plainText()
-        print text
-        return text
-
-    def generateHtml(self):
-        return '<pre>\n%s\n</pre>\n' % self.generatePlain()
+        blocks.append(table3)
+        return blocks
 
+    def rendered(self, text):
+        print text
@@ -8,6 +8,8 @@ import string
 import datetime
 
 import gratia_reporting.make_table as make_table
+import gratia_reporting.rendering as rendering
+import gratia_reporting.xrootd_store as xrootd_store
 import gratia_reporting.overflow_jobs_report as overflow_jobs_report
 
 transfer_query = """
@@ -110,28 +112,11 @@ class TransferInfo(object):
         self._info = {}
         self.query()
 
-    def _execute(self, stmt, *args):
-        if isinstance(args, types.ListType) or isinstance(args,
-                types.TupleType):
-            args2 = tuple(['"%s"' % i for i in args])
-            self._log.info(stmt % args2)
-        elif isinstance(args, types.DictType):
-            args2 = dict([(i, '"%s"' % j) for (i, j) in args.items()])
-            self._log.info(stmt % args2)
-        else:
-            self._log.info(stmt % args)
-        timer = -time.time()
-        curs = self._db.cursor()
-        curs.execute(stmt, args)
-        timer += time.time()
-        self._log.info("Query took %.2f seconds." % timer)
-        return curs
-    
     def query(self):
         start_date = self._startdate #date + " 00:00:00"
         end_date   = self._enddate #date + " 23:59:59"
-        self.results = self._execute(transfer_query, start_date, end_date).fetchall()
-        for result in self.results:
+        for result in self._db.stream("cmsxrootd.transfers", transfer_query,
+                start_date, end_date):
             date, site, cn, client, transfers, volume, duration = result
             key = (date, site, cn)
             info = self._info.setdefault(key, {})
@@ -157,7 +142,7 @@ class TransferInfo(object):
     def getInfo(self):
         return self._info
 
-class Report(object):
+class Report(rendering.BaseReport):
 
     def __init__(self, conn, startDate, logger, cp):
         self._conn = conn
@@ -166,7 +151,30 @@ class Report(object):
         self._cp = cp
         self._info = TransferInfo(startDate - datetime.timedelta(7, 0), 
             startDate, conn, logger)
-        overflow_jobs_report.SetConnection(conn)
+        try:
+            workers = int(cp.get("Overflow", "log_workers"))
+        except:
+            workers = None
+        try:
+            lookback = int(cp.get("Overflow", "log_lookback"))
+        except:
+            lookback = overflow_jobs_report.log_lookback
+        try:
+            store = cp.get("Overflow", "session_store")
+        except:
+            store = None
+        try:
+            retention = int(cp.get("Overflow", "session_retention"))
+        except:
+            retention = xrootd_store.session_retention
+        try:
+            sources = overflow_jobs_report.ParseLogSources(cp.get("Overflow",
+                "log_sources"))
+        except:
+            sources = None
+        self._overflow = overflow_jobs_report.OverflowAnalysis(conn,
+            startDate, workers=workers, lookback=lookback, store=store,
+            retention=retention, sources=sources)
 
     def title(self):
         yesterday = self._startDate - datetime.timedelta(1, 0)
@@ -212,11 +220,8 @@ class Report(object):
                 if alt_key in today_info:
                     today_info[alt_key]['OneWeek'] = val['Volume']
 
-        def cmpVolume(key1, key2):
-            return -cmp(today_info[key1]['Volume'], today_info[key2]['Volume'])
-
         keys = today_info.keys()
-        keys.sort(cmpVolume)
+        keys.sort(key=lambda key: today_info[key]['Volume'], reverse=True)
         for key in keys:
             val = today_info[key]
             first_row = True
@@ -233,10 +238,13 @@ class Report(object):
                 if first_row:
                     table.addRow([val['User'], int(round(val['Volume']/1000.)), val['Transfers'], val['Site'], client_str, yesterday, oneweek])
                 else:
-                    table.addRow(["", "", "", "", client_str, "", ""])
+                    table.addRow(["", "", "", "", client_str, "", ""],
+                        follows=True)
                 first_row = False
 
-        return table.plainText()
+        table.setLimit(rendering.tableLimit(self._cp, "cmsxrootd"),
+            'Volume GB', ['Volume GB', '# of Transfers'])
+        return table
 
     def generatePerSiteClient(self):
         table = make_table.Table(add_numbers=False)
@@ -277,7 +285,9 @@ class Report(object):
                 oneweek = "Unknown"
             table.addRow([val['Site'], key[1], int(round(val['Volume']/1000)), yesterday, oneweek])
 
-        return table.plainText()
+        table.setLimit(rendering.tableLimit(self._cp, "cmsxrootd"),
+            'Volume GB')
+        return table
 
     def generatePerSite(self):
         table = make_table.Table(add_numbers=False)
@@ -315,34 +325,33 @@ class Report(object):
                 oneweek = "Unknown"
             table.addRow([val['Site'], int(round(val['Volume']/1000)), val['Transfers'], yesterday, oneweek])
 
-        return table.plainText()
+        return table
 
-    def generatePlain(self):
-        text = '%s\n  %s\n%s\n\n' % ('='*60, self.title(), '='*60)
+    def computeResult(self):
+        blocks = ['%s\n  %s\n%s\n\n' % ('='*60, self.title(), '='*60)]
 
-        text += self.generatePerSite() + "\n"
+        blocks += [self.generatePerSite(), "\n"]
 
         try:
-            text += overflow_jobs_report.mainGetOverflowjobsInfo1() + "\n"
+            blocks.append(self._overflow.mainGetOverflowjobsInfo1() + "\n")
         except Exception, e:
-            text += "(An error occurred when generating this portion of the report)\n"
+            blocks.append("(An error occurred when generating this portion of the report)\n")
             self._logger.exception(e)
 
-        text += self.generatePerSiteClient() + "\n"
+        blocks += [self.generatePerSiteClient(), "\n"]
        
-        text += self.generatePerUser()
+        blocks.append(self.generatePerUser())
 
         try:
-            text += overflow_jobs_report.mainGetOverflowjobsInfo2()
+            blocks.append(self._overflow.mainGetOverflowjobsInfo2())
         except Exception, e:
-            text += "(An error occurred when generating this portion of the report)\n"
+            blocks.append("(An error occurred when generating this portion of the report)\n")
             self._logger.exception(e)
 
-        self._logger.info("\n" + text)
-        return text
+        return blocks
 
-    def generateHtml(self):
-        return '<pre>\n%s\n</pre>\n' % self.generatePlain()
+    def rendered(self, text):
+        self._logger.info("\n" + text)
 
     def name(self):
         return "site_storage_report"
@@ -10,6 +10,7 @@ import datetime
 import xml.dom.minidom
 
 import gratia_reporting.make_table as make_table
+import gratia_reporting.rendering as rendering
 
 SER_query = """
 SELECT
@@ -108,31 +109,13 @@ class SEInfo(object):
         self.query_parents()
         self.query_cmds()
 
-    def _execute(self, stmt, *args):
-        if isinstance(args, types.ListType) or isinstance(args,
-                types.TupleType):
-            args2 = tuple(['"%s"' % i for i in args])
-            self._log.info(stmt % args2)
-        elif isinstance(args, types.DictType):
-            args2 = dict([(i, '"%s"' % j) for (i, j) in args.items()])
-            self._log.info(stmt % args2)
-        else:
-            self._log.info(stmt % args)
-        timer = -time.time()
-        curs = self._db.cursor()
-        curs.execute(stmt, args)
-        timer += time.time()
-        self._log.info("Query took %.2f seconds." % timer)
-        return curs
-    
     def query(self):
         date = self._date.strftime('%Y-%m-%d')
         start_date = date + " 00:00:00"
         end_date   = date + " 23:59:59"
-        self.results = self._execute(SER_query, start_date, end_date,
-            start_date, end_date, end_date, self._se_name, end_date,
-            self._se_name).fetchall()
-        for result in self.results:
+        for result in self._db.stream("hadoop.areas", SER_query, start_date,
+                end_date, start_date, end_date, end_date, self._se_name,
+                end_date, self._se_name):
             uniqId, parentId, name, spaceType, implementation, version, \
                 measurementType, totalSpace, freeSpace, usedSpace, fileCount, \
                 fileCountLimit, status = result
@@ -156,9 +139,9 @@ class SEInfo(object):
             return
         list_expr = ', '.join(('%s',)*len(needed_parents))
         my_parents_query = parents_query % list_expr
-        self.results = self._execute(my_parents_query, self._date.strftime( \
-            '%Y-%m-%d') + " 23:59:59", *needed_parents).fetchall()
-        for result in self.results:
+        for result in self._db.stream("hadoop.parents", my_parents_query,
+                self._date.strftime('%Y-%m-%d') + " 23:59:59",
+                *needed_parents):
             uniqID, parentID, name, spaceType, version, siteName, impl, \
                 status = result
             info = {'UniqueID': uniqID, 'ParentID': parentID, 'Name': name,
@@ -169,7 +152,8 @@ class SEInfo(object):
         date = self._date.strftime("%Y-%m-%d")
         start_date = date + " 00:00:00"
         end_date   = date + " 23:59:59"
-        results = self._execute(cmds_query, start_date, end_date)
+        results = self._db.execute("hadoop.commands", cmds_query, start_date,
+            end_date)
         for result in results:
             name, unique_id, tag_name, xml_str, _ = result
             se_cmds = self._custom.setdefault(unique_id, {})
@@ -215,7 +199,7 @@ class SEInfo(object):
     def cmds(self, se):
         return self._custom.get(se, {})
 
-class Report(object):
+class Report(rendering.BaseReport):
 
     def __init__(self, conn, startDate, logger, cp):
         self._conn = conn
@@ -264,9 +248,9 @@ class Report(object):
          return [GB(self._getSeAttr(self._today, attr)), GB(self._getSeAttr( \
              self._yesterday, attr)), GB(self._getSeAttr(self._week, attr))]
 
-    def generatePlain(self):
-        text = '%s\n  %s\n%s\n\n' % ('='*60, self.title(), '='*60)
-        text += '%s\n| Global Storage   |\n' % ('-'*20)
+    def computeResult(self):
+        blocks = ['%s\n  %s\n%s\n\n' % ('='*60, self.title(), '='*60)]
+        blocks.append('%s\n| Global Storage   |\n' % ('-'*20))
         
         table = make_table.Table(add_numbers=False)
         table.setHeaders(['', 'Today', 'Yesterday', 'One Week'])
@@ -280,7 +264,7 @@ class Report(object):
             if used[i] != 'UNKNOWN' and total[i] != 'UNKNOWN' and total[i] > 0:
                 used_perc[i] = '%i%%' % round(100*used[i]/float(total[i]))
         table.addRow(['Used Percentage'] + used_perc)
-        text += table.plainText() + '\n'
+        blocks += [table, '\n']
 
         areas = self._today.areas(self._se['UniqueID'])
         area_dict = dict([(i['UniqueID'], i) for i in areas])
@@ -289,7 +273,7 @@ class Report(object):
         for key in area_keys:
             area = area_dict[key]
             dashes = '-' * (len(area['Name']) + 4)
-            text += "%s\n| %s |\n" % (dashes, area['Name'])
+            blocks.append("%s\n| %s |\n" % (dashes, area['Name']))
             table = make_table.Table(add_numbers=False)
 
             # Determine if we have any quotas at all
@@ -371,17 +355,22 @@ class Report(object):
                     else:
                         row_info = row_info[:4]
                 table.addRow(row_info)
-            text += table.plainText()
-            text += "Total size: %s GB" % make_table.ftoa(GB(total_size))
+            totals = ['Size(GB)']
+            if has_file_count:
+                totals.append('# Files')
+            table.setLimit(rendering.tableLimit(self._cp, "hadoop"),
+                'Size(GB)', totals)
+            blocks.append(table)
+            blocks.append("Total size: %s GB" % make_table.ftoa(GB(total_size)))
             if has_file_count:
-                text += ", total file count: %s\n" % make_table.ftoa(total_files)
+                blocks.append(", total file count: %s\n" % make_table.ftoa(total_files))
             else:
-                text += "\n"
-            text += '\n'
+                blocks.append("\n")
+            blocks.append('\n')
 
         name = "Pool Information"
         dashes = '-' * (len(name) + 4)
-        text += "%s\n| %s |\n" % (dashes, name)
+        blocks.append("%s\n| %s |\n" % (dashes, name))
         def make_pool_info(day):
             day_pools = day.pools(self._se['UniqueID'])
             day_pools = [i for i in day_pools if i['Status'] == 'Production']
@@ -434,41 +423,40 @@ class Report(object):
         except:
             tmp3 = 'UNKNOWN'
         table.addRow(['% Used Std Dev', tmp1, tmp2, tmp3])
-        text += table.plainText()
+        blocks.append(table)
         new_pools_today = today_poolnames.difference(yest_poolnames)
         new_pools_week = today_poolnames.difference(week_poolnames)
         dead_pools_today = yest_poolnames.difference(today_poolnames)
         dead_pools_week = week_poolnames.difference(today_poolnames)
         if new_pools_today:
-            text += "New pools today: %s\n" % ", ".join(new_pools_today)
+            blocks.append("New pools today: %s\n" % ", ".join(new_pools_today))
         else:
-            text += "No new pools today.\n"
+            blocks.append("No new pools today.\n")
         if new_pools_week:
-            text += "New pools this week: %s\n" % ", ".join(new_pools_week)
+            blocks.append("New pools this week: %s\n" % ", ".join(new_pools_week))
         else:
-            text += "No new pools this week.\n"
+            blocks.append("No new pools this week.\n")
         if dead_pools_today:
-            text += "New missing/dead pools today: %s\n" % ", ".join( \
-                dead_pools_today)
+            blocks.append("New missing/dead pools today: %s\n" % ", ".join(
+                dead_pools_today))
         else:
-            text += "No new dead pools today.\n"
+            blocks.append("No new dead pools today.\n")
         if dead_pools_week:
-            text += "New missing/dead pools this week: %s\n" % ", ".join( \
-                dead_pools_week)
+            blocks.append("New missing/dead pools this week: %s\n" % ", ".join(
+                dead_pools_week))
         else:
-            text += "No new dead pools this week.\n"
-        text += "\n"
+            blocks.append("No new dead pools this week.\n")
+        blocks.append("\n")
 
         for name, output in self._today.cmds(self._se['UniqueID']).items():
             dashes = '-' * (len(name) + 4)
-            text += "%s\n| %s |\n%s\n" % (dashes, name, dashes)
-            text += output + '\n'
+            blocks.append("%s\n| %s |\n%s\n" % (dashes, name, dashes))
+            blocks.append(output + '\n')
 
-        self._logger.info("\n" + text)
-        return text
+        return blocks
 
-    def generateHtml(self):
-        return '<pre>\n%s\n</pre>\n' % self.generatePlain()
+    def rendered(self, text):
+        self._logger.info("\n" + text)
 
     def name(self):
         return "site_storage_report"
@@ -1,10 +1,10 @@
 
 import time
-import urllib2
 import datetime
 from xml.dom.minidom import parse
 
 import gratia_reporting.make_table as make_table
+import gratia_reporting.rendering as rendering
 
 SE_query = """
 SELECT
@@ -36,7 +36,7 @@ JOIN (
 WHERE
   Timestamp > %s AND
   Timestamp <= %s
-GROUP BY UniqueID
+GROUP BY SER.UniqueID
 """
 
 oim_url = "http://myosg.grid.iu.edu/rgsummary/xml?datasource=summary&" \
@@ -45,7 +45,7 @@ oim_url = "http://myosg.grid.iu.edu/rgsummary/xml?datasource=summary&" \
     "service=on&service_4=on&service_2=on&service_3=on&active_value=1&" \
     "disable_value=1"
 
-class Report(object):
+class Report(rendering.BaseReport):
 
     def __init__(self, conn, startDate, logger, cp):
         self._db = conn
@@ -56,22 +56,13 @@ class Report(object):
         self.parseRecentGratia()
         self.parseOIM()
 
-    def _execute(self, stmt, *args):
-        self._log.info(stmt % args)
-        timer = -time.time()
-        curs = self._db.cursor()
-        curs.execute(stmt, args)
-        timer += time.time()
-        self._log.info("Query took %.2f seconds." % timer)
-        return curs
-
     def name(self):
         return "se_consistency"
 
     def parseGratia(self):
         self._gratiaSE = {}
-        for uniqId, name, impl in self._execute(SE_query,
-                self._startDate.strftime('%Y-%m-%d %H:%M:%S')):
+        for uniqId, name, impl in self._db.execute("se_consistency.gratia",
+                SE_query, self._startDate.strftime('%Y-%m-%d %H:%M:%S')):
             impl = impl.lower()
             if impl.find('classic') >= 0 or impl.find('disk') >= 0 or impl.find('un') >= 0:
                 continue
@@ -84,8 +75,8 @@ class Report(object):
         end = self._startDate.strftime('%Y-%m-%d %H:%M:%S')
         start = (self._startDate-datetime.timedelta(7, 0)).strftime('%Y-%m-%d' \
                 ' %H:%M:%S')
-        for uniqId, name, impl in self._execute(recent_SE_query, end, start,
-                end):
+        for uniqId, name, impl in self._db.execute("se_consistency.recent",
+                recent_SE_query, end, start, end):
             impl = impl.lower()
             if impl.find('classic') >= 0 or impl.find('disk') >= 0 or impl.find('un') >= 0:
                 continue
@@ -94,7 +85,11 @@ class Report(object):
             self._recentGratiaSE[endpoint] = name
 
     def parseOIM(self):
-        fp = urllib2.urlopen(oim_url)
+        try:
+            url = self._cp.get("OIM", "se_url")
+        except:
+            url = oim_url
+        fp = self._db.urlopen(url)
         dom = parse(fp)
         self._oimSE = {}
         for resource_dom in dom.getElementsByTagName('Resource'):
@@ -138,32 +133,30 @@ class Report(object):
         return "SE Consistency Report for %s (%i Issues)" % (self._startDate.\
             strftime('%Y-%m-%d'), self.issueCount())
 
-    def generatePlain(self):
-        text = "%s\n" % self.subject()
-        text += "\nThe following SRM endpoints have inconsistent names between"\
-            " GIP and OIM:\n"
+    def computeResult(self):
+        blocks = ["%s\n" % self.subject()]
+        blocks.append("\nThe following SRM endpoints have inconsistent names between"\
+            " GIP and OIM:\n")
         table = make_table.Table()
         table.setHeaders(['Endpoint', 'OIM Resource Name', 'GIP SE Name'])
         for entry in self.inconsistent():
             table.addRow(entry)
-        text += table.plainText()
-        text += "\nThe following SRM endpoints are in GIP but not OIM:\n"
+        blocks.append(table)
+        blocks.append("\nThe following SRM endpoints are in GIP but not OIM:\n")
         table2 = make_table.Table()
         table2.rowCtr = table.rowCtr
         table2.setHeaders(['Endpoint', 'GIP SE Name'])
         for entry in self.onlyGIP():
             table2.addRow(entry)
-        text += table2.plainText()
-        text += "\nThe following SRM endpoints are in OIM but not GIP:\n"
+        blocks.append(table2)
+        blocks.append("\nThe following SRM endpoints are in OIM but not GIP:\n")
         table3 = make_table.Table()
         table3.rowCtr = table2.rowCtr
         table3.setHeaders(['Endpoint', 'OIM Resource Name'])
         for entry in self.onlyOIM():
             table3.addRow(entry)
-        text += table3.plainText()
-        print text
-        return text
-
-    def generateHtml(self):
-        return '<pre>\n%s\n</pre>\n' % self.generatePlain()
+        blocks.append(table3)
+        return blocks
 
+    def rendered(self, text):
+        print text
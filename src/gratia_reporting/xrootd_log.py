@@ -0,0 +1,795 @@
+
+"""
+Single-pass parser for the xrootd logs used by the overflow analysis.
+
+Every line is first dispatched on a cheap substring test (``XrootdXeq:``,
+``Decode xrootd redirects`` or ``ofs_open:``) and only then matched against
+the one precompiled pattern that can apply.  Log timestamps are converted
+with a per-(date, hour) epoch cache rather than strptime/mktime on every
+line, and the remove-lists are compiled into a single regular expression.
+
+The parser yields SessionEvent tuples, which are folded into a
+SessionTable.  parseLogs splits the logs into byte-range chunks, parses them
+in a process pool and merges the partial tables in log order, so the result
+does not depend on the number of workers.
+
+When parseLogs is given a time window, logs whose first and last
+timestamps fall outside of it are skipped, and only the byte range of the
+other logs which covers the window is read; the range is found by
+bisecting the memory-mapped log on the timestamp which starts each line.
+
+Logs compressed with gzip, bzip2 or xz (the latter needs the lzma module)
+are recognized by their first bytes and decompressed block by block as
+they are read.  They cannot be split or bisected, so each is parsed whole
+by one worker, keeping only the events within the window.
+"""
+
+import os
+import re
+import bz2
+import zlib
+import mmap
+import array
+import bisect
+import calendar
+import cStringIO
+import multiprocessing
+from datetime import datetime
+from collections import namedtuple
+
+from pytz import timezone
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# The xrootd logs we read are written in Nebraska local time.
+Nebraska_timezone = timezone("US/Central")
+
+# File name in the remove list will not built into the dictionary when scanning xrootd log
+FilenameRemoveList = ["/store/test/xrootd"]
+
+# Host name in the remove list will not built into the dictionary when scanning xrootd log
+HostnameRemoveList = ["red-mon"]
+
+LOGIN = "login"
+DISCONNECT = "disc"
+REDIRECT = "redirect"
+OPEN = "open"
+
+class SessionEvent(namedtuple("SessionEvent",
+        "kind timestamp jobid redirectionsite filename")):
+    """
+    One event of an xrootd session:
+      - LOGIN and DISCONNECT carry the timestamp of the login/disconnection;
+      - REDIRECT carries the redirection site and file name;
+      - OPEN carries the file name of an ofs_open.
+    Fields which do not apply to the event are None.
+    """
+    __slots__ = ()
+
+# 120514 11:01:47 29552 XrootdXeq: osg_cmsu.21234:3383@g19n27.hep.wisc.edu login as ...
+login_re = re.compile(r"(\d{6}) (\d{2}):(\d{2}):(\d{2}) \d+ XrootdXeq: (\S+) login\s*")
+# 120514 11:11:47 29552 XrootdXeq: osg_cmsu.21234:3383@g19n27.hep.wisc.edu disc 0:10:00
+disconnect_re = re.compile(r"(\d{6}) (\d{1,2}):(\d{2}):(\d{2}) \d+ XrootdXeq: (\S+) disc \d{1,2}:\d{2}:\d{2}\n")
+# 120514 11:01:48 29552 Decode xrootd redirects osg_cmsu.21234:3383@g19n27.hep.wisc.edu to cmssrv32.fnal.gov:1094 /store/foo
+redirect_re = re.compile(r"(\d{6}) (\d{1,2}):(\d{2}):(\d{2}) \d+ Decode xrootd redirects (\S+) to (\S+) (\S+)\n")
+# 120514 11:01:47 29552 osg_cmsu.21234:3383@g19n27.hep.wisc.edu ofs_open: 0-644 fn=/store/user/foo.root
+open_re = re.compile(r"(\d{6}) (\d{1,2}):(\d{2}):(\d{2}) \d+ (\S+) ofs_open: \d+-\d+ fn=(\S+)\n")
+# The yymmdd hh:mm:ss prefix of any log line.
+timestamp_re = re.compile(r"(\d{6}) (\d{1,2}):(\d{2}):(\d{2}) ")
+
+def compileRemoveList(items):
+    """
+    Compile a remove-list (a list of substrings) into one regular
+    expression; returns None for an empty list.
+    """
+    if not items:
+        return None
+    return re.compile("|".join([re.escape(i) for i in items]))
+
+class XrootdLogParser(object):
+    """
+    Turn the lines of an xrootd log into SessionEvents.
+
+    A parser instance keeps its epoch cache between files, so reuse one
+    instance for all the logs of a run.
+    """
+
+    def __init__(self, hostname_remove_list=HostnameRemoveList,
+            filename_remove_list=FilenameRemoveList, tz=Nebraska_timezone):
+        self._tz = tz
+        self._hostname_remove_re = compileRemoveList(hostname_remove_list)
+        self._filename_remove_re = compileRemoveList(filename_remove_list)
+        self._epochs = {}
+
+    def timestamp(self, day, hour, minute, second):
+        """
+        Convert a log timestamp (day as 'yymmdd', the rest as strings) to a
+        Unix epoch.  The epoch of the start of each (day, hour) is computed
+        once; a DST change always happens on an hour boundary.
+        """
+        key = (day, hour)
+        epoch = self._epochs.get(key, None)
+        if epoch is None:
+            localtime = self._tz.localize(datetime(2000+int(day[:2]),
+                int(day[2:4]), int(day[4:]), int(hour)))
+            epoch = calendar.timegm(localtime.utctimetuple())
+            self._epochs[key] = epoch
+        return epoch + 60*int(minute) + int(second)
+
+    def removedJobid(self, jobid):
+        return self._hostname_remove_re is not None and \
+            self._hostname_remove_re.search(jobid) is not None
+
+    def removedFilename(self, filename):
+        return self._filename_remove_re is not None and \
+            self._filename_remove_re.search(filename) is not None
+
+    def parseLine(self, line):
+        """
+        Return the SessionEvent for one log line, or None if the line is not
+        interesting (or is about a host or file in the remove-lists).
+        """
+        if "XrootdXeq:" in line:
+            m = login_re.match(line)
+            if m:
+                jobid = m.group(5)
+                if self.removedJobid(jobid):
+                    return None
+                return SessionEvent(LOGIN, self.timestamp(*m.group(1, 2, 3,
+                    4)), jobid, None, None)
+            m = disconnect_re.match(line)
+            if m:
+                jobid = m.group(5)
+                if self.removedJobid(jobid):
+                    return None
+                return SessionEvent(DISCONNECT, self.timestamp(*m.group(1, 2,
+                    3, 4)), jobid, None, None)
+        if "Decode xrootd redirects" in line:
+            m = redirect_re.match(line)
+            if m:
+                jobid, redirectionsite, filename = m.group(5, 6, 7)
+                if self.removedJobid(jobid) or self.removedFilename(filename):
+                    return None
+                return SessionEvent(REDIRECT, self.timestamp(*m.group(1, 2, 3,
+                    4)), jobid, redirectionsite, filename)
+        if "ofs_open:" in line:
+            m = open_re.match(line)
+            if m:
+                jobid, filename = m.group(5, 6)
+                if self.removedJobid(jobid) or self.removedFilename(filename):
+                    return None
+                return SessionEvent(OPEN, self.timestamp(*m.group(1, 2, 3, 4)),
+                    jobid, None, filename)
+        return None
+
+    def events(self, lines):
+        """
+        Generate the SessionEvents of an iterable of log lines (for example,
+        an open file).
+        """
+        parseLine = self.parseLine
+        for line in lines:
+            event = parseLine(line)
+            if event is not None:
+                yield event
+
+    def parseFile(self, filename):
+        """
+        Generate the SessionEvents of one log file, compressed or not.
+        """
+        for event in self.events(logLines(filename)):
+            yield event
+
+class SessionTable(object):
+    """
+    The xrootd sessions seen in (part of) the logs, keyed by jobid.
+
+    For each session we keep the last login, the last disconnection, the
+    last redirect and the first ofs_open; the file name of the session is
+    that of the last redirect or, failing that, of the first ofs_open.  This
+    is what reading the logs line by line in order gives, and it lets the
+    tables of consecutive chunks be merged.
+    """
+
+    def __init__(self):
+        # jobid -> [login, disconnection, redirection site, redirect file
+        #           name, ofs_open file name]
+        self._sessions = {}
+
+    def add(self, event):
+        session = self._sessions.get(event.jobid, None)
+        if session is None:
+            session = [None, None, None, None, None]
+            self._sessions[event.jobid] = session
+        kind = event.kind
+        if kind == LOGIN:
+            session[0] = event.timestamp
+        elif kind == DISCONNECT:
+            session[1] = event.timestamp
+        elif kind == REDIRECT:
+            session[2] = event.redirectionsite
+            session[3] = event.filename
+        elif session[4] is None:
+            session[4] = event.filename
+
+    def merge(self, other):
+        """
+        Merge in the table of the logs that follow ours.
+        """
+        for jobid, later in other._sessions.iteritems():
+            session = self._sessions.get(jobid, None)
+            if session is None:
+                self._sessions[jobid] = later
+                continue
+            if later[0] is not None:
+                session[0] = later[0]
+            if later[1] is not None:
+                session[1] = later[1]
+            if later[2] is not None:
+                session[2] = later[2]
+                session[3] = later[3]
+            if session[4] is None:
+                session[4] = later[4]
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def records(self):
+        """
+        Generate (jobid, login, disconnection, redirection site, redirect
+        file name, ofs_open file name) for each session, as kept.
+        """
+        for jobid, session in self._sessions.iteritems():
+            yield (jobid,) + tuple(session)
+
+    def sessions(self):
+        """
+        Generate (jobid, login, disconnection, filename, redirection site)
+        for each session.
+        """
+        for jobid, session in self._sessions.iteritems():
+            filename = session[3]
+            if filename is None:
+                filename = session[4]
+            yield jobid, session[0], session[1], filename, session[2]
+
+class Interner(object):
+    """
+    Numbers the distinct strings given to it: intern returns the same id
+    for equal strings, and -1 for None.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self.values = []
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        id = self._ids.get(value, None)
+        if id is None:
+            id = len(self.values)
+            self._ids[value] = id
+            self.values.append(value)
+        return id
+
+    def __getitem__(self, id):
+        if id < 0:
+            return None
+        return self.values[id]
+
+    def __contains__(self, value):
+        return value in self._ids
+
+    def __len__(self):
+        return len(self.values)
+
+class SessionColumns(object):
+    """
+    The xrootd sessions which logged in, kept in columns: host names,
+    redirection sites and the xrootd servers which logged the sessions are
+    interned, and timestamps and string ids are kept in arrays.  File names
+    are nearly all distinct, so they are simply listed.  A session is known
+    by its row number; the same jobid seen by two servers is two sessions.
+    """
+
+    def __init__(self, sessions=()):
+        """
+        sessions is an iterable of (jobid, login, disconnection, filename,
+        redirection site[, server]); the sessions without a login are left
+        out.
+        """
+        self.hosts = Interner()
+        self.sites = Interner()
+        self.servers = Interner()
+        self._jobids = []
+        self._filenames = []
+        self._host = array.array("i")
+        self._login = array.array("l")
+        self._disconnection = array.array("l")
+        self._site = array.array("i")
+        self._server = array.array("i")
+        for session in sessions:
+            self.add(*session)
+
+    def add(self, jobid, login, disconnection, filename, redirectionsite,
+            server=None):
+        if login is None:
+            return
+        host = None
+        if "@" in jobid:
+            host = jobid.split("@", 1)[1]
+        self._jobids.append(jobid)
+        self._host.append(self.hosts.intern(host))
+        self._login.append(login)
+        if disconnection is None:
+            disconnection = -1
+        self._disconnection.append(disconnection)
+        self._filenames.append(filename)
+        self._site.append(self.sites.intern(redirectionsite))
+        self._server.append(self.servers.intern(server))
+
+    def __len__(self):
+        return len(self._jobids)
+
+    def jobid(self, row):
+        return self._jobids[row]
+
+    def hostId(self, row):
+        return self._host[row]
+
+    def login(self, row):
+        return self._login[row]
+
+    def disconnection(self, row):
+        """
+        The disconnection time of a session, or None if it is still
+        connected.
+        """
+        disconnection = self._disconnection[row]
+        if disconnection < 0:
+            return None
+        return disconnection
+
+    def filename(self, row):
+        return self._filenames[row]
+
+    def redirectionsite(self, row):
+        return self.sites[self._site[row]]
+
+    def server(self, row):
+        return self.servers[self._server[row]]
+
+def loginOrder(columns, bucket=3600):
+    """
+    Return the rows of a SessionColumns ordered by login time, as an
+    array.  The rows are sorted an hour of logins at a time, so that only
+    one hour of them is ever held in a list.
+    """
+    buckets = {}
+    login = columns.login
+    for row in xrange(len(columns)):
+        key = login(row) // bucket
+        rows = buckets.get(key, None)
+        if rows is None:
+            rows = array.array("i")
+            buckets[key] = rows
+        rows.append(row)
+    order = array.array("i")
+    keys = buckets.keys()
+    keys.sort()
+    for key in keys:
+        rows = buckets.pop(key).tolist()
+        rows.sort(key=login)
+        order.extend(rows)
+    return order
+
+class SessionIndex(object):
+    """
+    The rows of a SessionColumns with both a login and a disconnection,
+    ordered by login time, under the host name of the session and all
+    together.  A lookup is a bisection over the login times of the rows of
+    one key.
+    """
+
+    def __init__(self, columns):
+        self._columns = columns
+        self._all = array.array("i")
+        self._byHost = {}
+        # host id -> the row arrays a session of the host goes in
+        entries = {}
+        for row in loginOrder(columns):
+            if columns.disconnection(row) is None:
+                continue
+            hostId = columns.hostId(row)
+            keys = entries.get(hostId, None)
+            if keys is None:
+                keys = self._entries(columns.hosts[hostId])
+                entries[hostId] = keys
+            for rows in keys:
+                rows.append(row)
+
+    def _entries(self, host):
+        if host is None:
+            host = ""
+        return [self._all, self._byHost.setdefault(host, array.array("i"))]
+
+    def _bisect(self, rows, login):
+        """
+        Return the position of the first of rows logged in at or after
+        login.
+        """
+        logins = self._columns.login
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if logins(rows[mid]) < login:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _range(self, rows, first, last):
+        return rows[self._bisect(rows, first):self._bisect(rows, last + 1)]
+
+    def __len__(self):
+        return len(self._all)
+
+    def hasHost(self, host):
+        """
+        Whether a session logged in from host, even if it never
+        disconnected.
+        """
+        return host in self._columns.hosts
+
+    def byHost(self, host, first, last):
+        """
+        The rows of the sessions from host which logged in between first
+        and last (inclusive).
+        """
+        rows = self._byHost.get(host, None)
+        if rows is None:
+            return []
+        return self._range(rows, first, last)
+
+    def byTime(self, first, last):
+        """
+        The rows of all the sessions which logged in between first and last
+        (inclusive); the caller checks the host names.
+        """
+        return self._range(self._all, first, last)
+
+# Size of the byte ranges large logs are split into for parsing.
+chunk_size = 64*1024*1024
+
+def logFiles(log_dir):
+    """
+    Return the xrootd logs in log_dir, oldest first.
+    """
+    filenames = []
+    for filename in os.listdir(log_dir):
+        if filename.startswith("xrootd.log"):
+            path = os.path.join(log_dir, filename)
+            filenames.append((os.stat(path).st_mtime, filename, path))
+    filenames.sort()
+    return [i[2] for i in filenames]
+
+GZIP = "gzip"
+BZIP2 = "bzip2"
+XZ = "xz"
+
+# Compressed logs are recognized by their first bytes, whatever their name.
+magic_numbers = [("\x1f\x8b", GZIP), ("BZh", BZIP2), ("\xfd7zXZ\x00", XZ)]
+
+# Size of the blocks compressed logs are read in.
+decompress_block_size = 1024*1024
+
+def logFormat(filename):
+    """
+    Return GZIP, BZIP2 or XZ for a compressed log, None for a plain one.
+    """
+    fp = open(filename, "rb")
+    try:
+        head = fp.read(6)
+    finally:
+        fp.close()
+    for magic, format in magic_numbers:
+        if head.startswith(magic):
+            return format
+    return None
+
+def decompressor(format):
+    if format == GZIP:
+        # 16 + MAX_WBITS: a gzip header and trailer, not a zlib one.
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if format == BZIP2:
+        return bz2.BZ2Decompressor()
+    if lzma is None:
+        raise Exception("Reading xz compressed logs needs the lzma module.")
+    return lzma.LZMADecompressor()
+
+def decompressedBlocks(fp, format):
+    """
+    Generate the decompressed contents of fp in blocks of whole lines.
+    Concatenated streams (as left by appending to a .gz) are all read.
+    """
+    decompress = decompressor(format)
+    pending = ""
+    while True:
+        data = fp.read(decompress_block_size)
+        if not data:
+            break
+        while data:
+            try:
+                block = pending + decompress.decompress(data)
+            except EOFError:
+                # The stream ended right at the end of the previous block.
+                decompress = decompressor(format)
+                continue
+            data = decompress.unused_data
+            if data:
+                decompress = decompressor(format)
+            end = block.rfind("\n") + 1
+            pending = block[end:]
+            if end:
+                yield block[:end]
+    if pending:
+        yield pending
+
+def logLines(filename):
+    """
+    Generate the lines of a log, compressed or not.
+    """
+    format = logFormat(filename)
+    fp = open(filename, "rb")
+    try:
+        if format is None:
+            for line in fp:
+                yield line
+        else:
+            for block in decompressedBlocks(fp, format):
+                for line in cStringIO.StringIO(block):
+                    yield line
+    finally:
+        fp.close()
+
+def linesFrom(lines, start):
+    """
+    Generate the lines which start at or after byte start.
+    """
+    position = 0
+    for line in lines:
+        if position >= start:
+            yield line
+        position += len(line)
+
+def readRange(filename, start, end):
+    """
+    Return a file-like object over the lines of a plain log which start in
+    the byte range [start, end).
+    """
+    fp = open(filename, "rb")
+    try:
+        length = os.fstat(fp.fileno()).st_size
+        if length == 0:
+            return cStringIO.StringIO()
+        mm = mmap.mmap(fp.fileno(), length, access=mmap.ACCESS_READ)
+        try:
+            return cStringIO.StringIO(mm[_lineStart(mm, start):
+                _lineStart(mm, min(end, length))])
+        finally:
+            mm.close()
+    finally:
+        fp.close()
+
+def parseChunk(task):
+    """
+    Parse one (filename, start, end, window) chunk into a SessionTable.
+
+    For a plain log, the chunk is the lines starting in the byte range
+    [start, end).  A compressed log cannot be split: end is None and the
+    log is read from start, a position in its decompressed contents, to its
+    end, keeping only the events within the window (a (first, last) pair of
+    epochs) if there is one.
+    """
+    filename, start, end, window = task
+    parser = XrootdLogParser()
+    table = SessionTable()
+    if end is not None:
+        for event in parser.events(readRange(filename, start, end)):
+            table.add(event)
+        return table
+    lines = logLines(filename)
+    if start:
+        lines = linesFrom(lines, start)
+    for event in parser.events(lines):
+        if window is None or window[0] <= event.timestamp <= window[1]:
+            table.add(event)
+    return table
+
+def _lineStart(mm, offset):
+    """
+    Return the offset of the first line of mm starting at or after offset.
+    """
+    if offset <= 0:
+        return 0
+    position = mm.find("\n", offset - 1)
+    if position < 0:
+        return len(mm)
+    return position + 1
+
+def _firstTimestamp(mm, offset, parser):
+    """
+    Return the timestamp of the first line starting at or after the line
+    start offset which has one, or None.
+    """
+    size = len(mm)
+    while offset < size:
+        m = timestamp_re.match(mm, offset)
+        if m:
+            return parser.timestamp(*m.groups())
+        offset = mm.find("\n", offset)
+        if offset < 0:
+            break
+        offset += 1
+    return None
+
+def _lastTimestamp(mm, parser):
+    """
+    Return the timestamp of the last line of mm which has one, or None.
+    """
+    end = len(mm)
+    while end > 0:
+        start = mm.rfind("\n", 0, max(end - 1, 0)) + 1
+        m = timestamp_re.match(mm, start)
+        if m:
+            return parser.timestamp(*m.groups())
+        end = start
+    return None
+
+def _bisect(mm, target, parser):
+    """
+    Return the offset of the first line whose timestamp is at least target.
+    """
+    lo, hi = 0, len(mm)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        timestamp = _firstTimestamp(mm, _lineStart(mm, mid), parser)
+        if timestamp is None or timestamp >= target:
+            hi = mid
+        else:
+            lo = mid + 1
+    return _lineStart(mm, lo)
+
+def logRange(filename, window, parser=None):
+    """
+    Return the (start, end) byte range of the log holding the lines with a
+    timestamp in the window (a (first, last) pair of epochs), or None if
+    the log has nothing in the window.
+    """
+    if parser is None:
+        parser = XrootdLogParser()
+    first, last = window
+    fp = open(filename)
+    try:
+        length = os.fstat(fp.fileno()).st_size
+        if length == 0:
+            return None
+        mm = mmap.mmap(fp.fileno(), length, access=mmap.ACCESS_READ)
+        try:
+            log_first = _firstTimestamp(mm, 0, parser)
+            log_last = _lastTimestamp(mm, parser)
+            if log_first is None:
+                return None
+            if log_last < first or log_first > last:
+                return None
+            start, end = 0, length
+            if log_first < first:
+                start = _bisect(mm, first, parser)
+            if log_last > last:
+                end = _bisect(mm, last + 1, parser)
+            return start, end
+        finally:
+            mm.close()
+    finally:
+        fp.close()
+
+def splitRange(filename, start, end, size=None):
+    """
+    Split the byte range [start, end) of a plain log into (filename, start,
+    end, None) chunks of at most size bytes (default: chunk_size).
+    """
+    if size is None:
+        size = chunk_size
+    tasks = []
+    while True:
+        chunk_end = min(start + size, end)
+        tasks.append((filename, start, chunk_end, None))
+        if chunk_end >= end:
+            break
+        start = chunk_end
+    return tasks
+
+def chunks(filenames, size=None, window=None):
+    """
+    Split the logs into (filename, start, end, window) chunks of at most
+    size bytes (default: chunk_size), in log order.  With a window, only the
+    part of each log within it is covered.
+
+    A compressed log is one chunk, read whole.  It is skipped if it was
+    last modified before the window: its last line cannot be later.
+    """
+    parser = XrootdLogParser()
+    tasks = []
+    for filename in filenames:
+        if logFormat(filename) is not None:
+            if window is None or os.stat(filename).st_mtime >= window[0]:
+                tasks.append((filename, 0, None, window))
+            continue
+        if window is None:
+            start, length = 0, os.stat(filename).st_size
+        else:
+            log_range = logRange(filename, window, parser)
+            if log_range is None:
+                continue
+            start, length = log_range
+        tasks.extend(splitRange(filename, start, length, size))
+    return tasks
+
+def parseLogs(filenames, workers=None, window=None):
+    """
+    Parse the logs (given oldest first) into one SessionTable, using a pool
+    of worker processes; workers defaults to the number of CPUs.  If window
+    is a (first, last) pair of epochs, only the lines logged within it are
+    parsed.
+    """
+    return parseTasks(chunks(filenames, window=window), workers)
+
+def parseSources(sources, workers=None, window=None):
+    """
+    Parse the logs of each (server, log directory) source and generate the
+    sessions of all of them, as (jobid, login, disconnection, filename,
+    redirection site, server).
+
+    The servers are parsed one at a time, and the table of one is dropped
+    before the next is parsed, so only one server's sessions are ever held
+    in a SessionTable.  They come out in no particular order: a session may
+    be closed by any later chunk of its logs, so none can be handed over
+    in login order before the last chunk is parsed.  SessionColumns keeps
+    them compactly, and SessionIndex orders them by login.
+    """
+    for server, log_dir in sources:
+        table = parseLogs(logFiles(log_dir), workers=workers, window=window)
+        for jobid, login, disconnection, filename, redirectionsite in \
+                table.sessions():
+            yield jobid, login, disconnection, filename, redirectionsite, \
+                server
+        del table
+
+def parseTasks(tasks, workers=None):
+    """
+    Parse (filename, start, end, window) chunks, given in log order, into one
+    SessionTable, using a pool of worker processes; workers defaults to the
+    number of CPUs.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    table = SessionTable()
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            table.merge(parseChunk(task))
+        return table
+    pool = multiprocessing.Pool(min(workers, len(tasks)))
+    try:
+        # imap hands back the partial tables in task order.
+        for partial in pool.imap(parseChunk, tasks):
+            table.merge(partial)
+    finally:
+        pool.terminate()
+    return table
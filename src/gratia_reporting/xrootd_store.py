@@ -0,0 +1,259 @@
+"""
+A persistent store of the sessions parsed from the xrootd logs.
+
+The store is an SQLite database holding the sessions and, for each log
+file (known by its server and inode), how many bytes of it were parsed.
+Each run only parses the lines appended since the previous one; a rotated
+log keeps its inode and is picked up where it was left, while a truncated
+or replaced log is parsed again from the start.  Compressed logs are parsed
+once, but for what was already parsed of the plain log they were compressed
+from: that is recognized by the digest of its first bytes, decompressed.
+
+Runs sharing a store (the overflow analyses of a backfill, or of the
+daemon) wait for each other's updates for up to store_timeout seconds.
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+
+import gratia_reporting.xrootd_log as xrootd_log
+
+# Sessions not seen for this many days are pruned from the store.
+session_retention = 30
+
+# A log is recognized by its inode and a digest of its first bytes.
+head_size = 4096
+
+# Stores of another version are emptied and filled again.
+store_version = 1
+
+# Seconds to wait for the lock of a store another run is writing to.
+store_timeout = 60
+
+tables = ["sessions", "checkpoints"]
+
+schema = [
+"""
+CREATE TABLE IF NOT EXISTS sessions (
+  server TEXT,
+  jobid TEXT,
+  host TEXT,
+  login INTEGER,
+  disconnection INTEGER,
+  redirectionsite TEXT,
+  redirectfile TEXT,
+  openfile TEXT,
+  seen INTEGER,
+  PRIMARY KEY (server, jobid)
+)
+""",
+"CREATE INDEX IF NOT EXISTS sessions_login ON sessions (login)",
+"""
+CREATE TABLE IF NOT EXISTS checkpoints (
+  server TEXT,
+  inode INTEGER,
+  filename TEXT,
+  headsize INTEGER,
+  head TEXT,
+  offset INTEGER,
+  seen INTEGER,
+  PRIMARY KEY (server, inode)
+)
+""",
+]
+
+insert_session = """
+INSERT OR IGNORE INTO sessions (server, jobid, host, seen) VALUES (?, ?, ?, ?)
+"""
+
+# The same merge as SessionTable.merge: later logins, disconnections and
+# redirects win, the first ofs_open stays.
+update_session = """
+UPDATE sessions SET
+  login = COALESCE(?, login),
+  disconnection = COALESCE(?, disconnection),
+  redirectionsite = CASE WHEN ? IS NULL THEN redirectionsite ELSE ? END,
+  redirectfile = CASE WHEN ? IS NULL THEN redirectfile ELSE ? END,
+  openfile = COALESCE(openfile, ?),
+  seen = ?
+WHERE server = ? AND jobid = ?
+"""
+
+sessions_query = """
+SELECT jobid, login, disconnection, COALESCE(redirectfile, openfile),
+  redirectionsite, server
+FROM sessions
+WHERE login >= ? AND login <= ?
+ORDER BY login
+"""
+
+def headDigest(fp, size):
+    """
+    Return the digest of the first size bytes of fp.
+    """
+    fp.seek(0)
+    return hashlib.md5(fp.read(size)).hexdigest()
+
+def decompressedHead(fp, format, size):
+    """
+    Return the first size bytes of the decompressed contents of fp.
+    """
+    fp.seek(0)
+    head = ""
+    for block in xrootd_log.decompressedBlocks(fp, format):
+        head += block
+        if len(head) >= size:
+            break
+    return head[:size]
+
+def completeLength(fp, size):
+    """
+    Return the length of the complete lines of fp (of size bytes): the line
+    xrootd is writing is left for the next run.
+    """
+    end = size
+    while end > 0:
+        start = max(end - 65536, 0)
+        fp.seek(start)
+        position = fp.read(end - start).rfind("\n")
+        if position >= 0:
+            return start + position + 1
+        end = start
+    return 0
+
+class SessionStore(object):
+    """
+    The sessions of all the xrootd logs parsed so far, kept in the SQLite
+    database at filename.  timeout is how many seconds to wait for another
+    connection to the store to finish writing.
+    """
+
+    def __init__(self, filename, timeout=store_timeout):
+        self._conn = sqlite3.connect(filename, timeout=timeout)
+        self._conn.text_factory = str
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != store_version:
+            for table in tables:
+                self._conn.execute("DROP TABLE IF EXISTS %s" % table)
+            self._conn.execute("PRAGMA user_version = %d" % store_version)
+        for stmt in schema:
+            self._conn.execute(stmt)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def checkpoint(self, server, inode):
+        """
+        Return the (headsize, head, offset) checkpoint of a log, or None.
+        """
+        return self._conn.execute("SELECT headsize, head, offset FROM "
+            "checkpoints WHERE server = ? AND inode = ?", (server,
+            inode)).fetchone()
+
+    def parsedLength(self, server, head):
+        """
+        Return how many bytes were parsed of a log of server, known under
+        another inode, whose contents start with head; 0 if none was.
+        """
+        parsed = 0
+        for headsize, digest, offset in self._conn.execute("SELECT "
+                "headsize, head, offset FROM checkpoints WHERE server = ?",
+                (server, )):
+            if 0 < headsize <= len(head) and \
+                    hashlib.md5(head[:headsize]).hexdigest() == digest:
+                parsed = max(parsed, offset)
+        return parsed
+
+    def pending(self, server, filenames):
+        """
+        Return the (filename, start, end) chunks of the logs not parsed yet
+        and the checkpoints to record once they are.
+        """
+        now = int(time.time())
+        tasks = []
+        checkpoints = []
+        for filename in filenames:
+            format = xrootd_log.logFormat(filename)
+            compressed = format is not None
+            fp = open(filename, "rb")
+            try:
+                st = os.fstat(fp.fileno())
+                if compressed:
+                    # Nothing is appended to a compressed log: it is parsed
+                    # whole, once.
+                    end = st.st_size
+                else:
+                    end = completeLength(fp, st.st_size)
+                start = 0
+                # Where to start reading a compressed log, once decompressed.
+                parsed = 0
+                row = self.checkpoint(server, st.st_ino)
+                if row is not None:
+                    headsize, head, offset = row
+                    # A log shorter than what we parsed was truncated; one
+                    # with other first bytes reuses the inode of a removed
+                    # log.
+                    if offset <= end and headDigest(fp, headsize) == head:
+                        start = offset
+                elif compressed:
+                    # Compressing a log gives it a new inode; the events
+                    # already stored from it must not be merged again over
+                    # the later ones of a reused jobid.
+                    parsed = self.parsedLength(server, decompressedHead(fp,
+                        format, head_size))
+                headsize = min(end, head_size)
+                checkpoints.append((server, st.st_ino, filename, headsize,
+                    headDigest(fp, headsize), end, now))
+            finally:
+                fp.close()
+            if start >= end:
+                continue
+            if compressed:
+                tasks.append((filename, parsed, None, None))
+            else:
+                tasks.extend(xrootd_log.splitRange(filename, start, end))
+        return tasks, checkpoints
+
+    def update(self, server, filenames, workers=None):
+        """
+        Parse what was appended to the logs of an xrootd server (all of
+        them, given oldest first) since the last update, and store the
+        sessions.  Returns the number of sessions updated.
+        """
+        tasks, checkpoints = self.pending(server, filenames)
+        table = xrootd_log.parseTasks(tasks, workers)
+        now = int(time.time())
+        curs = self._conn.cursor()
+        curs.executemany(insert_session, [(server, record[0],
+            record[0].partition("@")[2], now) for record in table.records()])
+        curs.executemany(update_session, [(login, disconnection, site, site,
+            site, redirectfile, openfile, now, server, jobid) for jobid, login,
+            disconnection, site, redirectfile, openfile in table.records()])
+        curs.execute("DELETE FROM checkpoints WHERE server = ?", (server,))
+        curs.executemany("INSERT INTO checkpoints (server, inode, filename, "
+            "headsize, head, offset, seen) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            checkpoints)
+        self._conn.commit()
+        return len(table)
+
+    def prune(self, retention=session_retention):
+        """
+        Remove the sessions last seen more than retention days ago.
+        """
+        cutoff = int(time.time()) - retention*86400
+        curs = self._conn.cursor()
+        curs.execute("DELETE FROM sessions WHERE COALESCE(disconnection, "
+            "login, seen) < ?", (cutoff,))
+        self._conn.commit()
+        return curs.rowcount
+
+    def sessions(self, window):
+        """
+        Return (jobid, login, disconnection, filename, redirection site,
+        server) for the sessions which logged in within the window, a
+        (first, last) pair of epochs, in login order.
+        """
+        return self._conn.execute(sessions_query, window).fetchall()
@@ -0,0 +1,120 @@
+
+"""
+Tests of the schedule parsing of the daemon.
+"""
+
+import datetime
+import unittest
+import ConfigParser
+
+import gratia_reporting.daemon as daemon
+import gratia_reporting.report as report
+import gratia_reporting.query_cache as query_cache
+
+command = "root /usr/bin/gratia_report -n cmsxrootd -r yesterday -c " \
+    "/etc/gratia_reporting/reporting.cfg"
+
+class ParseFieldTest(unittest.TestCase):
+
+    def testValues(self):
+        self.assertEqual(daemon.parseField("*", 0, 6), set(range(7)))
+        self.assertEqual(daemon.parseField("5", 0, 59), set([5]))
+        self.assertEqual(daemon.parseField("1,3-5", 0, 59),
+            set([1, 3, 4, 5]))
+
+    def testSteps(self):
+        self.assertEqual(daemon.parseField("*/15", 0, 59),
+            set([0, 15, 30, 45]))
+        self.assertEqual(daemon.parseField("10-20/5", 0, 59),
+            set([10, 15, 20]))
+        self.assertEqual(daemon.parseField("50/4", 0, 59), set([50, 54, 58]))
+
+    def testInvalid(self):
+        for field in ["60", "5-3", "*/0", "1-70", "x"]:
+            self.assertRaises(Exception, daemon.parseField, field, 0, 59)
+
+class CommandArgumentsTest(unittest.TestCase):
+
+    def testScript(self):
+        self.assertEqual(daemon.commandArguments("/usr/bin/gratia_report "
+            "-n hadoop -s '2012/05/10' -e '2012/05/11'"), ["-n", "hadoop",
+            "-s", "2012/05/10", "-e", "2012/05/11"])
+
+    def testPythonMain(self):
+        # As in conf/gratia_reporting.cron.
+        self.assertEqual(daemon.commandArguments("/usr/bin/python -c "
+            "'__import__(\"gratia_reporting\").report.main()' -n hadoop -r "
+            "today"), ["-n", "hadoop", "-r", "today"])
+
+    def testNoScript(self):
+        self.assertRaises(Exception, daemon.commandArguments, "ls -l")
+
+class ScheduleEntryTest(unittest.TestCase):
+
+    def testFields(self):
+        entry = daemon.ScheduleEntry("30 6 * * * " + command)
+        self.assertEqual(entry.args, ["-n", "cmsxrootd", "-r", "yesterday",
+            "-c", "/etc/gratia_reporting/reporting.cfg"])
+        self.assertEqual(entry.key, "-n cmsxrootd -r yesterday -c "
+            "/etc/gratia_reporting/reporting.cfg")
+        self.assertRaises(Exception, daemon.ScheduleEntry, "30 6 * * " + \
+            "root")
+
+    def testArguments(self):
+        entry = daemon.ScheduleEntry("30 6 * * * " + command)
+        loglevel, startDate, endDate, options = \
+            report.parseArguments(list(entry.args))
+        yesterday = datetime.date.today() - datetime.timedelta(1, 0)
+        self.assertEqual(options.name, "cmsxrootd")
+        self.assertEqual(options.rel, "yesterday")
+        self.assertEqual(options.config, "/etc/gratia_reporting/reporting.cfg")
+        self.assertEqual(options.db, None)
+        self.assertEqual(startDate, datetime.datetime(yesterday.year,
+            yesterday.month, yesterday.day))
+        self.assertEqual(endDate, startDate)
+
+    def testDue(self):
+        entry = daemon.ScheduleEntry("30 6 * * * " + command)
+        self.failUnless(entry.due(datetime.datetime(2012, 5, 10, 6, 30)))
+        self.failIf(entry.due(datetime.datetime(2012, 5, 10, 6, 31)))
+        self.failIf(entry.due(datetime.datetime(2012, 5, 10, 7, 30)))
+
+    def testSunday(self):
+        # 2012-05-13 was a Sunday, 2012-05-14 a Monday.
+        for weekday in ["0", "7"]:
+            entry = daemon.ScheduleEntry("0 0 * * %s %s" % (weekday,
+                command))
+            self.failUnless(entry.due(datetime.datetime(2012, 5, 13)))
+            self.failIf(entry.due(datetime.datetime(2012, 5, 14)))
+
+    def testEitherDay(self):
+        # As in cron, either restricted day field makes the entry due.
+        entry = daemon.ScheduleEntry("0 0 1 * 1 " + command)
+        self.failUnless(entry.due(datetime.datetime(2012, 5, 1)))
+        self.failUnless(entry.due(datetime.datetime(2012, 5, 14)))
+        self.failIf(entry.due(datetime.datetime(2012, 5, 15)))
+
+    def testBothDays(self):
+        entry = daemon.ScheduleEntry("0 0 1 * * " + command)
+        self.failUnless(entry.due(datetime.datetime(2012, 5, 1)))
+        self.failIf(entry.due(datetime.datetime(2012, 5, 14)))
+
+class QueryMemoTest(unittest.TestCase):
+
+    def testShared(self):
+        cp = ConfigParser.ConfigParser()
+        cp.add_section("Cache")
+        cp.set("Cache", "lag", "3600")
+        cp.set("Cache", "memo_size", "10")
+        memo = report.queryMemo(cp, True)
+        self.assertEqual((memo.size, memo.lag), (10, 3600))
+        memo = report.queryMemo(cp)
+        self.assertEqual((memo.size, memo.lag), (10, None))
+
+    def testDefaults(self):
+        memo = report.queryMemo(ConfigParser.ConfigParser(), True)
+        self.assertEqual((memo.size, memo.lag), (query_cache.memo_size,
+            query_cache.cache_lag))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+
+"""
+Tests of make_table.Table.
+"""
+
+import unittest
+import StringIO
+
+import gratia_reporting.make_table as make_table
+
+def sitesTable():
+    table = make_table.Table()
+    table.setHeaders(["Site", "Jobs", "Share"])
+    table.addRow(["Nebraska", 1200, "50%"])
+    table.addBreak()
+    table.addRow([("UCSD", "http://example.edu/ucsd"), 34, "-5%"])
+    return table
+
+sites_text = """\
+--------------------------------
+|   |   Site   |  Jobs | Share |
+--------------------------------
+| 1 | Nebraska | 1,200 |   50% |
+|------------------------------|
+| 2 | UCSD     |    34 |   -5% |
+--------------------------------
+"""
+
+class RenderTest(unittest.TestCase):
+
+    def testPlainText(self):
+        self.assertEqual(sitesTable().plainText(), sites_text)
+
+    def testWritePlainText(self):
+        fp = StringIO.StringIO()
+        sitesTable().writePlainText(fp)
+        self.assertEqual(fp.getvalue(), sites_text)
+
+    def testTrailingBreak(self):
+        table = sitesTable()
+        table.addBreak()
+        lines = sites_text.splitlines(True)
+        self.assertEqual(table.plainText(), ''.join(lines[:-1] + [lines[4],
+            lines[-1]]))
+
+    def testWriteHtml(self):
+        fp = StringIO.StringIO()
+        sitesTable().writeHtml(fp)
+        self.assertEqual(fp.getvalue(), sitesTable().html())
+
+class ColumnTest(unittest.TestCase):
+
+    def testStorage(self):
+        table = sitesTable()
+        self.assertEqual(table.column(0).tolist(), [1, 2])
+        self.assertEqual(table.column(0).typecode, 'l')
+        self.assertEqual(table.column(2).tolist(), [1200, 34])
+        self.assertEqual(table.column(3), ["50%", "-5%"])
+
+    def testMixedColumnIsList(self):
+        table = make_table.Table(add_numbers=False)
+        table.setHeaders(["Jobs"])
+        table.addRow([3])
+        table.addRow([2.5])
+        table.addRow(["n/a"])
+        self.assertEqual(table.column(0), [3, 2.5, "n/a"])
+        self.assertEqual(table.formatColumn(0), (["3", "2.5", "n/a"],
+            [False, False, True], None))
+
+    def testFormatColumn(self):
+        table = sitesTable()
+        self.assertEqual(table.formatColumn(1), (["Nebraska", "UCSD"],
+            [True, True], [None, "http://example.edu/ucsd"]))
+        self.assertEqual(table.formatColumn(2), (["1,200", "34"], None,
+            None))
+        table = make_table.Table(add_numbers=False)
+        table.setHeaders(["Hours"])
+        table.addRow([12345.5])
+        self.assertEqual(table.formatColumn(0), (["12,345.5"], None, None))
+
+    def testFormatColumnsWidensHeaders(self):
+        table = sitesTable()
+        table.formatColumns()
+        self.assertEqual(table.headerLengths, [1, 8, 5, 5])
+
+def exportTable():
+    table = make_table.Table()
+    table.setHeaders(["Site", "Wall\nHours", "Share"])
+    table.addRow(["Nebraska", 1200.5, "50%"])
+    table.addBreak()
+    table.addRow([("UC, SD", "http://example.edu/ucsd"), None, "-5%"])
+    return table
+
+class ExportTest(unittest.TestCase):
+
+    def export(self, format):
+        fp = StringIO.StringIO()
+        exportTable().export(format, fp)
+        return fp.getvalue()
+
+    def testColumnNames(self):
+        self.assertEqual(exportTable().columnNames(), ["column0", "Site",
+            "Wall Hours", "Share"])
+
+    def testCsv(self):
+        self.assertEqual(self.export("csv"), 'column0,Site,Wall Hours,'
+            'Share\r\n1,Nebraska,1200.5,50%\r\n2,"UC, SD",,-5%\r\n')
+
+    def testJsonLines(self):
+        self.assertEqual(self.export("jsonl"), '{"column0": 1, "Site": '
+            '"Nebraska", "Wall Hours": 1200.5, "Share": "50%"}\n{"column0": '
+            '2, "Site": "UC, SD", "Wall Hours": null, "Share": "-5%"}\n')
+
+    def testUnknownFormat(self):
+        self.assertRaises(Exception, self.export, "xls")
+
+def jobsTable():
+    table = make_table.Table()
+    table.setHeaders(["Site", "Jobs", "Hours"])
+    table.addRow(["A", 5, 1.5])
+    table.addRow(["B", 50, 2.0])
+    table.addBreak()
+    table.addRow(["C", 1, 4.0])
+    table.addRow(["D", 20, 8.0])
+    table.addRow(["  from x", 7, 1.0], follows=True)
+    table.addRow(["E", "n/a", 0.5])
+    return table
+
+class LimitTest(unittest.TestCase):
+
+    def testWithinLimit(self):
+        table = jobsTable()
+        table.setLimit(5, "Jobs")
+        self.failIf(table.isLimited())
+        self.failUnless(table.limited() is table)
+        table.setLimit(None, "Jobs")
+        self.failUnless(table.limited() is table)
+
+    def testUnknownColumn(self):
+        self.assertRaises(Exception, jobsTable().setLimit, 2, "Wall")
+
+    def testLimited(self):
+        table = jobsTable()
+        table.setLimit(2, "Jobs", ["Jobs", "Hours"])
+        self.failUnless(table.isLimited())
+        limited = table.limited()
+        # The largest rows in their order, with the row following one of
+        # them and the breaks before them, then the others added up.
+        self.assertEqual(limited.column(0), [2, 4, 5, ""])
+        self.assertEqual(limited.column(1), ["B", "D", "  from x",
+            "3 others"])
+        self.assertEqual(limited.column(2).tolist(), [50, 20, 7, 6])
+        self.assertEqual(limited.column(3).tolist(), [2.0, 8.0, 1.0, 6.0])
+        self.assertEqual(limited.breaks, [1, 3])
+        self.assertEqual(limited.follows, set([2]))
+        # The table itself is left whole.
+        self.assertEqual(table.rows, 6)
+
+    def testTotalsDefaultToColumn(self):
+        table = jobsTable()
+        table.setLimit(1, "Hours")
+        limited = table.limited()
+        self.assertEqual(limited.column(1), ["D", "  from x", "4 others"])
+        self.assertEqual(limited.column(2), [20, 7, ""])
+        self.assertEqual(limited.column(3).tolist(), [8.0, 1.0, 8.0])
+
+    def testText(self):
+        table = jobsTable()
+        table.setLimit(2, "Jobs", ["Jobs", "Hours"])
+        self.assertEqual(table.limited().plainText(), """\
+-------------------------------
+|   |   Site   | Jobs | Hours |
+-------------------------------
+| 2 | B        |   50 |   2.0 |
+|-----------------------------|
+| 4 | D        |   20 |   8.0 |
+| 5 |   from x |    7 |   1.0 |
+|-----------------------------|
+|   | 3 others |    6 |   6.0 |
+-------------------------------
+""")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+
+"""
+Tests of the job statistics of overflow_jobs_report.
+"""
+
+import sqlite3
+import unittest
+
+import gratia_reporting.overflow_jobs_report as overflow_jobs_report
+
+# Grouped rows of the statistics query: Overflow, FourSites, then the counts
+# and sums of the jobs.
+rows = [
+    (1, 1, 3, 300.0, 150.0, 2, 200.6, 1, 100.0, 1),
+    (1, 0, 1, 100.0, 90.0, 1, 100.0, 0, 0, 1),
+    (0, 1, 4, 400.0, 200.0, 3, 350.0, 1, 50.0, 0),
+    (0, 0, 2, 200.0, 20.0, 0, 0, 2, 200.0, 0),
+    # Jobs without a HostDescription.
+    (None, 0, 5, 500.0, 1.0, 5, 500.0, 0, 0, 0),
+]
+
+all_sites_text = """
+All sites
+      Overflow: 4 (40.00% wall 40.00%)         Normal:6
+        Exit 0: 75.00% (vs 50.00%) wall 75.15%
+ Exit 84 or 85: 25.00% (vs 50.00%) wall 25.00%
+    Efficiency: 60.00% (vs 36.67%)
+      Eff >80%: 50.00% (vs  0.00%)
+"""
+
+# The exit code 0 walltime of the 4 sites is truncated to 200.
+four_sites_text = """
+Only UCSD+Nebraska+Wisconsin+Purdue
+
+      Overflow: 3 (42.86% wall 42.86%)         Normal:4
+        Exit 0: 66.67% (vs 75.00%) wall 66.67%
+ Exit 84 or 85: 33.33% (vs 25.00%) wall 33.33%
+    Efficiency: 50.00% (vs 50.00%)
+      Eff >80%: 33.33% (vs  0.00%)
+"""
+
+empty_text = """
+All sites
+      Overflow: 0 ( 0.00% wall  0.00%)         Normal:0
+        Exit 0:  0.00% (vs  0.00%) wall  0.00%
+ Exit 84 or 85:  0.00% (vs  0.00%) wall  0.00%
+    Efficiency:  0.00% (vs  0.00%)
+      Eff >80%:  0.00% (vs  0.00%)
+"""
+
+class FakeDb(object):
+    """
+    Hands back the given rows for any query.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def stream(self, name, stmt, *args):
+        self.queries.append((name, args))
+        return iter(self.rows)
+
+class JobStatisticsTest(unittest.TestCase):
+
+    def statistics(self):
+        db = FakeDb(rows)
+        statistics = overflow_jobs_report.QueryJobStatistics(db, 1, 2)
+        self.assertEqual(db.queries, [("overflow.statistics", (1, 2))])
+        return statistics
+
+    def testBuckets(self):
+        statistics = self.statistics()
+        self.assertEqual((statistics.Overflow().Num,
+            statistics.Normal().Num, statistics.Overflow4sites().Num,
+            statistics.Normal4sites().Num), (4, 6, 3, 4))
+        self.assertEqual(statistics.Overflow().WallDurationExitCode0, 300.6)
+
+    def testAllSites(self):
+        self.assertEqual(overflow_jobs_report.\
+            PrintStatisticsBasedOnQueryGratiaJobsAllSites(self.statistics()),
+            all_sites_text)
+
+    def testFourSites(self):
+        self.assertEqual(overflow_jobs_report.\
+            PrintStatisticsBasedOnQueryGratiaJobs4sites(self.statistics()),
+            four_sites_text)
+
+    def testNoJobs(self):
+        self.assertEqual(overflow_jobs_report.\
+            PrintStatisticsBasedOnQueryGratiaJobsAllSites(
+            overflow_jobs_report.JobStatistics()), empty_text)
+
+gratia_schema = [
+    "CREATE TABLE JobUsageRecord (dbid INTEGER, EndTime TEXT, ResourceType "
+        "TEXT, HostDescription TEXT, WallDuration REAL, CpuUserDuration "
+        "REAL, CpuSystemDuration REAL)",
+    "CREATE TABLE JobUsageRecord_Meta (dbid INTEGER, ProbeName TEXT)",
+    "CREATE TABLE Resource (dbid INTEGER, description TEXT, value TEXT)",
+    "CREATE TABLE Probe (probename TEXT, siteid INTEGER)",
+    "CREATE TABLE Site (siteid INTEGER)",
+]
+
+probe = "condor:glidein-2.t2.ucsd.edu"
+
+class StatisticsQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        for stmt in gratia_schema:
+            self.conn.execute(stmt)
+        jobs = [("UCSD-overflow", 0), ("UCSD", 84), ("Nebraska", 0),
+            ("Florida", 0), (None, 0)]
+        for dbid, (host, exitcode) in enumerate(jobs):
+            self.conn.execute("INSERT INTO JobUsageRecord VALUES (?, "
+                "'2012-05-10 12:00:00', 'BatchPilot', ?, 100, 40, 10)",
+                (dbid, host))
+            self.conn.execute("INSERT INTO JobUsageRecord_Meta VALUES (?, ?)",
+                (dbid, probe))
+            self.conn.execute("INSERT INTO Resource VALUES (?, 'ExitCode', "
+                "?)", (dbid, exitcode))
+        # Two Probe rows of the probe: a join would count its jobs twice.
+        self.conn.execute("INSERT INTO Probe VALUES (?, 1)", (probe, ))
+        self.conn.execute("INSERT INTO Probe VALUES (?, 1)", (probe, ))
+
+    def tearDown(self):
+        self.conn.close()
+
+    def statistics(self):
+        stmt = overflow_jobs_report.statistics_query.replace("%s", "?").\
+            replace("%%", "%")
+        statistics = overflow_jobs_report.JobStatistics()
+        for row in self.conn.execute(stmt, ("2012-05-10", "2012-05-11")):
+            statistics.add(row)
+        return statistics
+
+    def testWithoutSite(self):
+        # All sites count every job once, whether its probe has a site.
+        statistics = self.statistics()
+        self.assertEqual((statistics.Overflow().Num,
+            statistics.Normal().Num), (1, 3))
+        self.assertEqual((statistics.Overflow4sites().Num,
+            statistics.Normal4sites().Num), (0, 0))
+
+    def testWithSite(self):
+        self.conn.execute("INSERT INTO Site VALUES (1)")
+        statistics = self.statistics()
+        self.assertEqual((statistics.Overflow().Num,
+            statistics.Normal().Num), (1, 3))
+        self.assertEqual((statistics.Overflow4sites().Num,
+            statistics.Normal4sites().Num), (1, 2))
+        self.assertEqual(statistics.Normal4sites().NumExitCode84or85, 1)
+        self.assertEqual(statistics.Normal().WallDuration, 300)
+
+if __name__ == '__main__':
+    unittest.main()
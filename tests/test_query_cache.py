@@ -0,0 +1,140 @@
+
+"""
+Tests of query_cache.  Run the tests from the top of the source tree with
+
+    PYTHONPATH=src python -m unittest discover -s tests
+"""
+
+import time
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import gratia_reporting.query_cache as query_cache
+
+class WindowTest(unittest.TestCase):
+
+    def testParseDate(self):
+        self.assertEqual(query_cache.parseDate("2012-05-10 06:30:00"),
+            datetime.datetime(2012, 5, 10, 6, 30))
+        self.assertEqual(query_cache.parseDate("2012/05/10"),
+            datetime.datetime(2012, 5, 10))
+        self.assertEqual(query_cache.parseDate(None), None)
+        self.assertEqual(query_cache.parseDate("T2_US_Nebraska"), None)
+        self.assertEqual(query_cache.parseDate(5), None)
+
+    def testDateIsWholeDay(self):
+        self.assertEqual(query_cache.parseDate(datetime.date(2012, 5, 10)),
+            datetime.datetime(2012, 5, 11))
+
+    def testWindowEnd(self):
+        self.assertEqual(query_cache.windowEnd(("2012-05-09",
+            datetime.datetime(2012, 5, 10, 6), "cms")),
+            datetime.datetime(2012, 5, 10, 6))
+        self.assertEqual(query_cache.windowEnd({"start": "2012-05-09",
+            "end": "2012-05-11", "vo": "cms"}), datetime.datetime(2012, 5, 11))
+        self.assertEqual(query_cache.windowEnd(("cms", 3)), None)
+
+    def testCacheKey(self):
+        self.assertEqual(query_cache.cacheKey("SELECT  *\n FROM x", (1, )),
+            query_cache.cacheKey("SELECT * FROM x", (1, )))
+        self.assertEqual(query_cache.cacheKey("SELECT 1", {"a": 1, "b": 2}),
+            query_cache.cacheKey("SELECT 1", {"b": 2, "a": 1}))
+        self.assertNotEqual(query_cache.cacheKey("SELECT 1", (1, )),
+            query_cache.cacheKey("SELECT 1", (2, )))
+
+class QueryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="query_cache.")
+        self.cache = query_cache.QueryCache(self.directory, lag=86400,
+            ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def daysAgo(self, days):
+        return datetime.datetime.utcnow() - datetime.timedelta(days, 0)
+
+    def testClosedWindowNeverExpires(self):
+        self.assertEqual(self.cache.expiry((self.daysAgo(2), )), None)
+
+    def testOpenWindowExpires(self):
+        now = time.time()
+        for args in [(self.daysAgo(0.5), ), (self.daysAgo(-1), ), ("cms", )]:
+            expiry = self.cache.expiry(args)
+            self.failIf(expiry is None)
+            self.failUnless(now + 60 <= expiry <= time.time() + 60)
+
+    def testLatestDateDecides(self):
+        self.failIf(self.cache.expiry((self.daysAgo(3),
+            self.daysAgo(0.5))) is None)
+
+    def testGetPut(self):
+        stmt = "SELECT site, jobs FROM x WHERE end < %s"
+        args = (self.daysAgo(2), )
+        self.assertEqual(self.cache.get(stmt, args), None)
+        self.cache.put(stmt, args, [("Nebraska", 3)])
+        self.assertEqual(self.cache.get(stmt, args), [("Nebraska", 3)])
+        self.assertEqual(self.cache.get(stmt, (self.daysAgo(3), )), None)
+
+    def testExpiredResultIsDropped(self):
+        stmt = "SELECT jobs FROM x WHERE end < %s"
+        args = (self.daysAgo(0), )
+        self.cache.ttl = -1
+        self.cache.put(stmt, args, [(3, )])
+        self.assertEqual(self.cache.get(stmt, args), None)
+
+class QueryMemoTest(unittest.TestCase):
+
+    def testRemember(self):
+        memo = query_cache.QueryMemo()
+        self.assertEqual(memo.remember("a", lambda: 1), (1, False))
+        self.assertEqual(memo.remember("a", lambda: 2), (1, True))
+
+    def testNoneIsNotKept(self):
+        memo = query_cache.QueryMemo()
+        memo.remember("a", lambda: None)
+        self.assertEqual(memo.remember("a", lambda: 2), (2, False))
+
+    def testLeastRecentlyUsedIsDropped(self):
+        memo = query_cache.QueryMemo(size=2)
+        memo.remember("a", lambda: 1)
+        memo.remember("b", lambda: 2)
+        memo.remember("a", lambda: 0)
+        memo.remember("c", lambda: 3)
+        self.assertEqual(memo.remember("a", lambda: 0), (1, True))
+        self.assertEqual(memo.remember("c", lambda: 0), (3, True))
+        self.assertEqual(memo.remember("b", lambda: 4), (4, False))
+
+    def testLagKeepsClosedWindowsOnly(self):
+        memo = query_cache.QueryMemo(lag=86400)
+        stmt = "SELECT jobs FROM x WHERE end < %s"
+        closed = (datetime.datetime.utcnow() - datetime.timedelta(2, 0), )
+        current = (datetime.datetime.utcnow(), )
+        memo.fetch(stmt, closed, lambda: 1)
+        self.assertEqual(memo.fetch(stmt, closed, lambda: 2), (1, True))
+        memo.fetch(stmt, current, lambda: 1)
+        self.assertEqual(memo.fetch(stmt, current, lambda: 2), (2, False))
+        memo.remember("overflow", lambda: 1)
+        self.assertEqual(memo.remember("overflow", lambda: 2), (2, False))
+
+    def testOwnLag(self):
+        memo = query_cache.QueryMemo(lag=86400)
+        ended = datetime.datetime.utcnow() - datetime.timedelta(0, 3600)
+        ending = datetime.datetime.utcnow() + datetime.timedelta(0, 3600)
+        memo.remember("ended", lambda: 1, ended, 0)
+        self.assertEqual(memo.remember("ended", lambda: 2, ended, 0),
+            (1, True))
+        memo.remember("ending", lambda: 1, ending, 0)
+        self.assertEqual(memo.remember("ending", lambda: 2, ending, 0),
+            (2, False))
+        # Without a lag of its own, a memo keeps everything.
+        memo = query_cache.QueryMemo()
+        memo.remember("ending", lambda: 1, ending, 0)
+        self.assertEqual(memo.remember("ending", lambda: 2, ending, 0),
+            (1, True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,442 @@
+
+"""
+Tests of the xrootd log parser and of the tables of sessions it fills.
+"""
+
+import os
+import bz2
+import gzip
+import mmap
+import shutil
+import calendar
+import tempfile
+import unittest
+
+import gratia_reporting.xrootd_log as xrootd_log
+
+def epoch(hour, minute, second):
+    # The logs are in Nebraska time: on 2012-05-14, five hours behind UTC.
+    return calendar.timegm((2012, 5, 14, hour + 5, minute, second))
+
+jobid = "osg_cmsu.21234:3383@g19n27.hep.wisc.edu"
+
+login = "120514 11:01:47 29552 XrootdXeq: %s login as /DC=org/CN=Some " \
+    "User\n" % jobid
+disconnect = "120514 11:11:47 29552 XrootdXeq: %s disc 0:10:00\n" % jobid
+redirect = "120514 11:01:48 29552 Decode xrootd redirects %s to " \
+    "cmssrv32.fnal.gov:1094 /store/foo.root\n" % jobid
+ofs_open = "120514 11:01:49 29552 %s ofs_open: 0-644 fn=/store/bar.root\n" % \
+    jobid
+
+class ParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = xrootd_log.XrootdLogParser()
+
+    def testLogin(self):
+        self.assertEqual(self.parser.parseLine(login),
+            (xrootd_log.LOGIN, epoch(11, 1, 47), jobid, None, None))
+
+    def testDisconnect(self):
+        self.assertEqual(self.parser.parseLine(disconnect),
+            (xrootd_log.DISCONNECT, epoch(11, 11, 47), jobid, None, None))
+
+    def testRedirect(self):
+        self.assertEqual(self.parser.parseLine(redirect),
+            (xrootd_log.REDIRECT, epoch(11, 1, 48), jobid,
+            "cmssrv32.fnal.gov:1094", "/store/foo.root"))
+
+    def testOpen(self):
+        self.assertEqual(self.parser.parseLine(ofs_open),
+            (xrootd_log.OPEN, epoch(11, 1, 49), jobid, None,
+            "/store/bar.root"))
+
+    def testOtherLines(self):
+        for line in ["120514 11:01:50 29552 %s ofs_read: 4096@0 " \
+                "fn=/store/bar.root\n" % jobid, "120514 11:01:50 29552 " \
+                "XrootdXeq: %s pvt IPv4 login\n" % jobid, "\n",
+                "garbage\n"]:
+            self.assertEqual(self.parser.parseLine(line), None)
+
+    def testHostnameRemoveList(self):
+        removed = "cms.1:2@red-mon.unl.edu"
+        for line in [login, disconnect, redirect, ofs_open]:
+            self.assertEqual(self.parser.parseLine(line.replace(jobid,
+                removed)), None)
+
+    def testFilenameRemoveList(self):
+        self.assertEqual(self.parser.parseLine(redirect.replace("/store/foo",
+            "/store/test/xrootd/foo")), None)
+        self.assertEqual(self.parser.parseLine(ofs_open.replace("/store/bar",
+            "/store/test/xrootd/bar")), None)
+        # A login is kept whatever the files of the session.
+        self.failIf(self.parser.parseLine(login) is None)
+
+    def testRemoveLists(self):
+        parser = xrootd_log.XrootdLogParser(hostname_remove_list=["wisc"],
+            filename_remove_list=[])
+        self.assertEqual(parser.parseLine(login), None)
+        self.failIf(parser.parseLine(redirect.replace(jobid,
+            "cms.1:2@red-mon.unl.edu").replace("/store/foo",
+            "/store/test/xrootd/foo")) is None)
+
+    def testEvents(self):
+        events = list(self.parser.events([login, "garbage\n", disconnect]))
+        self.assertEqual([i.kind for i in events], [xrootd_log.LOGIN,
+            xrootd_log.DISCONNECT])
+
+def table(lines):
+    session_table = xrootd_log.SessionTable()
+    for event in xrootd_log.XrootdLogParser().events(lines):
+        session_table.add(event)
+    return session_table
+
+def later(line, minutes):
+    """
+    Return line logged the given minutes later (within the hour).
+    """
+    minute = int(line[10:12]) + minutes
+    return "%s%02d%s" % (line[:10], minute, line[12:])
+
+class SessionTableTest(unittest.TestCase):
+
+    def testSession(self):
+        self.assertEqual(list(table([login, redirect, ofs_open,
+            disconnect]).sessions()), [(jobid, epoch(11, 1, 47),
+            epoch(11, 11, 47), "/store/foo.root", "cmssrv32.fnal.gov:1094")])
+
+    def testOpenWithoutRedirect(self):
+        self.assertEqual(list(table([login, ofs_open]).sessions()), [(jobid,
+            epoch(11, 1, 47), None, "/store/bar.root", None)])
+
+    def testLastWinsFirstOpenStays(self):
+        second_open = ofs_open.replace("/store/bar", "/store/baz")
+        second_redirect = redirect.replace("cmssrv32.fnal.gov",
+            "xrootd.unl.edu").replace("/store/foo", "/store/qux")
+        records = list(table([login, ofs_open, redirect, disconnect,
+            later(login, 20), second_open, second_redirect,
+            later(disconnect, 20)]).records())
+        self.assertEqual(records, [(jobid, epoch(11, 21, 47),
+            epoch(11, 31, 47), "xrootd.unl.edu:1094", "/store/qux.root",
+            "/store/bar.root")])
+
+    def testMerge(self):
+        lines = [login, ofs_open, redirect, disconnect, later(login, 20),
+            ofs_open.replace("/store/bar", "/store/baz"),
+            redirect.replace("/store/foo", "/store/qux"),
+            later(disconnect, 20)]
+        whole = table(lines)
+        for split in range(len(lines) + 1):
+            merged = table(lines[:split])
+            merged.merge(table(lines[split:]))
+            self.assertEqual(list(merged.records()), list(whole.records()))
+
+    def testMergeKeepsEarlierValues(self):
+        merged = table([login, redirect, ofs_open])
+        merged.merge(table([disconnect]))
+        self.assertEqual(list(merged.records()), [(jobid, epoch(11, 1, 47),
+            epoch(11, 11, 47), "cmssrv32.fnal.gov:1094", "/store/foo.root",
+            "/store/bar.root")])
+
+def logLine(seconds, text):
+    """
+    Return a log line of text, logged seconds after 11:00:00 on 2012-05-14.
+    """
+    return "120514 %02d:%02d:%02d 29552 %s\n" % (11 + seconds // 3600,
+        seconds // 60 % 60, seconds % 60, text)
+
+def fixtureLines():
+    """
+    Return the lines of a log of overlapping sessions, some of them of the
+    same jobid, with other lines in between.
+    """
+    events = []
+    for ctr in range(60):
+        pid = ctr % 17
+        jobid = "cms.%d:%d@node%d.unl.edu" % (pid, pid, pid % 5)
+        start = 37 * ctr
+        events.append((start, "XrootdXeq: %s login as /DC=org/CN=User %d" % \
+            (jobid, ctr)))
+        events.append((start + 3, "%s ofs_open: 0-644 fn=/store/f%d.root" % \
+            (jobid, ctr)))
+        events.append((start + 4, "%s ofs_read: 4096@0 fn=/store/f%d.root" % \
+            (jobid, ctr)))
+        if ctr % 3:
+            events.append((start + 5, "Decode xrootd redirects %s to "
+                "site%d.edu:1094 /store/f%d.root" % (jobid, ctr % 4, ctr)))
+        if ctr % 7:
+            events.append((start + 100 + ctr, "XrootdXeq: %s disc 0:01:40" % \
+                jobid))
+    events.sort()
+    return [logLine(seconds, text) for seconds, text in events]
+
+class LogTest(unittest.TestCase):
+    """
+    Base of the tests of logs written to a temporary directory.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="xrootd_log.")
+        self.filename = self.write("xrootd.log", fixtureLines())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        fp = open(filename, "w")
+        try:
+            fp.writelines(lines)
+        finally:
+            fp.close()
+        return filename
+
+class ChunkTest(LogTest):
+
+    def records(self, size, workers):
+        tasks = xrootd_log.chunks([self.filename], size)
+        table = xrootd_log.parseTasks(tasks, workers)
+        records = list(table.records())
+        records.sort()
+        return len(tasks), records
+
+    def testChunks(self):
+        count, whole = self.records(os.stat(self.filename).st_size, 1)
+        self.assertEqual(count, 1)
+        self.assertEqual(whole, sorted(table(fixtureLines()).records()))
+        self.assertEqual(len(whole), 17)
+        for size in [64, 500, 4096]:
+            for workers in [1, 3]:
+                count, records = self.records(size, workers)
+                self.failUnless(count > 1)
+                self.assertEqual(records, whole)
+
+class RangeTest(LogTest):
+
+    def setUp(self):
+        LogTest.setUp(self)
+        self.lines = fixtureLines()
+        self.length = os.stat(self.filename).st_size
+        self.parser = xrootd_log.XrootdLogParser()
+        self.first = self.timestamp(0)
+        self.last = self.timestamp(len(self.lines) - 1)
+
+    def timestamp(self, index):
+        """
+        Return the timestamp of line index of the log.
+        """
+        return self.parser.timestamp(*xrootd_log.timestamp_re.match(
+            self.lines[index]).groups())
+
+    def offset(self, index):
+        """
+        Return the offset of line index of the log.
+        """
+        return len("".join(self.lines[:index]))
+
+    def bisect(self, target):
+        fp = open(self.filename)
+        try:
+            mm = mmap.mmap(fp.fileno(), self.length, access=mmap.ACCESS_READ)
+            try:
+                return xrootd_log._bisect(mm, target, self.parser)
+            finally:
+                mm.close()
+        finally:
+            fp.close()
+
+    def testBisect(self):
+        self.assertEqual(self.bisect(self.first - 1), 0)
+        self.assertEqual(self.bisect(self.first), 0)
+        self.assertEqual(self.bisect(self.first + 1), self.offset(1))
+        self.assertEqual(self.bisect(self.last), self.offset(
+            len(self.lines) - 1))
+        self.assertEqual(self.bisect(self.last + 1), self.length)
+
+    def testWholeLog(self):
+        self.assertEqual(xrootd_log.logRange(self.filename, (self.first,
+            self.last)), (0, self.length))
+        self.assertEqual(xrootd_log.logRange(self.filename, (self.first - 60,
+            self.last + 60)), (0, self.length))
+
+    def testBeforeFirstLine(self):
+        self.assertEqual(xrootd_log.logRange(self.filename, (self.first - 60,
+            self.first - 1)), None)
+
+    def testAfterLastLine(self):
+        self.assertEqual(xrootd_log.logRange(self.filename, (self.last + 1,
+            self.last + 60)), None)
+
+    def testBoundaries(self):
+        # The window ends are inclusive: the lines logged at either are in.
+        for index in [1, 17, 100]:
+            timestamp = self.timestamp(index)
+            same = [i for i in range(len(self.lines)) if \
+                self.timestamp(i) == timestamp]
+            start, end = xrootd_log.logRange(self.filename, (timestamp,
+                timestamp))
+            self.assertEqual((start, end), (self.offset(same[0]),
+                self.offset(same[-1] + 1)))
+            self.assertEqual(xrootd_log.logRange(self.filename, (self.first,
+                timestamp)), (0, end))
+            self.assertEqual(xrootd_log.logRange(self.filename, (timestamp,
+                self.last)), (start, self.length))
+
+    def testEmptyFile(self):
+        filename = self.write("empty.log", [])
+        self.assertEqual(xrootd_log.logRange(filename, (self.first,
+            self.last)), None)
+
+    def testNoTimestamps(self):
+        filename = self.write("garbage.log", ["garbage\n", "\n"])
+        self.assertEqual(xrootd_log.logRange(filename, (self.first,
+            self.last)), None)
+
+sessions = [
+    ("cms.1:2@node1.unl.edu", 300, 400, "/store/a", "site1:1094", "red-1"),
+    ("cms.3:4@node2.unl.edu", 100, 200, "/store/b", None, "red-2"),
+    ("cms.5:6@node1.unl.edu", 200, None, "/store/c", "site1:1094", "red-1"),
+    ("cms.7:8@node3.unl.edu", None, 500, "/store/d", "site2:1094", "red-1"),
+    ("cms.9:10@node1.unl.edu", 100, 150, None, "site2:1094", "red-2"),
+    ("cms.11:12@node2.unl.edu", 3800, 3900, "/store/e", None, "red-1"),
+    ("cms.13", 250, 260, "/store/f", None, "red-2"),
+]
+
+class SessionColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = xrootd_log.SessionColumns(sessions)
+
+    def testRows(self):
+        columns = self.columns
+        # The session without a login is left out.
+        self.assertEqual(len(columns), 6)
+        self.assertEqual([(columns.jobid(row), columns.login(row),
+            columns.disconnection(row), columns.filename(row),
+            columns.redirectionsite(row), columns.server(row)) for row in \
+            range(len(columns))], sessions[:3] + sessions[4:])
+
+    def testInterned(self):
+        columns = self.columns
+        self.assertEqual(columns.hosts.values, ["node1.unl.edu",
+            "node2.unl.edu"])
+        self.assertEqual([columns.hostId(row) for row in range(6)],
+            [0, 1, 0, 0, 1, -1])
+        self.assertEqual(columns.hosts[-1], None)
+        self.assertEqual(columns.sites.values, ["site1:1094", "site2:1094"])
+        self.assertEqual(columns.servers.values, ["red-1", "red-2"])
+        self.failUnless("node1.unl.edu" in columns.hosts)
+        self.failIf("node3.unl.edu" in columns.hosts)
+
+    def testLoginOrder(self):
+        # Ties keep the order of the rows.
+        self.assertEqual(xrootd_log.loginOrder(self.columns).tolist(),
+            [1, 3, 2, 5, 0, 4])
+        self.assertEqual(xrootd_log.loginOrder(self.columns, 60).tolist(),
+            [1, 3, 2, 5, 0, 4])
+
+class SessionIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = xrootd_log.SessionColumns(sessions)
+        self.index = xrootd_log.SessionIndex(self.columns)
+
+    def testLength(self):
+        # The session still connected is left out.
+        self.assertEqual(len(self.index), 5)
+
+    def testHasHost(self):
+        self.failUnless(self.index.hasHost("node1.unl.edu"))
+        self.failUnless(self.index.hasHost("node2.unl.edu"))
+        self.failIf(self.index.hasHost("node3.unl.edu"))
+
+    def testByHost(self):
+        index = self.index
+        self.assertEqual(list(index.byHost("node1.unl.edu", 0, 10000)),
+            [3, 0])
+        self.assertEqual(list(index.byHost("node2.unl.edu", 0, 10000)),
+            [1, 4])
+        self.assertEqual(list(index.byHost("node3.unl.edu", 0, 10000)), [])
+        self.assertEqual(list(index.byHost("", 0, 10000)), [5])
+
+    def testByHostBounds(self):
+        index = self.index
+        # Both ends are inclusive.
+        self.assertEqual(list(index.byHost("node1.unl.edu", 100, 300)),
+            [3, 0])
+        self.assertEqual(list(index.byHost("node1.unl.edu", 101, 300)), [0])
+        self.assertEqual(list(index.byHost("node1.unl.edu", 100, 299)), [3])
+        self.assertEqual(list(index.byHost("node1.unl.edu", 301, 10000)), [])
+        self.assertEqual(list(index.byHost("node1.unl.edu", 0, 99)), [])
+        self.assertEqual(list(index.byHost("node2.unl.edu", 3800, 3800)),
+            [4])
+
+    def testByTime(self):
+        index = self.index
+        self.assertEqual(list(index.byTime(0, 10000)), [1, 3, 5, 0, 4])
+        self.assertEqual(list(index.byTime(100, 100)), [1, 3])
+        self.assertEqual(list(index.byTime(101, 3799)), [5, 0])
+        self.assertEqual(list(index.byTime(250, 300)), [5, 0])
+        self.assertEqual(list(index.byTime(3801, 10000)), [])
+        self.assertEqual(list(index.byTime(300, 100)), [])
+
+class CompressedTest(LogTest):
+
+    def setUp(self):
+        LogTest.setUp(self)
+        self.lines = fixtureLines()
+        self.block_size = xrootd_log.decompress_block_size
+        # Blocks smaller than the logs, ending within lines.
+        xrootd_log.decompress_block_size = 333
+
+    def tearDown(self):
+        xrootd_log.decompress_block_size = self.block_size
+        LogTest.tearDown(self)
+
+    def gzip(self, name, parts):
+        filename = os.path.join(self.directory, name)
+        for part in parts:
+            # Each write appends one more gzip member.
+            fp = gzip.GzipFile(filename, "ab")
+            try:
+                fp.writelines(part)
+            finally:
+                fp.close()
+        return filename
+
+    def check(self, filename, format):
+        self.assertEqual(xrootd_log.logFormat(filename), format)
+        self.assertEqual(list(xrootd_log.logLines(filename)), self.lines)
+        self.assertEqual(sorted(xrootd_log.parseChunk((filename, 0, None,
+            None)).records()), sorted(table(self.lines).records()))
+
+    def testPlain(self):
+        self.check(self.filename, None)
+
+    def testGzip(self):
+        self.check(self.gzip("xrootd.log.1.gz", [self.lines]),
+            xrootd_log.GZIP)
+
+    def testMultipleGzipMembers(self):
+        self.check(self.gzip("xrootd.log.2.gz", [self.lines[:50],
+            self.lines[50:51], self.lines[51:]]), xrootd_log.GZIP)
+
+    def testBzip2(self):
+        self.check(self.write("xrootd.log.3.bz2",
+            [bz2.compress("".join(self.lines))]), xrootd_log.BZIP2)
+
+    def testXz(self):
+        if xrootd_log.lzma is None:
+            # Nothing to test without the lzma module.
+            return
+        self.check(self.write("xrootd.log.4.xz",
+            [xrootd_log.lzma.compress("".join(self.lines))]), xrootd_log.XZ)
+
+    def testLinesFrom(self):
+        filename = self.gzip("xrootd.log.5.gz", [self.lines])
+        start = len("".join(self.lines[:10]))
+        self.assertEqual(list(xrootd_log.linesFrom(xrootd_log.logLines(
+            filename), start)), self.lines[10:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+
+"""
+Tests of xrootd_store.SessionStore, on logs written to a temporary directory.
+"""
+
+import os
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import threading
+
+import gratia_reporting.xrootd_store as xrootd_store
+
+from test_xrootd_log import fixtureLines, logLine, table
+
+server = "red-xrootd.unl.edu"
+
+window = (0, 2**31 - 1)
+
+def expected(lines):
+    """
+    Return the sessions the store should hold after parsing lines, sorted.
+    """
+    sessions = [session + (server, ) for session in table(lines).sessions() \
+        if session[1] is not None]
+    sessions.sort()
+    return sessions
+
+class SessionStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="xrootd_store.")
+        self.lines = fixtureLines()
+        self.log = os.path.join(self.directory, "xrootd.log")
+        self.store = xrootd_store.SessionStore(os.path.join(self.directory,
+            "sessions.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, lines, mode="w", filename=None):
+        fp = open(filename or self.log, mode)
+        try:
+            fp.writelines(lines)
+        finally:
+            fp.close()
+
+    def sessions(self):
+        sessions = list(self.store.sessions(window))
+        sessions.sort()
+        return sessions
+
+    def checkpoint(self, filename=None):
+        return self.store.checkpoint(server, os.stat(filename or
+            self.log).st_ino)
+
+    def testResume(self):
+        self.write(self.lines[:100])
+        self.store.update(server, [self.log])
+        offset = len("".join(self.lines[:100]))
+        self.assertEqual(self.checkpoint()[2], offset)
+        self.assertEqual(self.sessions(), expected(self.lines[:100]))
+        # The line xrootd is still writing is left for the next run.
+        self.write(self.lines[100:] + ["120514 12:00:00 29552 XrootdXeq: "],
+            "a")
+        tasks = self.store.pending(server, [self.log])[0]
+        self.assertEqual(tasks[0][1], offset)
+        self.store.update(server, [self.log])
+        self.assertEqual(self.checkpoint()[2], len("".join(self.lines)))
+        self.assertEqual(self.sessions(), expected(self.lines))
+        # Nothing new: nothing to parse.
+        self.assertEqual(self.store.pending(server, [self.log])[0], [])
+
+    def testTruncated(self):
+        self.write(self.lines)
+        self.store.update(server, [self.log])
+        inode = os.stat(self.log).st_ino
+        # Truncated in place: same inode, fewer bytes.
+        self.write(self.lines[:50])
+        self.assertEqual(os.stat(self.log).st_ino, inode)
+        tasks = self.store.pending(server, [self.log])[0]
+        self.assertEqual(tasks[0][1], 0)
+        self.store.update(server, [self.log])
+        self.assertEqual(self.checkpoint()[2], len("".join(self.lines[:50])))
+
+    def testInodeReused(self):
+        self.write(self.lines)
+        self.store.update(server, [self.log])
+        inode = os.stat(self.log).st_ino
+        # Another log under the same inode, longer than the one parsed.
+        lines = [logLine(0, "XrootdXeq: cms.1:1@node9.unl.edu login as "
+            "/DC=org/CN=Other")] + self.lines
+        self.write(lines, "r+")
+        self.assertEqual(os.stat(self.log).st_ino, inode)
+        tasks = self.store.pending(server, [self.log])[0]
+        self.assertEqual(tasks[0][1], 0)
+        self.store.update(server, [self.log])
+        self.assertEqual(self.sessions(), expected(lines))
+
+    def testCompressedAfterRotation(self):
+        self.write(self.lines[:150])
+        self.store.update(server, [self.log])
+        offset = self.checkpoint()[2]
+        # Rotated and compressed, with more lines logged before it was.
+        rotated = os.path.join(self.directory, "xrootd.log.1.gz")
+        fp = gzip.GzipFile(rotated, "wb")
+        try:
+            fp.writelines(self.lines[:200])
+        finally:
+            fp.close()
+        os.remove(self.log)
+        self.write(self.lines[200:])
+        self.assertEqual(self.store.parsedLength(server,
+            "".join(self.lines)[:xrootd_store.head_size]), offset)
+        self.assertEqual(self.store.parsedLength(server, "x" * 4096), 0)
+        tasks = self.store.pending(server, [rotated, self.log])[0]
+        self.assertEqual(tasks[0], (rotated, offset, None, None))
+        self.store.update(server, [rotated, self.log])
+        self.assertEqual(self.sessions(), expected(self.lines))
+        # A compressed log is parsed once.
+        tasks = self.store.pending(server, [rotated, self.log])[0]
+        self.assertEqual(tasks, [])
+
+    def testPrune(self):
+        # A session with neither a login nor a disconnection is kept for as
+        # long as it was last seen.
+        self.write(self.lines + [logLine(3600, "cms.99:99@node9.unl.edu "
+            "ofs_open: 0-644 fn=/store/g.root")])
+        self.store.update(server, [self.log])
+        self.assertEqual(self.store.prune(100000), 0)
+        # The fixture logs are from 2012.
+        self.assertEqual(self.store.prune(), len(expected(self.lines)))
+        self.assertEqual(self.store.prune(), 0)
+        self.assertEqual(self.sessions(), [])
+
+    def testTimeout(self):
+        filename = os.path.join(self.directory, "sessions.db")
+        conn = sqlite3.connect(filename, check_same_thread=False)
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+            self.assertRaises(sqlite3.OperationalError,
+                xrootd_store.SessionStore, filename, 0.1)
+            # A store waits for the writer to finish.
+            timer = threading.Timer(0.2, conn.commit)
+            timer.start()
+            try:
+                xrootd_store.SessionStore(filename).close()
+            finally:
+                timer.join()
+        finally:
+            conn.close()
+
+if __name__ == '__main__':
+    unittest.main()